@@ -0,0 +1,63 @@
+"""Link lookup indexes
+
+Revision ID: 8f3b2c6d1a47
+Revises: 5c1e7a2d9b04
+Create Date: 2026-10-18 14:03:27.114590
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f3b2c6d1a47'
+down_revision: Union[str, None] = '5c1e7a2d9b04'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 10000
+
+PARTIAL_INDEXES = [
+    ('ix_links_expires_at', 'expires_at', 'expires_at IS NOT NULL'),
+    ('ix_links_last_accessed', 'last_accessed', 'last_accessed IS NOT NULL'),
+    ('ix_links_never_accessed_created_at', 'created_at', 'last_accessed IS NULL'),
+]
+
+
+def backfill_url_hash(connection) -> None:
+    # original_url is stored normalized, so md5() matches crud.url_hash
+    max_id = connection.execute(sa.text("SELECT max(link_id) FROM links")).scalar() or 0
+    for start in range(0, max_id, BACKFILL_BATCH_SIZE):
+        connection.execute(
+            sa.text(
+                "UPDATE links SET url_hash = md5(original_url) "
+                "WHERE link_id > :start AND link_id <= :end AND url_hash IS NULL"
+            ),
+            {"start": start, "end": start + BACKFILL_BATCH_SIZE}
+        )
+
+
+def upgrade() -> None:
+    op.add_column('links', sa.Column('url_hash', sa.String(length=32), nullable=True))
+
+    # each batch and each index build commits on its own, so writes keep flowing
+    with op.get_context().autocommit_block():
+        connection = op.get_bind()
+        backfill_url_hash(connection)
+        op.create_index(op.f('ix_links_url_hash'), 'links', ['url_hash'], postgresql_concurrently=True)
+        op.create_index(op.f('ix_links_user_id'), 'links', ['user_id'], postgresql_concurrently=True)
+        for name, column, where in PARTIAL_INDEXES:
+            op.create_index(name, 'links', [column], postgresql_where=sa.text(where), postgresql_concurrently=True)
+        # rows written by the previous release while the backfill ran
+        connection.execute(sa.text("UPDATE links SET url_hash = md5(original_url) WHERE url_hash IS NULL"))
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, _, _ in reversed(PARTIAL_INDEXES):
+            op.drop_index(name, table_name='links', postgresql_concurrently=True)
+        op.drop_index(op.f('ix_links_user_id'), table_name='links', postgresql_concurrently=True)
+        op.drop_index(op.f('ix_links_url_hash'), table_name='links', postgresql_concurrently=True)
+    op.drop_column('links', 'url_hash')
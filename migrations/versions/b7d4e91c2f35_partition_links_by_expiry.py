@@ -0,0 +1,98 @@
+"""Partition links by expiry
+
+Revision ID: b7d4e91c2f35
+Revises: 8f3b2c6d1a47
+Create Date: 2026-10-18 16:41:09.382751
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d4e91c2f35'
+down_revision: Union[str, None] = '8f3b2c6d1a47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+LINK_COLUMNS = "link_id, original_url, url_hash, short_code, created_at, expires_at, user_id, click_count, last_accessed"
+
+# (parent index, definition); the existing table keeps its copies under ix_links_default_*
+INDEXES = [
+    ('ix_links_link_id', '(link_id)'),
+    ('ix_links_short_code', '(short_code)'),
+    ('ix_links_url_hash', '(url_hash)'),
+    ('ix_links_user_id', '(user_id)'),
+    ('ix_links_expires_at', '(expires_at) WHERE expires_at IS NOT NULL'),
+    ('ix_links_last_accessed', '(last_accessed) WHERE last_accessed IS NOT NULL'),
+    ('ix_links_never_accessed_created_at', '(created_at) WHERE last_accessed IS NULL'),
+]
+
+
+def default_index(name: str) -> str:
+    return name.replace('ix_links_', 'ix_links_default_', 1)
+
+
+def upgrade() -> None:
+    # the only index the old table lacks, built up front so attaching it is instant
+    with op.get_context().autocommit_block():
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_links_default_short_code ON links (short_code)")
+
+    op.execute("ALTER TABLE links RENAME TO links_default")
+    for name, _ in INDEXES:
+        if name != 'ix_links_short_code':
+            op.execute(f"ALTER INDEX {name} RENAME TO {default_index(name)}")
+
+    # a partitioned table can not have a primary key or unique constraint without the partition key
+    op.execute("""
+        CREATE TABLE links (
+            link_id INTEGER NOT NULL DEFAULT nextval('links_link_id_seq'),
+            original_url VARCHAR NOT NULL,
+            url_hash VARCHAR(32),
+            short_code VARCHAR NOT NULL,
+            created_at TIMESTAMP WITHOUT TIME ZONE,
+            expires_at TIMESTAMP WITHOUT TIME ZONE,
+            user_id INTEGER REFERENCES users (id),
+            click_count INTEGER,
+            last_accessed TIMESTAMP WITHOUT TIME ZONE
+        ) PARTITION BY RANGE (expires_at)
+    """)
+    # links without an expiry, and any month without a partition yet, live in the default partition
+    op.execute("ALTER TABLE links ATTACH PARTITION links_default DEFAULT")
+    op.execute("ALTER SEQUENCE links_link_id_seq OWNED BY links.link_id")
+    for name, definition in INDEXES:
+        op.execute(f"CREATE INDEX {name} ON links {definition}")
+
+    # short codes stay unique across partitions: inserting a taken code is skipped,
+    # which is what ON CONFLICT DO NOTHING did before
+    op.execute("""
+        CREATE FUNCTION links_unique_short_code() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_advisory_xact_lock(hashtext(NEW.short_code));
+            IF EXISTS (SELECT 1 FROM links WHERE short_code = NEW.short_code AND link_id <> NEW.link_id) THEN
+                RETURN NULL;
+            END IF;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER links_unique_short_code BEFORE INSERT ON links
+        FOR EACH ROW EXECUTE FUNCTION links_unique_short_code()
+    """)
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE links DETACH PARTITION links_default")
+    op.execute(f"INSERT INTO links_default ({LINK_COLUMNS}) SELECT {LINK_COLUMNS} FROM links")
+    op.execute("ALTER SEQUENCE links_link_id_seq OWNED BY links_default.link_id")
+    op.execute("DROP TABLE links CASCADE")
+    op.execute("DROP FUNCTION links_unique_short_code()")
+
+    op.execute("ALTER TABLE links_default RENAME TO links")
+    op.execute("DROP INDEX ix_links_default_short_code")
+    for name, _ in INDEXES:
+        if name != 'ix_links_short_code':
+            op.execute(f"ALTER INDEX {default_index(name)} RENAME TO {name}")
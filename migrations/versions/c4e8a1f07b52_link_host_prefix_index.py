@@ -0,0 +1,71 @@
+"""Link host and prefix index
+
+Revision ID: c4e8a1f07b52
+Revises: b7d4e91c2f35
+Create Date: 2026-10-18 18:12:45.604213
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e8a1f07b52'
+down_revision: Union[str, None] = 'b7d4e91c2f35'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 10000
+
+INDEX_NAME = 'ix_links_host_original_url'
+# byte ordered, so it serves both LIKE 'prefix%' and the keyset ORDER BY
+INDEX_DEFINITION = '(host, original_url COLLATE "C", link_id)'
+HOST_EXPRESSION = "lower(substring(original_url from '://([^/?#]*)'))"
+
+
+def list_partitions(connection) -> list[str]:
+    result = connection.execute(sa.text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE pg_inherits.inhparent = to_regclass('links')"
+    ))
+    return list(result.scalars())
+
+
+def backfill_host(connection) -> None:
+    # original_url is stored normalized, so the expression matches crud.url_host
+    max_id = connection.execute(sa.text("SELECT max(link_id) FROM links")).scalar() or 0
+    for start in range(0, max_id, BACKFILL_BATCH_SIZE):
+        connection.execute(
+            sa.text(
+                f"UPDATE links SET host = {HOST_EXPRESSION} "
+                "WHERE link_id > :start AND link_id <= :end AND host IS NULL"
+            ),
+            {"start": start, "end": start + BACKFILL_BATCH_SIZE}
+        )
+
+
+def upgrade() -> None:
+    op.add_column('links', sa.Column('host', sa.String(), nullable=True))
+
+    # a partitioned index can not be built concurrently: create it on the parent only,
+    # build each partition's index concurrently and attach it, which validates the parent
+    with op.get_context().autocommit_block():
+        connection = op.get_bind()
+        backfill_host(connection)
+        connection.execute(sa.text(f"CREATE INDEX IF NOT EXISTS {INDEX_NAME} ON ONLY links {INDEX_DEFINITION}"))
+        for partition in list_partitions(connection):
+            partition_index = f"ix_{partition}_host_original_url"
+            connection.execute(sa.text(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {partition_index} ON {partition} {INDEX_DEFINITION}"
+            ))
+            connection.execute(sa.text(f"ALTER INDEX {INDEX_NAME} ATTACH PARTITION {partition_index}"))
+        # rows written by the previous release while the backfill ran
+        connection.execute(sa.text(f"UPDATE links SET host = {HOST_EXPRESSION} WHERE host IS NULL"))
+
+
+def downgrade() -> None:
+    op.execute(f"DROP INDEX IF EXISTS {INDEX_NAME}")
+    op.drop_column('links', 'host')
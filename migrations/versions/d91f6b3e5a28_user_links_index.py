@@ -0,0 +1,48 @@
+"""User links index
+
+Revision ID: d91f6b3e5a28
+Revises: c4e8a1f07b52
+Create Date: 2026-10-18 19:27:03.118472
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd91f6b3e5a28'
+down_revision: Union[str, None] = 'c4e8a1f07b52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEX_NAME = 'ix_links_user_created_at'
+# keyset pagination of /links/mine by recency, read backwards for the newest first
+INDEX_DEFINITION = '(user_id, created_at, link_id)'
+
+
+def list_partitions(connection) -> list[str]:
+    result = connection.execute(sa.text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE pg_inherits.inhparent = to_regclass('links')"
+    ))
+    return list(result.scalars())
+
+
+def upgrade() -> None:
+    # same per partition build as the host index, so writes are never blocked
+    with op.get_context().autocommit_block():
+        connection = op.get_bind()
+        connection.execute(sa.text(f"CREATE INDEX IF NOT EXISTS {INDEX_NAME} ON ONLY links {INDEX_DEFINITION}"))
+        for partition in list_partitions(connection):
+            partition_index = f"ix_{partition}_user_created_at"
+            connection.execute(sa.text(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {partition_index} ON {partition} {INDEX_DEFINITION}"
+            ))
+            connection.execute(sa.text(f"ALTER INDEX {INDEX_NAME} ATTACH PARTITION {partition_index}"))
+
+
+def downgrade() -> None:
+    op.execute(f"DROP INDEX IF EXISTS {INDEX_NAME}")
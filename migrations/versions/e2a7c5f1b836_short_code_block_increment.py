@@ -0,0 +1,38 @@
+"""Short code block sequence increment
+
+Revision ID: e2a7c5f1b836
+Revises: d91f6b3e5a28
+Create Date: 2026-10-18 21:04:17.329841
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2a7c5f1b836'
+down_revision: Union[str, None] = 'd91f6b3e5a28'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BLOCK_INCREMENT = 1000
+
+
+def upgrade() -> None:
+    # blocks were numbered, block n covered ids [n * 1000, (n + 1) * 1000); from now on
+    # nextval is the first id of its block, continuing after the last block handed out
+    op.execute(
+        "SELECT setval('short_code_block_seq', "
+        f"(SELECT last_value * {BLOCK_INCREMENT} FROM short_code_block_seq))"
+    )
+    op.execute(f"ALTER SEQUENCE short_code_block_seq INCREMENT BY {BLOCK_INCREMENT}")
+
+
+def downgrade() -> None:
+    op.execute("ALTER SEQUENCE short_code_block_seq INCREMENT BY 1")
+    op.execute(
+        "SELECT setval('short_code_block_seq', "
+        f"(SELECT last_value / {BLOCK_INCREMENT} + 1 FROM short_code_block_seq))"
+    )
@@ -0,0 +1,45 @@
+"""Lowercase link hosts
+
+Revision ID: f5b9d2e4c713
+Revises: e2a7c5f1b836
+Create Date: 2026-10-18 23:41:08.152736
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f5b9d2e4c713'
+down_revision: Union[str, None] = 'e2a7c5f1b836'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 10000
+
+# urls shortened without a scheme were stored with the host case as typed
+ORIGIN = "substring(original_url from '^[^/]*//[^/?#]*')"
+REST = "substring(original_url from '^[^/]*//[^/?#]*(.*)$')"
+LOWERED_URL = f"lower({ORIGIN}) || {REST}"
+
+
+def upgrade() -> None:
+    # url_hash is md5 of the normalized url, so it follows the new spelling
+    with op.get_context().autocommit_block():
+        connection = op.get_bind()
+        max_id = connection.execute(sa.text("SELECT max(link_id) FROM links")).scalar() or 0
+        for start in range(0, max_id, BACKFILL_BATCH_SIZE):
+            connection.execute(
+                sa.text(
+                    f"UPDATE links SET original_url = {LOWERED_URL}, url_hash = md5({LOWERED_URL}) "
+                    f"WHERE link_id > :start AND link_id <= :end AND {ORIGIN} <> lower({ORIGIN})"
+                ),
+                {"start": start, "end": start + BACKFILL_BATCH_SIZE}
+            )
+
+
+def downgrade() -> None:
+    # the typed case is not kept anywhere, lowercase hosts stay
+    pass
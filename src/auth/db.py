@@ -2,7 +2,7 @@ from fastapi import Depends
 from fastapi_users.db import SQLAlchemyUserDatabase, SQLAlchemyBaseUserTable
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
-from src.database import engine, get_async_session
+from src.database import engine, get_lazy_session
 from sqlalchemy import String, Integer, DateTime, ForeignKey, Boolean, TIMESTAMP
 from datetime import datetime
 
@@ -28,10 +28,12 @@ class Link(Base):
     
     link_id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True, autoincrement=True)
     original_url: Mapped[str] = mapped_column(String, nullable=False)
+    url_hash: Mapped[str] = mapped_column(String(32), index=True, nullable=True)
+    host: Mapped[str] = mapped_column(String, nullable=True)
     short_code: Mapped[str] = mapped_column(String, unique=True, nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
     expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
-    user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'), nullable=True)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'), index=True, nullable=True)
     click_count: Mapped[int] = mapped_column(Integer, default=0)
     last_accessed: Mapped[datetime] = mapped_column(DateTime, nullable=True)
 
@@ -41,5 +43,5 @@ async def create_db_and_tables():
         await conn.run_sync(Base.metadata.create_all)
 
 
-async def get_user_db(session: AsyncSession = Depends(get_async_session)):
+async def get_user_db(session: AsyncSession = Depends(get_lazy_session)):
     yield SQLAlchemyUserDatabase(session, User)
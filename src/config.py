@@ -21,6 +21,60 @@ class Settings(BaseSettings):
         return f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASS}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
     
     REDIS_URL: str = "redis://redis:6379/0"
+    LOCAL_CACHE_MAXSIZE: int = 10000
+    LOCAL_CACHE_TTL: int = 10
+    LINK_CACHE_MIN_TTL: int = 300
+    LINK_CACHE_MAX_TTL: int = 86400
+    STATS_CACHE_TTL: int = 300
+    SEARCH_CACHE_TTL: int = 600
+    IDEMPOTENCY_TTL: int = 86400
+    USER_AGGREGATE_TTL: int = 3600
+    MY_LINKS_PAGE_SIZE: int = 50
+    MY_LINKS_MAX_PAGE_SIZE: int = 500
+    EXPORT_BATCH_SIZE: int = 1000
+    SEARCH_PAGE_SIZE: int = 50
+    SEARCH_MAX_PAGE_SIZE: int = 500
+    PREFIX_SEARCH_PAGE_SIZE: int = 1000
+    PREFIX_SEARCH_MAX_PAGE_SIZE: int = 10000
+    CACHE_TTL_JITTER: float = 0.1
+    CACHE_XFETCH_BETA: float = 1.0
+    # string: one key per link, hash: links bucketed into small hashes, dual: hash with fallback to string keys
+    CACHE_LAYOUT: str = "string"
+    CACHE_BUCKETS: int = 262144
+    CACHE_BUCKET_SWEEP: int = 3
+    CLICK_FLUSH_INTERVAL: int = 5
+    WARMUP_LINKS: int = 10000
+    WARMUP_BATCH_SIZE: int = 1000
+    WARMUP_TIMEOUT: int = 30
+    # one worker per lease scans the database, the others read the codes it warmed from Redis
+    WARMUP_LOCK_LEASE: int = 600000
+    WARMUP_POLL_INTERVAL: float = 0.5
+    HOT_SET_SNAPSHOT_PATH: str = ""
+    HOT_SET_SNAPSHOT_INTERVAL: int = 300
+    SHORT_CODE_GENERATOR: str = "block"
+    # capped at the short_code_block_seq increment
+    SHORT_CODE_BLOCK_SIZE: int = 1000
+    BATCH_MAX_SIZE: int = 1000
+    CLEANUP_BATCH_SIZE: int = 1000
+    CLEANUP_BATCH_PAUSE: float = 0.1
+    CLEANUP_INTERVAL: int = 86400
+    PARTITION_MONTHS_AHEAD: int = 3
+    PARTITION_DETACH_ONLY: bool = False
+    PARTITION_RETRY_AFTER: int = 5
+    PARTITION_MAINTENANCE_INTERVAL: int = 86400
+    SCHEDULER_JITTER: float = 0.1
+    SCHEDULER_LOCK_LEASE: int = 30000
+    SCHEDULER_RETRY_DELAY: int = 60
+    REDIRECT_FAST_PATH: bool = True
+    BLOOM_ERROR_RATE: float = 0.01
+    BLOOM_MIN_CAPACITY: int = 100000
+    BLOOM_GROWTH: float = 1.5
+    BLOOM_REBUILD_INTERVAL: int = 86400
+    NEGATIVE_CACHE_TTL: int = 60
+    SINGLE_FLIGHT_CLUSTER_LOCK: bool = False
+    SINGLE_FLIGHT_LOCK_TIMEOUT: int = 2000
+    SINGLE_FLIGHT_WAIT_INTERVAL: float = 0.02
+    SINGLE_FLIGHT_WAIT_ATTEMPTS: int = 25
     SECRET_KEY: str = "your-secret-key-here"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
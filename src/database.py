@@ -13,3 +13,35 @@ async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
     async with async_session_maker() as session:
         yield session
+
+
+class LazyAsyncSession:
+    def __init__(self, session_factory=None):
+        self._session_factory = session_factory or async_session_maker
+        self._session = None
+
+    @property
+    def started(self) -> bool:
+        return self._session is not None
+
+    def _get_session(self) -> AsyncSession:
+        if self._session is None:
+            self._session = self._session_factory()
+        return self._session
+
+    def __getattr__(self, name):
+        # only reached for attributes the proxy itself does not define
+        return getattr(self._get_session(), name)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+async def get_lazy_session() -> AsyncGenerator[AsyncSession, None]:
+    session = LazyAsyncSession()
+    try:
+        yield session
+    finally:
+        await session.close()
@@ -1,13 +1,24 @@
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Depends, Request
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import IntegrityError
 from collections.abc import AsyncIterator
 from contextlib import asynccontextmanager
 from src.auth.users import auth_backend, current_active_user, fastapi_users
 from src.auth.schemas import UserCreate, UserRead
 from src.auth.db import User
 from src.short_url.router import router as short_url_router
+from src.short_url.fastpath import RedirectFastPath
 from src.database import async_session_maker
 from src.short_url.crud import delete_expired_links, delete_inactive_links
+from src.short_url.cache import listen_for_invalidations, evict_links, remove_user_links
+from src.short_url.clicks import click_buffer
+from src.short_url.bloom import link_filter
+from src.short_url.warmup import warm_cache, save_hot_set
+from src.short_url.partitions import maintain_partitions, is_partition_pending
+from src.metrics import collect_metrics
+from src.scheduler import scheduler
 import asyncio
+import logging
 from redis import asyncio as aioredis
 from fastapi_cache import FastAPICache
 from fastapi_cache.backends.redis import RedisBackend
@@ -15,30 +26,129 @@ from src.config import settings
 
 import uvicorn
 
+logger = logging.getLogger(__name__)
+
 
 @asynccontextmanager
 async def lifespan(_: FastAPI) -> AsyncIterator[None]:
-    asyncio.create_task(run_background_task())
     #redis = aioredis.from_url("redis://localhost")
     redis = aioredis.from_url(settings.REDIS_URL)
     FastAPICache.init(RedisBackend(redis), prefix="fastapi-cache")
     app.state.redis = redis
+    # listening before the warm-up, so changes made while it runs reach the warmed entries
+    invalidation_listener = asyncio.create_task(listen_for_invalidations(redis))
+    await warm_up_cache()
+    scheduled_jobs = asyncio.create_task(scheduler.run(redis))
+    click_flusher = asyncio.create_task(run_click_flush_task())
+    link_filter_builder = asyncio.create_task(run_link_filter_task())
+    hot_set_saver = asyncio.create_task(run_hot_set_snapshot_task())
     yield
+    scheduled_jobs.cancel()
+    invalidation_listener.cancel()
+    click_flusher.cancel()
+    link_filter_builder.cancel()
+    hot_set_saver.cancel()
+    snapshot_hot_set()
+    # a flush cut short by the cancel puts its clicks back, the final flush picks them up
+    await asyncio.gather(click_flusher, return_exceptions=True)
+    await flush_clicks()
     await FastAPICache.clear()
     await redis.aclose()
 
 
-async def run_background_task():
+async def forget_deleted_links(rows):
+    await evict_links(rows)
+    await remove_user_links(rows)
+
+
+async def cleanup_expired_links():
+    async with async_session_maker() as session:
+        return await delete_expired_links(session, on_batch=forget_deleted_links)
+
+
+async def cleanup_inactive_links():
+    async with async_session_maker() as session:
+        result = await delete_inactive_links(session, on_batch=forget_deleted_links)
+    return result["deleted_count"]
+
+
+async def maintain_link_partitions():
+    async with async_session_maker() as session:
+        return await maintain_partitions(session)
+
+
+scheduler.add("cleanup_expired_links", cleanup_expired_links, settings.CLEANUP_INTERVAL)
+scheduler.add("cleanup_inactive_links", cleanup_inactive_links, settings.CLEANUP_INTERVAL)
+scheduler.add("maintain_link_partitions", maintain_link_partitions, settings.PARTITION_MAINTENANCE_INTERVAL)
+
+
+async def flush_clicks():
+    try:
+        async with async_session_maker() as session:
+            await click_buffer.flush(session)
+    except Exception:
+        logger.exception("Failed to flush click counts")
+
+
+async def run_click_flush_task():
     while True:
+        await asyncio.sleep(settings.CLICK_FLUSH_INTERVAL)
+        await flush_clicks()
+
+
+async def warm_up_cache():
+    if not settings.WARMUP_LINKS:
+        return
+    try:
         async with async_session_maker() as session:
-            await delete_expired_links(session)
-            await delete_inactive_links(session)
-        await asyncio.sleep(86400)
+            warmed = await asyncio.wait_for(warm_cache(session), settings.WARMUP_TIMEOUT)
+        logger.info("Warmed up cache with %d links", warmed)
+    except Exception:
+        logger.exception("Cache warm-up failed, starting cold")
+
+
+def snapshot_hot_set():
+    if not settings.HOT_SET_SNAPSHOT_PATH:
+        return
+    try:
+        save_hot_set(settings.HOT_SET_SNAPSHOT_PATH)
+    except OSError:
+        logger.exception("Failed to save hot link snapshot")
+
+
+async def run_hot_set_snapshot_task():
+    if not settings.HOT_SET_SNAPSHOT_PATH:
+        return
+    while True:
+        await asyncio.sleep(settings.HOT_SET_SNAPSHOT_INTERVAL)
+        snapshot_hot_set()
+
+
+async def run_link_filter_task():
+    while True:
+        try:
+            async with async_session_maker() as session:
+                await link_filter.rebuild(session)
+        except Exception:
+            logger.exception("Failed to rebuild short code filter")
+        await link_filter.wait_for_rebuild(settings.BLOOM_REBUILD_INTERVAL)
 
 
 app = FastAPI(lifespan=lifespan)
 
 
+@app.exception_handler(IntegrityError)
+async def integrity_error_handler(request: Request, exc: IntegrityError):
+    if not is_partition_pending(exc):
+        raise exc
+    # the partition for this expiry month is being attached, which takes seconds to minutes
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Links expiring in this month can not be saved right now, retry shortly"},
+        headers={"Retry-After": str(settings.PARTITION_RETRY_AFTER)}
+    )
+
+
 app.include_router(
     fastapi_users.get_auth_router(auth_backend), prefix="/auth/jwt", tags=["auth"]
 )
@@ -50,12 +160,20 @@ app.include_router(
 
 app.include_router(short_url_router)
 
+if settings.REDIRECT_FAST_PATH:
+    app.add_middleware(RedirectFastPath, routes=short_url_router.routes)
+
 
 @app.get("/protected-route")
 def protected_route(user: User = Depends(current_active_user)):
     return f"Hello, {user.email}"
 
 
+@app.get("/metrics")
+def metrics():
+    return collect_metrics()
+
+
 @app.get("/unprotected-route")
 def unprotected_route():
     return f"Hello, anonym"
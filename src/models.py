@@ -1,10 +1,14 @@
 from datetime import datetime
-from sqlalchemy import Column, String, DateTime, Integer, ForeignKey, TIMESTAMP, Boolean
+from sqlalchemy import Column, String, DateTime, Integer, ForeignKey, TIMESTAMP, Boolean, Sequence, Index, text
 from sqlalchemy.orm import declarative_base
 
 
 Base = declarative_base()
 
+# each nextval is the first id of a block, so ids never overlap whatever SHORT_CODE_BLOCK_SIZE is set to
+SHORT_CODE_BLOCK_INCREMENT = 1000
+short_code_block_seq = Sequence("short_code_block_seq", increment=SHORT_CODE_BLOCK_INCREMENT, metadata=Base.metadata)
+
 
 class User(Base):
     __tablename__ = "users"
@@ -18,13 +22,25 @@ class User(Base):
     is_verified = Column(Boolean, default=True, nullable=False)
 
 class Link(Base):
+    # in the database links is partitioned by expires_at: link_id and short_code
+    # are kept unique by a sequence and an insert trigger rather than constraints
     __tablename__ = 'links'
     
     link_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     original_url = Column(String, nullable=False)
+    url_hash = Column(String(32), index=True, nullable=True)
+    host = Column(String, nullable=True)
     short_code = Column(String, unique=True, nullable=False)
     created_at = Column(DateTime, default=datetime.now)
     expires_at = Column(DateTime, nullable=True)
-    user_id = Column(Integer, ForeignKey('users.id'), nullable=True)
+    user_id = Column(Integer, ForeignKey('users.id'), index=True, nullable=True)
     click_count = Column(Integer, default=0)
     last_accessed = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_links_expires_at", "expires_at", postgresql_where=text("expires_at IS NOT NULL")),
+        Index("ix_links_last_accessed", "last_accessed", postgresql_where=text("last_accessed IS NOT NULL")),
+        Index("ix_links_never_accessed_created_at", "created_at", postgresql_where=text("last_accessed IS NULL")),
+        Index("ix_links_host_original_url", "host", text('original_url COLLATE "C"'), "link_id"),
+        Index("ix_links_user_created_at", "user_id", "created_at", "link_id"),
+    )
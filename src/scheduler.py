@@ -0,0 +1,135 @@
+from redis.exceptions import RedisError
+from src.config import settings
+from src.metrics import register_collector
+import asyncio
+import logging
+import random
+import time
+import uuid
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+RENEW_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+class Job:
+    def __init__(self, name: str, func, interval: float, jitter: float = None):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.jitter = settings.SCHEDULER_JITTER if jitter is None else jitter
+        self.runs = 0
+        self.failures = 0
+        self.last_run_at: Optional[float] = None
+        self.last_duration: Optional[float] = None
+        self.last_rows: Optional[int] = None
+
+    def metrics(self) -> dict:
+        return {
+            "runs": self.runs,
+            "failures": self.failures,
+            "last_run_at": self.last_run_at,
+            "last_duration": self.last_duration,
+            "last_rows": self.last_rows,
+        }
+
+
+class Scheduler:
+    def __init__(self):
+        self.jobs: dict[str, Job] = {}
+
+    def add(self, name: str, func, interval: float, jitter: float = None) -> Job:
+        job = Job(name, func, interval, jitter)
+        self.jobs[name] = job
+        return job
+
+    async def run(self, redis=None):
+        await asyncio.gather(*(self.run_job(job, redis) for job in self.jobs.values()))
+
+    async def run_job(self, job: Job, redis=None):
+        while True:
+            try:
+                await asyncio.sleep(await self._next_delay(job, redis))
+                if redis is None:
+                    await self._execute(job, redis)
+                elif not await self._run_as_leader(job, redis):
+                    # another worker holds the lease, check again once it would have expired
+                    await asyncio.sleep(settings.SCHEDULER_LOCK_LEASE / 1000)
+            except (RedisError, OSError) as exc:
+                logger.warning("Scheduler could not coordinate job %s: %s", job.name, exc)
+                await asyncio.sleep(settings.SCHEDULER_RETRY_DELAY)
+
+    async def _last_run(self, job: Job, redis) -> Optional[float]:
+        if redis is None:
+            return job.last_run_at
+        last_run = await redis.get(f"scheduler:{job.name}:last_run")
+        return float(last_run) if last_run else None
+
+    async def _next_delay(self, job: Job, redis) -> float:
+        last_run = await self._last_run(job, redis)
+        delay = 0 if last_run is None else max(last_run + job.interval - time.time(), 0)
+        return delay + random.uniform(0, job.interval * job.jitter)
+
+    async def _run_as_leader(self, job: Job, redis) -> bool:
+        lock_key = f"scheduler:{job.name}:lock"
+        token = uuid.uuid4().hex
+        if not await redis.set(lock_key, token, nx=True, px=settings.SCHEDULER_LOCK_LEASE):
+            return False
+
+        renewer = asyncio.create_task(self._renew_lease(redis, lock_key, token))
+        try:
+            # the previous leader may have finished while we were sleeping
+            last_run = await self._last_run(job, redis)
+            if last_run is None or last_run + job.interval <= time.time():
+                await self._execute(job, redis)
+        finally:
+            renewer.cancel()
+            await redis.eval(RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+        return True
+
+    async def _renew_lease(self, redis, lock_key: str, token: str):
+        lease = settings.SCHEDULER_LOCK_LEASE
+        while True:
+            await asyncio.sleep(lease / 3000)
+            if not await redis.eval(RENEW_LOCK_SCRIPT, 1, lock_key, token, lease):
+                logger.warning("Lost scheduler lease %s", lock_key)
+                return
+
+    async def _execute(self, job: Job, redis):
+        started = time.perf_counter()
+        try:
+            rows = await job.func()
+        except Exception:
+            job.failures += 1
+            logger.exception("Scheduled job %s failed", job.name)
+            await asyncio.sleep(settings.SCHEDULER_RETRY_DELAY)
+            return
+
+        job.runs += 1
+        job.last_duration = time.perf_counter() - started
+        job.last_rows = rows
+        job.last_run_at = time.time()
+        if redis is not None:
+            await redis.set(f"scheduler:{job.name}:last_run", job.last_run_at)
+        logger.info("Scheduled job %s affected %s rows in %.2fs", job.name, rows, job.last_duration)
+
+    def metrics(self) -> dict:
+        return {name: job.metrics() for name, job in self.jobs.items()}
+
+
+scheduler = Scheduler()
+
+register_collector("scheduler", scheduler.metrics)
@@ -0,0 +1,99 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.config import settings
+from src.metrics import register_collector
+import src.short_url.crud as crud
+import asyncio
+import hashlib
+import math
+from typing import Optional
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = max(capacity, 1)
+        self.error_rate = error_rate
+        self.size = max(8, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.size for i in range(self.hash_count)]
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def false_positive_rate(self) -> float:
+        return (1 - math.exp(-self.hash_count * self.count / self.size)) ** self.hash_count
+
+
+class LinkFilter:
+    def __init__(self):
+        self.bloom: Optional[BloomFilter] = None
+        self._building: Optional[BloomFilter] = None
+        self.rejected = 0
+        self.negative_hits = 0
+        self._rebuild_requested = asyncio.Event()
+
+    def might_exist(self, short_code: str) -> bool:
+        # until the first build finishes every code has to go to the database
+        if self.bloom is None or short_code in self.bloom:
+            return True
+        self.rejected += 1
+        return False
+
+    def add(self, short_code: str):
+        if self.bloom is not None:
+            self.bloom.add(short_code)
+        if self._building is not None:
+            self._building.add(short_code)
+
+    def reset(self):
+        # additions may have been missed, fall back to the database until rebuilt
+        self.bloom = None
+        self._rebuild_requested.set()
+
+    async def wait_for_rebuild(self, timeout: float):
+        try:
+            await asyncio.wait_for(self._rebuild_requested.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._rebuild_requested.clear()
+
+    async def rebuild(self, db: AsyncSession):
+        total = await crud.count_links(db)
+        capacity = max(int(total * settings.BLOOM_GROWTH), settings.BLOOM_MIN_CAPACITY)
+        self._building = BloomFilter(capacity, settings.BLOOM_ERROR_RATE)
+        try:
+            async for short_code in crud.stream_short_codes(db):
+                self._building.add(short_code)
+            self.bloom = self._building
+        finally:
+            self._building = None
+
+    def metrics(self) -> dict:
+        if self.bloom is None:
+            return {"ready": False, "rejected": self.rejected, "negative_hits": self.negative_hits}
+        return {
+            "ready": True,
+            "size_bits": self.bloom.size,
+            "size_bytes": len(self.bloom.bits),
+            "hash_count": self.bloom.hash_count,
+            "capacity": self.bloom.capacity,
+            "items": self.bloom.count,
+            "false_positive_rate": self.bloom.false_positive_rate(),
+            "rejected": self.rejected,
+            "negative_hits": self.negative_hits
+        }
+
+
+link_filter = LinkFilter()
+register_collector("link_filter", link_filter.metrics)
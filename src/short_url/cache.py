@@ -1,75 +1,626 @@
 from fastapi_cache import FastAPICache
+from redis.exceptions import RedisError
 from src.models import Link
-import json
+from src.config import settings
+from src.short_url.bloom import link_filter
+from src.short_url.crud import url_hash
+from src.short_url.records import (
+    CachedLink,
+    encode_link,
+    decode_link,
+    encode_missing_link,
+    link_record_expiry,
+    encode_stats,
+    decode_stats,
+    encode_search,
+    decode_search
+)
+from collections import OrderedDict
+import asyncio
 import datetime
+import json
+import logging
+import math
+import random
+import time
+import uuid
+import zlib
 from typing import Optional
 
-async def cache_link(link: Link):
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "fastapi-cache:invalidate"
+LINK_ADDED_CHANNEL = "fastapi-cache:link-added"
+NEGATIVE_ENTRY = "-"
+MISSING_LINK = object()
+# recompute time assumed for entries written without a measured load
+DEFAULT_RECOMPUTE_DELTA = 0.01
+# bump together with the record layouts in records.py, so workers of the previous
+# release keep reading their own keys during a rolling deploy
+CACHE_KEY_VERSION = "v2"
+
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# only adjust aggregates that are cached, a missing hash is rebuilt from the database
+ADJUST_AGGREGATES_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('HINCRBY', KEYS[1], 'total_links', ARGV[1])
+    redis.call('HINCRBY', KEYS[1], 'total_clicks', ARGV[2])
+end
+return 0
+"""
+
+
+# write one bucket field and drop a few expired ones; buckets that keep getting writes
+# have their TTL pushed forward, so without the sweep one-off entries would pile up.
+# Expiry offsets follow records.LINK_RECORD and records.MISSING_RECORD
+WRITE_BUCKET_SCRIPT = """
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[3], 'NX')
+redis.call('EXPIRE', KEYS[1], ARGV[3], 'GT')
+local now = tonumber(ARGV[4])
+local sample = redis.call('HRANDFIELD', KEYS[1], ARGV[5], 'WITHVALUES')
+for i = 1, #sample, 2 do
+    local value = sample[i + 1]
+    local offset = 10
+    if string.sub(value, 1, 1) == '-' then
+        offset = 2
+    end
+    if struct.unpack('<d', value, offset) <= now then
+        redis.call('HDEL', KEYS[1], sample[i])
+    end
+end
+return 0
+"""
+
+
+class LocalCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+
+    def get(self, key: str):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires, value = item
+        if expires < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value, ttl: Optional[float] = None):
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def items(self):
+        for key, (_, value) in reversed(self._data.items()):
+            yield key, value
+
+    def __len__(self):
+        return len(self._data)
+
+
+local_cache = LocalCache(settings.LOCAL_CACHE_MAXSIZE, settings.LOCAL_CACHE_TTL)
+
+
+def get_redis():
+    return getattr(FastAPICache.get_backend(), "redis", None)
+
+def link_key(short_code: str) -> str:
+    return f"link:{CACHE_KEY_VERSION}:{short_code}"
+
+def bucket_key(bucket: int) -> str:
+    return f"links:{CACHE_KEY_VERSION}:{bucket}"
+
+def link_bucket(short_code: str) -> tuple[str, str]:
+    # generated codes are scrambled, so bucket by hash rather than by prefix
+    return bucket_key(zlib.crc32(short_code.encode()) % settings.CACHE_BUCKETS), short_code
+
+def use_buckets(redis) -> bool:
+    return redis is not None and settings.CACHE_LAYOUT != "string"
+
+def _queue_link_write(pipe, short_code: str, value, expire: int):
+    if settings.CACHE_LAYOUT == "string":
+        pipe.set(link_key(short_code), value, ex=expire)
+        return
+    key, field = link_bucket(short_code)
+    # the bucket lives as long as its longest entry, stale fields are dropped on read and by the sweep
+    pipe.eval(WRITE_BUCKET_SCRIPT, 1, key, field, value, expire, time.time(), settings.CACHE_BUCKET_SWEEP)
+
+def _queue_link_delete(pipe, short_code: str):
+    if settings.CACHE_LAYOUT != "hash":
+        pipe.delete(link_key(short_code))
+    if settings.CACHE_LAYOUT != "string":
+        pipe.hdel(*link_bucket(short_code))
+
+def _bucket_entry_expired(cached) -> bool:
+    return link_record_expiry(cached) <= time.time()
+
+async def _read_link_entry(short_code: str):
+    redis = get_redis()
+    if use_buckets(redis):
+        key, field = link_bucket(short_code)
+        cached = await redis.hget(key, field)
+        if cached and _bucket_entry_expired(cached):
+            await redis.hdel(key, field)
+            cached = None
+        if cached or settings.CACHE_LAYOUT == "hash":
+            return cached
     backend = FastAPICache.get_backend()
-    await backend.set(
-        f"link:{link.short_code}",
-        json.dumps({
-            'original_url': link.original_url,
-            'expires_at': link.expires_at.isoformat() if link.expires_at else None,
-            'click_count': link.click_count
-        }),
-        expire=3600
-    )
-
-async def get_cached_link(short_code: str) -> Optional[Link]:
+    return await backend.get(link_key(short_code))
+
+def jittered_ttl(ttl: int) -> int:
+    jitter = settings.CACHE_TTL_JITTER
+    return max(1, round(ttl * random.uniform(1 - jitter, 1 + jitter)))
+
+def should_refresh_early(cache_expiry: Optional[float], delta: Optional[float]) -> bool:
+    # XFetch: the closer to expiry and the slower the reload, the likelier a refresh
+    if not cache_expiry or not delta:
+        return False
+    return time.time() - delta * settings.CACHE_XFETCH_BETA * math.log(1.0 - random.random()) >= cache_expiry
+
+def serialize_link(link: Link, expire: int, delta: float = DEFAULT_RECOMPUTE_DELTA) -> bytes:
+    return encode_link(link, time.time() + expire, delta)
+
+def _seconds_until(moment: datetime.datetime) -> float:
+    return (moment - datetime.datetime.now()).total_seconds()
+
+def link_cache_ttl(link: Link) -> int:
+    # popular links stay cached longer, never past their own expiration
+    ttl = settings.LINK_CACHE_MIN_TTL
+    if link.created_at and link.click_count:
+        age_hours = max(-_seconds_until(link.created_at) / 3600, 1)
+        ttl *= 1 + link.click_count / age_hours
+    ttl = min(jittered_ttl(ttl), settings.LINK_CACHE_MAX_TTL)
+    if link.expires_at:
+        ttl = min(ttl, int(_seconds_until(link.expires_at)))
+    return ttl
+
+async def cache_link(link: Link, delta: float = DEFAULT_RECOMPUTE_DELTA):
+    expire = link_cache_ttl(link)
+    if expire <= 0:
+        return
+    redis = get_redis()
+    if use_buckets(redis):
+        async with redis.pipeline(transaction=False) as pipe:
+            _queue_link_write(pipe, link.short_code, serialize_link(link, expire, delta), expire)
+            await pipe.execute()
+        return
     backend = FastAPICache.get_backend()
-    cached = await backend.get(f"link:{short_code}")
-    if cached:
-        data = json.loads(cached)
-        return Link(
-            short_code=short_code,
-            original_url=data['original_url'],
-            expires_at=datetime.fromisoformat(data['expires_at']) if data['expires_at'] else None,
-            click_count=data['click_count']
-        )
-    return None
-
-async def clear_cached_link(short_code: str):
+    await backend.set(link_key(link.short_code), serialize_link(link, expire, delta), expire=expire)
+
+async def cache_links(links: list[Link], local: bool = False):
+    if local:
+        for link in links:
+            _remember_link(CachedLink(link.short_code, link.original_url, link.expires_at, link.click_count))
+
+    redis = get_redis()
+    if redis is None:
+        for link in links:
+            await cache_link(link)
+        return
+
+    async with redis.pipeline(transaction=False) as pipe:
+        for link in links:
+            expire = link_cache_ttl(link)
+            if expire > 0:
+                _queue_link_write(pipe, link.short_code, serialize_link(link, expire), expire)
+        await pipe.execute()
+
+def deserialize_link(short_code: str, cached) -> CachedLink:
+    return decode_link(short_code, cached)[0]
+
+def is_negative_entry(cached) -> bool:
+    return cached[:1] in (NEGATIVE_ENTRY, NEGATIVE_ENTRY.encode())
+
+def _load_entry(short_code: str, cached, allow_early_refresh: bool = True):
+    if is_negative_entry(cached):
+        link = MISSING_LINK
+    else:
+        link, cache_expiry, delta = decode_link(short_code, cached)
+        if allow_early_refresh and should_refresh_early(cache_expiry, delta):
+            # this caller reloads the link while everyone else keeps using the entry
+            return None
+
+    _remember_link(link, short_code)
+    return link
+
+def _remember_link(link, short_code: Optional[str] = None):
+    local_ttl = None
+    if link is not MISSING_LINK and link.expires_at:
+        local_ttl = max(min(local_cache.ttl, _seconds_until(link.expires_at)), 0)
+    local_cache.set(f"link:{short_code or link.short_code}", link, ttl=local_ttl)
+
+def hot_link_codes(limit: int) -> list[str]:
+    # most recently used first
+    codes = []
+    for key, link in local_cache.items():
+        if link is not MISSING_LINK and key.startswith("link:"):
+            codes.append(key[len("link:"):])
+            if len(codes) >= limit:
+                break
+    return codes
+
+async def lookup_cached_link(short_code: str):
+    link = local_cache.get(f"link:{short_code}")
+    if link is None:
+        cached = await _read_link_entry(short_code)
+        if not cached:
+            return None
+        link = _load_entry(short_code, cached)
+        if link is None:
+            return None
+
+    if link is MISSING_LINK:
+        link_filter.negative_hits += 1
+    return link
+
+async def get_cached_link(short_code: str) -> Optional[CachedLink]:
+    link = await lookup_cached_link(short_code)
+    return None if link is MISSING_LINK else link
+
+async def get_cached_links(short_codes: list[str]) -> dict[str, Optional[CachedLink]]:
+    # codes known to be missing map to None, codes not in the cache are left out
+    found = {}
+    missing = []
+    for short_code in short_codes:
+        local = local_cache.get(f"link:{short_code}")
+        if local is not None:
+            found[short_code] = None if local is MISSING_LINK else local
+        else:
+            missing.append(short_code)
+
+    if not missing:
+        return found
+
+    redis = get_redis()
+    if redis is None:
+        for short_code in missing:
+            link = await lookup_cached_link(short_code)
+            if link is not None:
+                found[short_code] = None if link is MISSING_LINK else link
+        return found
+
+    if use_buckets(redis):
+        cached_values = await _read_bucket_entries(redis, missing)
+    else:
+        cached_values = await redis.mget([link_key(short_code) for short_code in missing])
+    for short_code, cached in zip(missing, cached_values):
+        link = _load_entry(short_code, cached) if cached else None
+        if link is not None:
+            found[short_code] = None if link is MISSING_LINK else link
+    return found
+
+async def _read_bucket_entries(redis, short_codes: list[str]) -> list:
+    buckets = {}
+    for short_code in short_codes:
+        key, field = link_bucket(short_code)
+        buckets.setdefault(key, []).append(field)
+
+    async with redis.pipeline(transaction=False) as pipe:
+        for key, fields in buckets.items():
+            pipe.hmget(key, fields)
+        replies = await pipe.execute()
+
+    entries = {}
+    stale = []
+    for (key, fields), values in zip(buckets.items(), replies):
+        for field, cached in zip(fields, values):
+            if cached and _bucket_entry_expired(cached):
+                stale.append((key, field))
+                cached = None
+            entries[key, field] = cached
+    cached_values = [entries[link_bucket(short_code)] for short_code in short_codes]
+
+    if stale:
+        async with redis.pipeline(transaction=False) as pipe:
+            for key, field in stale:
+                pipe.hdel(key, field)
+            await pipe.execute()
+
+    if settings.CACHE_LAYOUT != "hash":
+        # still migrating: fall back to the old per-code keys
+        fallback = [short_code for short_code, cached in zip(short_codes, cached_values) if not cached]
+        if fallback:
+            legacy = dict(zip(fallback, await redis.mget([link_key(short_code) for short_code in fallback])))
+            cached_values = [cached or legacy.get(short_code) for short_code, cached in zip(short_codes, cached_values)]
+    return cached_values
+
+async def cache_missing_link(short_code: str):
+    local_cache.set(f"link:{short_code}", MISSING_LINK)
+    redis = get_redis()
+    if use_buckets(redis):
+        expire = settings.NEGATIVE_CACHE_TTL
+        async with redis.pipeline(transaction=False) as pipe:
+            _queue_link_write(pipe, short_code, encode_missing_link(time.time() + expire), expire)
+            await pipe.execute()
+        return
     backend = FastAPICache.get_backend()
+    await backend.set(link_key(short_code), NEGATIVE_ENTRY, expire=settings.NEGATIVE_CACHE_TTL)
+
+def stats_key(short_code: str) -> str:
+    return f"stats:{CACHE_KEY_VERSION}:{short_code}"
+
+def search_key(normalized_url: str) -> str:
+    # one hash per destination holds every page, so a single DEL invalidates them all
+    return f"search:{CACHE_KEY_VERSION}:{url_hash(normalized_url)}"
+
+def search_page(limit: int, cursor: Optional[int]) -> str:
+    return f"{cursor or 0}:{limit}"
+
+async def _delete_key(backend, key: str):
     if hasattr(backend, "delete"):
-        await backend.delete(f"link:{short_code}")
+        await backend.delete(key)
     else:
-        await backend.set(f"link:{short_code}", "", expire=1)
+        await backend.set(key, "", expire=1)
+
+async def write_through_links(links: list[Link], stale_urls: list[str] = (), created: bool = False):
+    # refresh the link entries and drop the stats and search entries derived from them
+    for link in links:
+        if created:
+            link_filter.add(link.short_code)
+        local_cache.delete(f"link:{link.short_code}")
+    urls = {link.original_url for link in links} | set(stale_urls)
+
+    redis = get_redis()
+    if redis is None:
+        backend = FastAPICache.get_backend()
+        for link in links:
+            expire = link_cache_ttl(link)
+            if expire > 0:
+                await backend.set(link_key(link.short_code), serialize_link(link, expire), expire=expire)
+            else:
+                await _delete_key(backend, link_key(link.short_code))
+            await _delete_key(backend, stats_key(link.short_code))
+        for url in urls:
+            await _delete_key(backend, search_key(url))
+        return
+
+    async with redis.pipeline(transaction=True) as pipe:
+        for link in links:
+            expire = link_cache_ttl(link)
+            if expire > 0:
+                _queue_link_write(pipe, link.short_code, serialize_link(link, expire), expire)
+            else:
+                _queue_link_delete(pipe, link.short_code)
+            pipe.delete(stats_key(link.short_code))
+            pipe.publish(LINK_ADDED_CHANNEL if created else INVALIDATION_CHANNEL, link.short_code)
+        for url in urls:
+            pipe.delete(search_key(url))
+        await pipe.execute()
+
+async def evict_links(links: list[Link]):
+    for link in links:
+        local_cache.delete(f"link:{link.short_code}")
+
+    redis = get_redis()
+    if redis is None:
+        backend = FastAPICache.get_backend()
+        for link in links:
+            await _delete_key(backend, link_key(link.short_code))
+            await _delete_key(backend, stats_key(link.short_code))
+            await _delete_key(backend, search_key(link.original_url))
+        return
+
+    async with redis.pipeline(transaction=True) as pipe:
+        for link in links:
+            _queue_link_delete(pipe, link.short_code)
+            pipe.delete(stats_key(link.short_code), search_key(link.original_url))
+            pipe.publish(INVALIDATION_CHANNEL, link.short_code)
+        await pipe.execute()
+
+class SingleFlight:
+    def __init__(self):
+        self._calls: dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, func):
+        task = self._calls.get(key)
+        if task is None:
+            # a separate task, so a cancelled caller does not fail the others
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        return await asyncio.shield(task)
+
+    def __len__(self):
+        return len(self._calls)
+
+
+link_loads = SingleFlight()
+
+
+async def load_link(short_code: str, loader) -> Optional[Link]:
+    return await link_loads.do(short_code, lambda: _load_link(short_code, loader))
+
+async def _load_link(short_code: str, loader) -> Optional[Link]:
+    redis = get_redis()
+    if not settings.SINGLE_FLIGHT_CLUSTER_LOCK or redis is None:
+        return await _load_and_cache_link(short_code, loader)
+
+    lock_key = f"lock:link:{short_code}"
+    token = uuid.uuid4().hex
+    if not await redis.set(lock_key, token, nx=True, px=settings.SINGLE_FLIGHT_LOCK_TIMEOUT):
+        # another worker is loading this code, wait for it to fill the cache
+        for _ in range(settings.SINGLE_FLIGHT_WAIT_ATTEMPTS):
+            await asyncio.sleep(settings.SINGLE_FLIGHT_WAIT_INTERVAL)
+            cached = await _read_link_entry(short_code)
+            if cached:
+                link = _load_entry(short_code, cached, allow_early_refresh=False)
+                return None if link is MISSING_LINK else link
+        return await _load_and_cache_link(short_code, loader)
+
+    try:
+        return await _load_and_cache_link(short_code, loader)
+    finally:
+        await redis.eval(RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+
+async def _load_and_cache_link(short_code: str, loader) -> Optional[Link]:
+    started = time.perf_counter()
+    link = await loader()
+    if not link:
+        await cache_missing_link(short_code)
+    elif not link.expires_at or link.expires_at >= datetime.datetime.now():
+        await cache_link(link, delta=time.perf_counter() - started)
+    return link
+
+async def listen_for_invalidations(redis):
+    reconnecting = False
+    while True:
+        pubsub = redis.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL, LINK_ADDED_CHANNEL)
+            if reconnecting:
+                # anything published while we were not subscribed is lost; the first
+                # subscribe keeps the entries the startup warm-up put in
+                local_cache.clear()
+                link_filter.reset()
+            async for message in pubsub.listen():
+                channel, short_code = message["channel"], message["data"]
+                if isinstance(channel, bytes):
+                    channel = channel.decode()
+                if isinstance(short_code, bytes):
+                    short_code = short_code.decode()
+                if channel == LINK_ADDED_CHANNEL:
+                    link_filter.add(short_code)
+                local_cache.delete(f"link:{short_code}")
+        except (RedisError, OSError) as exc:
+            logger.warning("Cache invalidation listener failed: %s", exc)
+            reconnecting = True
+            await asyncio.sleep(1)
+        finally:
+            await pubsub.aclose()
 
 async def cache_stats(short_code: str, stats: dict):
     backend = FastAPICache.get_backend()
-    await backend.set(
-        f"stats:{short_code}",
-        json.dumps({
-            "original_url": stats.get('original_url'),
-            "created_at": stats.get('created_at', None).isoformat() if stats.get('created_at', None) else None,
-            'expires_at': stats.get('expires_at', None).isoformat() if stats.get('expires_at', None) else None,
-            "click_count": stats.get('click_count'),
-            "last_accessed": stats.get('last_accessed', None).isoformat() if stats.get('last_accessed', None) else None
-        }),
-        expire=300
-    )
+    await backend.set(stats_key(short_code), encode_stats(stats), expire=jittered_ttl(settings.STATS_CACHE_TTL))
 
 async def get_cached_stats(short_code: str) -> Optional[dict]:
     backend = FastAPICache.get_backend()
-    cached = await backend.get(f"stats:{short_code}")
-    return json.loads(cached) if cached else None
+    cached = await backend.get(stats_key(short_code))
+    return decode_stats(cached) if cached else None
 
-async def cache_search_result(original_url: str, links: list[Link]):
-    backend = FastAPICache.get_backend()
-    await backend.set(
-        f"search:{original_url}",
-        json.dumps([{
-            'short_code': link.get('short_code'),
-            'created_at': link.get('created_at', None).isoformat() if link.get('created_at', None) else None,
-            'expires_at': link.get('expires_at', None).isoformat() if link.get('expires_at', None) else None,
-            'click_count': link.get('click_count'),
-            'last_accessed': link.get('last_accessed', None).isoformat() if link.get('last_accessed', None) else None
-        } for link in links]),
-        expire=600
-    )
-
-async def get_cached_search(original_url: str) -> Optional[list[Link]]:
+async def clear_cached_stats(short_codes: list[str]):
+    redis = get_redis()
+    if redis is None:
+        backend = FastAPICache.get_backend()
+        for short_code in short_codes:
+            await _delete_key(backend, stats_key(short_code))
+        return
+    if short_codes:
+        await redis.delete(*(stats_key(short_code) for short_code in short_codes))
+
+def idempotency_key(key: str, user_id: Optional[int]) -> str:
+    # keys are scoped to the caller, so one client can not replay another's response
+    return f"idempotency:{user_id or 'anonymous'}:{key}"
+
+async def get_idempotent_response(key: str, user_id: Optional[int]) -> Optional[dict]:
     backend = FastAPICache.get_backend()
-    cached = await backend.get(f"search:{original_url}")
+    cached = await backend.get(idempotency_key(key, user_id))
     return json.loads(cached) if cached else None
+
+async def cache_idempotent_response(key: str, user_id: Optional[int], request: dict, response: dict):
+    backend = FastAPICache.get_backend()
+    value = json.dumps({"request": request, "response": response})
+    await backend.set(idempotency_key(key, user_id), value, expire=settings.IDEMPOTENCY_TTL)
+
+def user_aggregates_key(user_id: int) -> str:
+    return f"user:{user_id}:agg"
+
+async def get_user_aggregates(user_id: int) -> Optional[dict]:
+    redis = get_redis()
+    if redis is None:
+        return None
+    cached = await redis.hgetall(user_aggregates_key(user_id))
+    if not cached:
+        return None
+    return {field.decode() if isinstance(field, bytes) else field: int(value) for field, value in cached.items()}
+
+async def cache_user_aggregates(user_id: int, aggregates: dict):
+    redis = get_redis()
+    if redis is None:
+        return
+    key = user_aggregates_key(user_id)
+    # HSETNX, so increments that reached an existing hash are not overwritten
+    async with redis.pipeline(transaction=True) as pipe:
+        for field, value in aggregates.items():
+            pipe.hsetnx(key, field, value)
+        pipe.expire(key, settings.USER_AGGREGATE_TTL, nx=True)
+        await pipe.execute()
+
+async def adjust_user_aggregates(changes: dict[int, tuple[int, int]]):
+    # changes maps a user id to (links delta, clicks delta)
+    redis = get_redis()
+    if redis is None or not changes:
+        return
+    async with redis.pipeline(transaction=False) as pipe:
+        for user_id, (links, clicks) in changes.items():
+            pipe.eval(ADJUST_AGGREGATES_SCRIPT, 1, user_aggregates_key(user_id), links, clicks)
+        await pipe.execute()
+
+def _user_link_changes(links: list[Link], sign: int) -> dict[int, tuple[int, int]]:
+    changes = {}
+    for link in links:
+        if link.user_id is not None:
+            count, clicks = changes.get(link.user_id, (0, 0))
+            changes[link.user_id] = (count + sign, clicks + sign * (link.click_count or 0))
+    return changes
+
+async def add_user_links(links: list[Link]):
+    await adjust_user_aggregates(_user_link_changes(links, 1))
+
+async def remove_user_links(links: list[Link]):
+    await adjust_user_aggregates(_user_link_changes(links, -1))
+
+async def cache_search_result(
+    normalized_url: str,
+    links: list[dict],
+    next_cursor: Optional[int] = None,
+    limit: int = None,
+    cursor: Optional[int] = None
+):
+    limit = limit or settings.SEARCH_PAGE_SIZE
+    value = encode_search(links, next_cursor)
+    expire = jittered_ttl(settings.SEARCH_CACHE_TTL)
+    redis = get_redis()
+    if redis is None:
+        # plain keys can only be invalidated one by one, so only the first page is cached
+        if cursor is None and limit == settings.SEARCH_PAGE_SIZE:
+            await FastAPICache.get_backend().set(search_key(normalized_url), value, expire=expire)
+        return
+
+    key = search_key(normalized_url)
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.hset(key, search_page(limit, cursor), value)
+        pipe.expire(key, expire, nx=True)
+        await pipe.execute()
+
+async def get_cached_search(
+    normalized_url: str,
+    limit: int = None,
+    cursor: Optional[int] = None
+) -> Optional[tuple[list[dict], Optional[int]]]:
+    limit = limit or settings.SEARCH_PAGE_SIZE
+    redis = get_redis()
+    if redis is None:
+        if cursor is not None or limit != settings.SEARCH_PAGE_SIZE:
+            return None
+        cached = await FastAPICache.get_backend().get(search_key(normalized_url))
+    else:
+        cached = await redis.hget(search_key(normalized_url), search_page(limit, cursor))
+    return decode_search(cached) if cached else None
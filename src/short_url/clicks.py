@@ -0,0 +1,78 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from redis.exceptions import RedisError
+import src.short_url.crud as crud
+from src.short_url.cache import adjust_user_aggregates, clear_cached_stats
+import asyncio
+import datetime
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ClickBuffer:
+    def __init__(self):
+        self._pending = {}
+        self._flushing = {}
+        self._lock = asyncio.Lock()
+
+    def record(self, short_code: str):
+        count, _ = self._pending.get(short_code, (0, None))
+        self._pending[short_code] = (count + 1, datetime.datetime.now())
+
+    def pending(self, short_code: str) -> tuple[int, Optional[datetime.datetime]]:
+        count, last_accessed = self._pending.get(short_code, (0, None))
+        flushing_count, flushing_accessed = self._flushing.get(short_code, (0, None))
+        return count + flushing_count, last_accessed or flushing_accessed
+
+    def merge_stats(self, short_code: str, stats: dict) -> dict:
+        count, last_accessed = self.pending(short_code)
+        if not count:
+            return stats
+        return {
+            **stats,
+            "click_count": (stats.get("click_count") or 0) + count,
+            "last_accessed": last_accessed
+        }
+
+    def clear(self):
+        self._pending.clear()
+
+    async def flush(self, db: AsyncSession) -> int:
+        async with self._lock:
+            if not self._pending:
+                return 0
+
+            self._flushing, self._pending = self._pending, {}
+            try:
+                user_clicks = await crud.flush_click_counts(db, self._flushing)
+            except BaseException:
+                # cancellation included: shutdown cancels the flusher and flushes once more
+                self._restore(self._flushing)
+                self._flushing = {}
+                raise
+
+            # cached stats hold the count from before the flush, pending clicks
+            # must stop being merged on top only once they are gone
+            try:
+                await clear_cached_stats(list(self._flushing))
+            except (RedisError, OSError) as exc:
+                logger.warning("Could not clear cached stats: %s", exc)
+            finally:
+                flushed = len(self._flushing)
+                self._flushing = {}
+
+        # the clicks are committed, a stale aggregate only lives until its TTL
+        try:
+            await adjust_user_aggregates({user_id: (0, count) for user_id, count in user_clicks.items()})
+        except (RedisError, OSError) as exc:
+            logger.warning("Could not update user aggregates: %s", exc)
+        return flushed
+
+    def _restore(self, clicks: dict):
+        for short_code, (count, last_accessed) in clicks.items():
+            pending_count, pending_accessed = self._pending.get(short_code, (0, None))
+            self._pending[short_code] = (count + pending_count, pending_accessed or last_accessed)
+
+
+click_buffer = ClickBuffer()
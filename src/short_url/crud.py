@@ -1,20 +1,95 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import update, delete, and_, or_
+from sqlalchemy import update, delete, func, and_, or_, any_, bindparam, values, column, table, tuple_, literal, exists, union_all, String, Integer, DateTime
+from sqlalchemy.orm import aliased
+from sqlalchemy.dialects.postgresql import insert, ARRAY
 from src.short_url.schemas import LinkCreate
+from src.config import settings
 import src.models as models
+from src.short_url.partitions import DEFAULT_PARTITION, is_partitioned
+import asyncio
+import base64
 import hashlib
 import datetime
+import json
+import string
 from urllib.parse import urlparse, unquote
 
+CLICK_FLUSH_CHUNK_SIZE = 5000
+
+BASE62_ALPHABET = string.digits + string.ascii_letters
+SHORT_CODE_LENGTH = 7
+SHORT_CODE_SPACE = 62 ** SHORT_CODE_LENGTH
+# coprime with 62 ** 7, so scramble_id is a bijection on the code space
+SHORT_CODE_MULTIPLIER = 1000000007
+SHORT_CODE_ATTEMPTS = 3
+
+USER_LINK_SORTS = {
+    "recent": models.Link.created_at,
+    "clicks": models.Link.click_count,
+}
+
 def generate_short_code(url: str):
     return hashlib.md5(url.encode()).hexdigest()[:6]
 
+def encode_base62(number: int, length: int = SHORT_CODE_LENGTH) -> str:
+    chars = []
+    for _ in range(length):
+        number, remainder = divmod(number, 62)
+        chars.append(BASE62_ALPHABET[remainder])
+    return "".join(reversed(chars))
+
+def scramble_id(number: int) -> int:
+    return (number * SHORT_CODE_MULTIPLIER) % SHORT_CODE_SPACE
+
+async def reserve_code_block(db: AsyncSession) -> int:
+    result = await db.execute(select(models.short_code_block_seq.next_value()))
+    return result.scalar_one()
+
+
+class HashCodeGenerator:
+    async def next_code(self, db: AsyncSession, url: str) -> str:
+        return generate_short_code(url)
+
+
+class BlockCodeGenerator:
+    def __init__(self, block_size: int, reserve_block=reserve_code_block):
+        self.block_size = block_size
+        self.reserve_block = reserve_block
+        self._next = 0
+        self._end = 0
+        self._lock = asyncio.Lock()
+
+    async def next_code(self, db: AsyncSession, url: str) -> str:
+        if self._next >= self._end:
+            async with self._lock:
+                if self._next >= self._end:
+                    self._next = await self.reserve_block(db)
+                    self._end = self._next + self.block_size
+
+        number = self._next
+        self._next += 1
+        return encode_base62(scramble_id(number))
+
+
+def build_code_generator(name: str):
+    if name == "hash":
+        return HashCodeGenerator()
+    if name == "block":
+        return BlockCodeGenerator(min(settings.SHORT_CODE_BLOCK_SIZE, models.SHORT_CODE_BLOCK_INCREMENT))
+    raise ValueError(f"Unknown short code generator: {name}")
+
+
+code_generator = build_code_generator(settings.SHORT_CODE_GENERATOR)
+
 def normalize_url(url: str) -> str:
     if not url:
         return url
     
     decoded = unquote(url)
+    if "://" not in decoded:
+        # parsed as a network location, otherwise the host would end up in the path with its case kept
+        decoded = f"//{decoded}"
     parsed = urlparse(decoded)
     scheme = parsed.scheme.lower() if parsed.scheme else 'https'
     netloc = parsed.netloc.lower()
@@ -26,39 +101,253 @@ def normalize_url(url: str) -> str:
     
     return normalized
 
+def url_hash(normalized_url: str) -> str:
+    # matches md5(original_url) in Postgres, used for the backfill
+    return hashlib.md5(normalized_url.encode()).hexdigest()
+
+def url_host(normalized_url: str) -> str:
+    # matches lower(substring(original_url from '://([^/?#]*)')) in Postgres, used for the backfill
+    return urlparse(normalized_url).netloc.lower()
+
+def encode_cursor(value, link_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([value, link_id]).encode()).decode()
+
+def decode_cursor(cursor: str, parse=str) -> tuple:
+    try:
+        value, link_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(link_id, int):
+            raise ValueError
+        return parse(value), link_id
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
 async def check_short_link_exists(db: AsyncSession, short_code: str):
     stmt = select(models.Link).where(models.Link.short_code == short_code)
     result = await db.execute(stmt)
     return result.scalars().first()
 
+async def lock_link_urls(db: AsyncSession, normalized_urls: list[str], user_id: int = None):
+    # held until commit, so concurrent requests for the same url and owner can not both insert;
+    # taken in sorted order, so two batches sharing urls can not deadlock
+    keys = sorted({f"link:{url_hash(normalized_url)}:{user_id}" for normalized_url in normalized_urls})
+    lock_keys = func.unnest(bindparam("lock_keys", keys, type_=ARRAY(String))).table_valued("key")
+    await db.execute(select(func.pg_advisory_xact_lock(func.hashtext(lock_keys.c.key))))
+
+def existing_link_query(
+    normalized_url: str,
+    user_id: int = None,
+    expires_at: datetime.datetime = None,
+    short_code: str = None
+):
+    stmt = select(models.Link).where(
+        models.Link.url_hash == url_hash(normalized_url),
+        models.Link.original_url == normalized_url,
+        models.Link.user_id.is_(None) if user_id is None else models.Link.user_id == user_id,
+        models.Link.expires_at.is_(None) if expires_at is None else models.Link.expires_at == expires_at,
+        or_(models.Link.expires_at.is_(None), models.Link.expires_at > func.now())
+    )
+    if short_code:
+        stmt = stmt.where(models.Link.short_code == short_code)
+    return stmt.order_by(models.Link.link_id).limit(1)
+
+def get_or_insert_link_query(normalized_url: str, short_code: str, link: LinkCreate, user_id: int = None):
+    # one statement: the insert only runs when the lookup found nothing, and the
+    # result carries whichever row there is along with whether it was created
+    existing = existing_link_query(normalized_url, user_id, link.expires_at, link.custom_alias).cte("existing")
+    new_link = select(
+        literal(normalized_url, String),
+        literal(url_hash(normalized_url), String),
+        literal(url_host(normalized_url), String),
+        literal(short_code, String),
+        literal(link.expires_at, DateTime),
+        literal(user_id, Integer),
+        # column defaults are not applied to an insert nested in a CTE
+        literal(datetime.datetime.now(), DateTime),
+        literal(0, Integer)
+    ).where(~exists(select(existing.c.link_id)))
+    inserted = (
+        insert(models.Link)
+        .from_select(
+            ["original_url", "url_hash", "host", "short_code", "expires_at", "user_id", "created_at", "click_count"],
+            new_link
+        )
+        .on_conflict_do_nothing()
+        .returning(*models.Link.__table__.c)
+        .cte("inserted")
+    )
+    found = union_all(
+        select(existing, literal(False).label("created")),
+        select(inserted, literal(True).label("created"))
+    ).subquery()
+    return select(aliased(models.Link, found), found.c.created)
+
 async def create_link(db: AsyncSession, link: LinkCreate, user_id: int = None):
     normalized_url = normalize_url(link.original_url)
-    short_code = link.custom_alias if link.custom_alias else generate_short_code(normalized_url)
-    short_link_flag = await check_short_link_exists(db, short_code)
 
-    if short_link_flag:
+    # a generated code can only clash with a custom alias, so retry a few times;
+    # no conflict target, the partitioned table enforces uniqueness with a trigger instead
+    for _ in range(1 if link.custom_alias else SHORT_CODE_ATTEMPTS):
+        short_code = link.custom_alias or await code_generator.next_code(db, normalized_url)
+        stmt = (
+            insert(models.Link)
+            .values(
+                original_url=normalized_url,
+                url_hash=url_hash(normalized_url),
+                host=url_host(normalized_url),
+                short_code=short_code,
+                expires_at=link.expires_at,
+                user_id=user_id
+            )
+            .on_conflict_do_nothing()
+            .returning(models.Link)
+        )
+        result = await db.execute(stmt)
+        db_link = result.scalars().first()
+        if db_link:
+            break
+    await db.commit()
+
+    if not db_link:
         return False
+    return db_link
 
-    db_link = models.Link(
-        original_url=normalized_url,
-        short_code=short_code,
-        expires_at=link.expires_at,
-        user_id=user_id
+async def get_or_create_link(db: AsyncSession, link: LinkCreate, user_id: int = None):
+    # shortening the same url again returns the link created the first time
+    normalized_url = normalize_url(link.original_url)
+    short_code = link.custom_alias or await code_generator.next_code(db, normalized_url)
+    await lock_link_urls(db, [normalized_url], user_id)
+    result = await db.execute(get_or_insert_link_query(normalized_url, short_code, link, user_id))
+    row = result.first()
+    if row:
+        await db.commit()
+        return row[0], row.created
+    if link.custom_alias:
+        await db.commit()
+        return False, False
+
+    # the generated code was taken by a custom alias, the lock is still held
+    db_link = await create_link(db, link, user_id)
+    return db_link, bool(db_link)
+
+def matches_existing_link(db_link, normalized_url: str, link: LinkCreate) -> bool:
+    return (
+        db_link.original_url == normalized_url
+        and db_link.expires_at == link.expires_at
+        and (not link.custom_alias or db_link.short_code == link.custom_alias)
     )
-    db.add(db_link)
+
+async def find_existing_links(db: AsyncSession, normalized_urls: list[str], links: list[LinkCreate], user_id: int = None):
+    hashes = list({url_hash(normalized_url) for normalized_url in normalized_urls})
+    stmt = select(models.Link).where(
+        models.Link.url_hash == any_(bindparam("url_hashes", hashes, type_=ARRAY(String))),
+        models.Link.user_id.is_(None) if user_id is None else models.Link.user_id == user_id,
+        or_(models.Link.expires_at.is_(None), models.Link.expires_at > func.now())
+    ).order_by(models.Link.link_id)
+    result = await db.execute(stmt)
+    candidates = {}
+    for db_link in result.scalars().all():
+        candidates.setdefault(db_link.original_url, []).append(db_link)
+
+    # the oldest match wins, as in existing_link_query
+    return [
+        next((
+            db_link for db_link in candidates.get(normalized_url, [])
+            if matches_existing_link(db_link, normalized_url, link)
+        ), None)
+        for normalized_url, link in zip(normalized_urls, links)
+    ]
+
+async def get_or_create_links(db: AsyncSession, links: list[LinkCreate], user_id: int = None):
+    # same semantics as get_or_create_link for every item: known urls return their link
+    if not links:
+        return []
+
+    normalized_urls = [normalize_url(link.original_url) for link in links]
+    await lock_link_urls(db, normalized_urls, user_id)
+    existing = await find_existing_links(db, normalized_urls, links, user_id)
+    results = [(db_link, False) if db_link else None for db_link in existing]
+
+    # repeats of the same url within the batch share the first one's link
+    first_seen = {}
+    for index, (normalized_url, link) in enumerate(zip(normalized_urls, links)):
+        if results[index] is None:
+            first_seen.setdefault((normalized_url, link.expires_at, link.custom_alias), index)
+    created = [None] * len(links)
+    pending = sorted(first_seen.values())
+
+    for _ in range(SHORT_CODE_ATTEMPTS):
+        if not pending:
+            break
+        rows = {}
+        for index in pending:
+            link = links[index]
+            short_code = link.custom_alias or await code_generator.next_code(db, normalized_urls[index])
+            # the first occurrence of an alias within the batch wins
+            if short_code not in rows:
+                rows[short_code] = index
+
+        stmt = (
+            insert(models.Link)
+            .values([
+                {
+                    "original_url": normalized_urls[index],
+                    "url_hash": url_hash(normalized_urls[index]),
+                    "host": url_host(normalized_urls[index]),
+                    "short_code": short_code,
+                    "expires_at": links[index].expires_at,
+                    "user_id": user_id
+                }
+                for short_code, index in rows.items()
+            ])
+            .on_conflict_do_nothing()
+            .returning(models.Link)
+        )
+        result = await db.execute(stmt)
+        for db_link in result.scalars():
+            created[rows[db_link.short_code]] = db_link
+
+        pending = [index for index in pending if created[index] is None and not links[index].custom_alias]
     await db.commit()
-    await db.refresh(db_link)
-    return db_link
+
+    for index, (normalized_url, link) in enumerate(zip(normalized_urls, links)):
+        if results[index] is None:
+            first = first_seen[(normalized_url, link.expires_at, link.custom_alias)]
+            results[index] = (created[first], index == first and created[first] is not None)
+    return results
 
 async def get_link_by_short_code(db: AsyncSession, short_code: str):
     stmt = select(models.Link).where(models.Link.short_code == short_code)
     result = await db.execute(stmt)
     return result.scalars().first()
 
-async def update_link_stats(db: AsyncSession, link: models.Link):
-    link.click_count += 1
-    link.last_accessed = datetime.datetime.now()
-    await db.commit()
+async def get_links_by_short_codes(db: AsyncSession, short_codes: list[str]):
+    stmt = select(models.Link).where(
+        models.Link.short_code == any_(bindparam("short_codes", short_codes, type_=ARRAY(String)))
+    )
+    result = await db.execute(stmt)
+    return result.scalars().all()
+
+async def count_links(db: AsyncSession) -> int:
+    result = await db.execute(select(func.count()).select_from(models.Link))
+    return result.scalar_one()
+
+async def stream_short_codes(db: AsyncSession, batch_size: int = 10000):
+    result = await db.stream_scalars(
+        select(models.Link.short_code).execution_options(yield_per=batch_size)
+    )
+    async for short_code in result:
+        yield short_code
+
+async def stream_hot_links(db: AsyncSession, limit: int, batch_size: int = 1000):
+    stmt = select(models.Link).where(
+        or_(models.Link.expires_at.is_(None), models.Link.expires_at > func.now())
+    ).order_by(
+        models.Link.click_count.desc(),
+        models.Link.last_accessed.desc().nulls_last()
+    ).limit(limit).execution_options(yield_per=batch_size)
+    result = await db.stream_scalars(stmt)
+    async for batch in result.partitions():
+        yield batch
 
 async def delete_link(db: AsyncSession, short_code: str):
     short_link_flag = await check_short_link_exists(db, short_code)
@@ -71,18 +360,17 @@ async def delete_link(db: AsyncSession, short_code: str):
 
 async def update_link(db: AsyncSession, short_code: str, new_url: str):
     normalized_url = normalize_url(new_url)
-    short_link_flag = await check_short_link_exists(db, short_code)
-
-    if short_link_flag:
-        stmt = (
-            update(models.Link)
-            .where(models.Link.short_code == short_code)
-            .values(original_url=normalized_url)
-        )
-        await db.execute(stmt)
+    stmt = (
+        update(models.Link)
+        .where(models.Link.short_code == short_code)
+        .values(original_url=normalized_url, url_hash=url_hash(normalized_url), host=url_host(normalized_url))
+        .returning(models.Link)
+    )
+    result = await db.execute(stmt)
+    link = result.scalars().first()
+    if link:
         await db.commit()
-        return True
-    return False
+    return link
 
 async def get_link_stats(db: AsyncSession, short_code: str):
     link = await get_link_by_short_code(db, short_code)
@@ -96,18 +384,26 @@ async def get_link_stats(db: AsyncSession, short_code: str):
         }
     return None
 
-async def search_link_by_url(db: AsyncSession, original_url: str):
+async def search_link_by_url(db: AsyncSession, original_url: str, limit: int = None, cursor: int = None):
     normalized_url = normalize_url(original_url)
+    limit = limit or settings.SEARCH_PAGE_SIZE
     stmt = select(
+        models.Link.link_id,
         models.Link.short_code,
         models.Link.created_at,
         models.Link.click_count,
         models.Link.expires_at,
         models.Link.last_accessed
     ).where(
+        models.Link.url_hash == url_hash(normalized_url),
         models.Link.original_url == normalized_url
     )
-    result = await db.execute(stmt)
+    if cursor is not None:
+        stmt = stmt.where(models.Link.link_id > cursor)
+    # one extra row tells whether another page follows
+    result = await db.execute(stmt.order_by(models.Link.link_id).limit(limit + 1))
+    rows = result.all()
+    next_cursor = rows[limit - 1].link_id if len(rows) > limit else None
     return [
         {
             'short_code': row.short_code,
@@ -116,49 +412,231 @@ async def search_link_by_url(db: AsyncSession, original_url: str):
             'click_count': row.click_count,
             'last_accessed': row.last_accessed
         }
-        for row in result
-    ]
+        for row in rows[:limit]
+    ], next_cursor
 
-async def delete_expired_links(db: AsyncSession):
-    link = select(models.Link).where(models.Link.expires_at < datetime.datetime.now())
-    result = await db.execute(link)
-    expired_links = result.scalars().all()
+async def stream_links_by_prefix(
+    db: AsyncSession,
+    url_prefix: str,
+    limit: int = None,
+    cursor: tuple[str, int] = None,
+    batch_size: int = 500
+):
+    normalized_url = normalize_url(url_prefix)
+    if url_prefix.endswith('/') and not normalized_url.endswith('/'):
+        normalized_url += '/'
+    host = url_host(normalized_url)
+    scheme, _, rest = normalized_url.partition("://")
+    path = rest[len(host):]
+    # byte order, so the (host, original_url COLLATE "C", link_id) index serves
+    # both the prefix range and the keyset ordering
+    sort_url = models.Link.original_url.collate("C")
 
-    for link in expired_links:
-        await db.delete(link)
-    await db.commit()
+    stmt = select(
+        models.Link.link_id,
+        models.Link.short_code,
+        models.Link.original_url,
+        models.Link.created_at,
+        models.Link.expires_at,
+        models.Link.click_count
+    ).where(models.Link.host == host)
+    if path:
+        pattern = f"{scheme}://{host}{path}".replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        stmt = stmt.where(sort_url.like(f"{pattern}%", escape="\\"))
+    if cursor is not None:
+        stmt = stmt.where(tuple_(sort_url, models.Link.link_id) > tuple_(cursor[0], cursor[1]))
+    stmt = stmt.order_by(sort_url, models.Link.link_id).limit(limit or settings.PREFIX_SEARCH_PAGE_SIZE)
 
-async def delete_inactive_links(db: AsyncSession, days: int=1):
-    one_week_ago = datetime.datetime.now() - datetime.timedelta(days=days)
-    
-    condition = or_(
-        models.Link.last_accessed < one_week_ago,
+    result = await db.stream(stmt.execution_options(yield_per=batch_size))
+    async for row in result:
+        yield {
+            'short_code': row.short_code,
+            'original_url': row.original_url,
+            'created_at': row.created_at,
+            'expires_at': row.expires_at,
+            'click_count': row.click_count,
+            'cursor': encode_cursor(row.original_url, row.link_id)
+        }
+
+async def list_user_links(
+    db: AsyncSession,
+    user_id: int,
+    sort: str = "recent",
+    limit: int = None,
+    cursor: tuple = None
+):
+    limit = limit or settings.MY_LINKS_PAGE_SIZE
+    sort_column = USER_LINK_SORTS[sort]
+    stmt = select(
+        models.Link.link_id,
+        models.Link.short_code,
+        models.Link.original_url,
+        models.Link.created_at,
+        models.Link.expires_at,
+        models.Link.click_count,
+        models.Link.last_accessed
+    ).where(models.Link.user_id == user_id)
+    if cursor is not None:
+        stmt = stmt.where(tuple_(sort_column, models.Link.link_id) < tuple_(cursor[0], cursor[1]))
+    # one extra row tells whether another page follows
+    result = await db.execute(
+        stmt.order_by(sort_column.desc(), models.Link.link_id.desc()).limit(limit + 1)
+    )
+    rows = result.all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        value = last.created_at.isoformat() if sort == "recent" else last.click_count
+        next_cursor = encode_cursor(value, last.link_id)
+    return [
+        {
+            'short_code': row.short_code,
+            'original_url': row.original_url,
+            'created_at': row.created_at,
+            'expires_at': row.expires_at,
+            'click_count': row.click_count,
+            'last_accessed': row.last_accessed
+        }
+        for row in rows[:limit]
+    ], next_cursor
+
+async def stream_user_links(db: AsyncSession, user_id: int, batch_size: int = None):
+    # server side cursor, only one batch of rows is held at a time
+    stmt = select(
+        models.Link.short_code,
+        models.Link.original_url,
+        models.Link.created_at,
+        models.Link.expires_at,
+        models.Link.click_count,
+        models.Link.last_accessed
+    ).where(
+        models.Link.user_id == user_id
+    ).order_by(
+        models.Link.created_at,
+        models.Link.link_id
+    ).execution_options(yield_per=batch_size or settings.EXPORT_BATCH_SIZE)
+    result = await db.stream(stmt)
+    async for rows in result.partitions():
+        yield rows
+
+def parse_user_links_cursor(cursor: str, sort: str) -> tuple:
+    return decode_cursor(cursor, datetime.datetime.fromisoformat if sort == "recent" else int)
+
+async def count_user_links(db: AsyncSession, user_id: int) -> dict:
+    result = await db.execute(
+        select(func.count(), func.coalesce(func.sum(models.Link.click_count), 0))
+        .where(models.Link.user_id == user_id)
+    )
+    total_links, total_clicks = result.one()
+    return {"total_links": total_links, "total_clicks": total_clicks}
+
+def link_table(name: str = None):
+    # the links columns under another name, such as a single partition
+    if name is None:
+        return models.Link.__table__
+    return table(name, *(column(c.name, c.type) for c in models.Link.__table__.c))
+
+def expired_condition(now: datetime.datetime, links=None):
+    links = models.Link.__table__ if links is None else links
+    return links.c.expires_at < now
+
+def inactive_condition(cutoff: datetime.datetime):
+    # each branch is served by its own partial index
+    return or_(
+        models.Link.last_accessed < cutoff,
         and_(
             models.Link.last_accessed.is_(None),
-            models.Link.created_at < one_week_ago
+            models.Link.created_at < cutoff
         )
     )
 
-    stmt = select(models.Link).where(condition)
-    result = await db.execute(stmt)
-    inactive_links = result.scalars().all()
+async def delete_links_in_batches(
+    db: AsyncSession,
+    condition,
+    batch_size: int = None,
+    pause: float = None,
+    on_batch=None,
+    links=None
+) -> int:
+    links = models.Link.__table__ if links is None else links
+    batch_size = batch_size or settings.CLEANUP_BATCH_SIZE
+    pause = settings.CLEANUP_BATCH_PAUSE if pause is None else pause
+    last_id = 0
+    deleted = 0
 
-    if inactive_links:
-        await db.execute(
-            delete(models.Link).where(
-                models.Link.link_id.in_([link.link_id for link in inactive_links])
+    while True:
+        # short transactions over link_id ranges; rows locked by others are left for the next run
+        candidates = (
+            select(links.c.link_id)
+            .where(condition, links.c.link_id > last_id)
+            .order_by(links.c.link_id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        stmt = (
+            delete(links)
+            .where(links.c.link_id.in_(candidates.scalar_subquery()))
+            .returning(
+                links.c.link_id,
+                links.c.short_code,
+                links.c.original_url,
+                links.c.user_id,
+                links.c.click_count
             )
+            .execution_options(synchronize_session=False)
         )
+        result = await db.execute(stmt)
+        rows = result.all()
         await db.commit()
-    
-    return {"deleted_count": len(inactive_links)}
+        if not rows:
+            break
 
-async def count_clicks_in_cache(db: AsyncSession, short_code: str):
-    await db.execute(
-        update(models.Link)
-        .where(models.Link.short_code == short_code)
-        .values(click_count=models.Link.click_count + 1)
+        deleted += len(rows)
+        last_id = max(row.link_id for row in rows)
+        if on_batch:
+            await on_batch(rows)
+        await asyncio.sleep(pause)
+
+    return deleted
+
+async def delete_expired_links(db: AsyncSession, on_batch=None) -> int:
+    # monthly partitions are dropped whole, only the default partition needs a row sweep
+    links = link_table(DEFAULT_PARTITION) if await is_partitioned(db) else link_table()
+    return await delete_links_in_batches(
+        db, expired_condition(datetime.datetime.now(), links), on_batch=on_batch, links=links
     )
+
+async def delete_inactive_links(db: AsyncSession, days: int=1, on_batch=None):
+    one_week_ago = datetime.datetime.now() - datetime.timedelta(days=days)
+    deleted = await delete_links_in_batches(db, inactive_condition(one_week_ago), on_batch=on_batch)
+    return {"deleted_count": deleted}
+
+async def flush_click_counts(db: AsyncSession, clicks: dict) -> dict[int, int]:
+    # returns the flushed clicks per owner, for the cached user aggregates
+    user_clicks = {}
+    items = list(clicks.items())
+    for start in range(0, len(items), CLICK_FLUSH_CHUNK_SIZE):
+        pending = values(
+            column("short_code", String),
+            column("clicks", Integer),
+            column("last_accessed", DateTime),
+            name="pending_clicks"
+        ).data([
+            (short_code, count, last_accessed)
+            for short_code, (count, last_accessed) in items[start:start + CLICK_FLUSH_CHUNK_SIZE]
+        ])
+        result = await db.execute(
+            update(models.Link)
+            .where(models.Link.short_code == pending.c.short_code)
+            .values(
+                click_count=models.Link.click_count + pending.c.clicks,
+                last_accessed=pending.c.last_accessed
+            )
+            .returning(models.Link.user_id, pending.c.clicks)
+        )
+        for user_id, count in result.all():
+            if user_id is not None:
+                user_clicks[user_id] = user_clicks.get(user_id, 0) + count
     await db.commit()
-    
-    return {"added click from cache": short_code}
+    return user_clicks
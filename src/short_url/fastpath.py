@@ -0,0 +1,67 @@
+from functools import lru_cache
+from urllib.parse import quote
+from src.config import settings
+from src.short_url.bloom import link_filter
+from src.short_url.cache import MISSING_LINK, lookup_cached_link
+from src.short_url.clicks import click_buffer
+import datetime
+
+LINKS_PREFIX = "/links/"
+NOT_FOUND_BODY = b'{"detail":"Link not found or expired"}'
+NOT_FOUND_HEADERS = [(b"content-type", b"application/json"), (b"content-length", str(len(NOT_FOUND_BODY)).encode())]
+PREVIEW_PURPOSES = (b"preview", b"prefetch", b"prerender")
+CACHE_MISS_STATE = "redirect_cache_miss"
+
+
+@lru_cache(maxsize=settings.LOCAL_CACHE_MAXSIZE)
+def redirect_headers(original_url: str) -> list:
+    # same escaping as starlette's RedirectResponse
+    location = quote(original_url, safe=":/%#?=@[]!$&'()*+,;").encode("latin-1")
+    return [(b"location", location), (b"content-length", b"0")]
+
+def reserved_paths(routes) -> set[str]:
+    # static GET routes such as /links/mine must keep going through the router
+    return {
+        route.path[len(LINKS_PREFIX):]
+        for route in routes
+        if route.path.startswith(LINKS_PREFIX) and "{" not in route.path and "GET" in getattr(route, "methods", ())
+    }
+
+def is_preview(headers) -> bool:
+    for name, value in headers:
+        if name == b"sec-purpose":
+            value = value.lower()
+            return any(purpose in value for purpose in PREVIEW_PURPOSES)
+    return False
+
+
+class RedirectFastPath:
+    def __init__(self, app, routes=()):
+        self.app = app
+        self.reserved = reserved_paths(routes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET" or not scope["path"].startswith(LINKS_PREFIX):
+            return await self.app(scope, receive, send)
+
+        short_code = scope["path"][len(LINKS_PREFIX):]
+        if not short_code or "/" in short_code or short_code in self.reserved:
+            return await self.app(scope, receive, send)
+
+        link = await lookup_cached_link(short_code)
+        if link is None and link_filter.might_exist(short_code):
+            # cache misses take the regular route and its database fallback; the route must
+            # not read the cache again, a second XFetch roll would mostly undo an early refresh
+            scope.setdefault("state", {})[CACHE_MISS_STATE] = True
+            return await self.app(scope, receive, send)
+        if link is None or link is MISSING_LINK or (link.expires_at and link.expires_at < datetime.datetime.now()):
+            return await self._send(send, 404, NOT_FOUND_HEADERS, NOT_FOUND_BODY)
+
+        if not is_preview(scope["headers"]):
+            click_buffer.record(short_code)
+        await self._send(send, 302, redirect_headers(link.original_url))
+
+    @staticmethod
+    async def _send(send, status: int, headers: list, body: bytes = b""):
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
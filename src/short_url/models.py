@@ -10,10 +10,12 @@ links = Table(
     metadata,
     Column("link_id", Integer, primary_key=True, index=True, autoincrement=True),
     Column("original_url", String, nullable=False),
+    Column("url_hash", String(32), index=True),
+    Column("host", String),
     Column("short_code", String, unique=True, nullable=False),
     Column("created_at", DateTime, default=datetime.now),
     Column("expires_at", DateTime),
-    Column("user_id", Integer, ForeignKey('users.id')),
+    Column("user_id", Integer, ForeignKey('users.id'), index=True),
     Column("click_count", Integer, default=0),
     Column("last_accessed", DateTime)
 )
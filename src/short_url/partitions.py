@@ -0,0 +1,143 @@
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.config import settings
+import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+PARTITION_PREFIX = "links_p"
+DEFAULT_PARTITION = "links_default"
+CHECK_VIOLATION = "23514"
+LINK_COLUMNS = "link_id, original_url, url_hash, host, short_code, created_at, expires_at, user_id, click_count, last_accessed"
+
+
+def month_start(moment: datetime.datetime) -> datetime.datetime:
+    return datetime.datetime(moment.year, moment.month, 1)
+
+def add_months(moment: datetime.datetime, months: int) -> datetime.datetime:
+    month = moment.month - 1 + months
+    return datetime.datetime(moment.year + month // 12, month % 12 + 1, 1)
+
+def partition_name(start: datetime.datetime) -> str:
+    return f"{PARTITION_PREFIX}{start:%Y%m}"
+
+def partition_start(name: str) -> datetime.datetime:
+    return datetime.datetime.strptime(name[len(PARTITION_PREFIX):], "%Y%m")
+
+async def is_partitioned(db: AsyncSession) -> bool:
+    result = await db.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass('links')"))
+    return result.scalar() == "p"
+
+async def list_partitions(db: AsyncSession) -> list[str]:
+    result = await db.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE pg_inherits.inhparent = to_regclass('links')"
+    ))
+    return sorted(name for name in result.scalars() if name.startswith(PARTITION_PREFIX))
+
+def is_partition_pending(exc: IntegrityError) -> bool:
+    # an insert into the month create_partition is attaching, rejected by its constraint
+    return getattr(exc.orig, "pgcode", None) == CHECK_VIOLATION and f"{DEFAULT_PARTITION}_not_" in str(exc.orig)
+
+async def create_partition(db: AsyncSession, start: datetime.datetime) -> int:
+    end = add_months(start, 1)
+    name = partition_name(start)
+    check = f"{DEFAULT_PARTITION}_not_{name}"
+    bounds = {"start": start, "end": end}
+    try:
+        # a run that died before its cleanup leaves the table and the constraint behind
+        await db.execute(text(f"CREATE TABLE IF NOT EXISTS {name} (LIKE links INCLUDING DEFAULTS)"))
+        await db.execute(text(f"ALTER TABLE {DEFAULT_PARTITION} DROP CONSTRAINT IF EXISTS {check}"))
+        # without a validated constraint ATTACH would scan the whole default partition under
+        # an ACCESS EXCLUSIVE lock; from here until the attach, rows of this month can not be
+        # inserted (answered with 503), which is why partitions are created months ahead
+        await db.execute(text(
+            f"ALTER TABLE {DEFAULT_PARTITION} ADD CONSTRAINT {check} "
+            f"CHECK (expires_at IS NULL OR expires_at < '{start.isoformat()}' OR expires_at >= '{end.isoformat()}') NOT VALID"
+        ))
+        # rows of this month that were waiting in the default partition, otherwise validation fails
+        moved = await db.execute(
+            text(
+                f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE expires_at >= :start AND expires_at < :end "
+                f"RETURNING {LINK_COLUMNS}) INSERT INTO {name} ({LINK_COLUMNS}) SELECT {LINK_COLUMNS} FROM moved"
+            ),
+            bounds
+        )
+        await db.commit()
+        # VALIDATE only takes SHARE UPDATE EXCLUSIVE, reads and writes keep going
+        await db.execute(text(f"ALTER TABLE {DEFAULT_PARTITION} VALIDATE CONSTRAINT {check}"))
+        await db.commit()
+        await db.execute(text(
+            f"ALTER TABLE links ATTACH PARTITION {name} FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        ))
+        await db.commit()
+        await db.execute(text(f"ALTER TABLE {DEFAULT_PARTITION} DROP CONSTRAINT {check}"))
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        await abandon_partition(db, name, check)
+        raise
+    return moved.rowcount
+
+async def abandon_partition(db: AsyncSession, name: str, check: str):
+    # lift the constraint so this month can be inserted again, and put the moved rows
+    # back unless the table made it into the partition tree
+    try:
+        await db.execute(text(f"ALTER TABLE {DEFAULT_PARTITION} DROP CONSTRAINT IF EXISTS {check}"))
+        state = await db.execute(
+            text(
+                "SELECT to_regclass(:name) IS NOT NULL AS created, "
+                "EXISTS (SELECT 1 FROM pg_inherits WHERE inhrelid = to_regclass(:name)) AS attached"
+            ),
+            {"name": name}
+        )
+        created, attached = state.one()
+        if created and not attached:
+            await db.execute(text(
+                f"WITH moved AS (DELETE FROM {name} RETURNING {LINK_COLUMNS}) "
+                f"INSERT INTO {DEFAULT_PARTITION} ({LINK_COLUMNS}) SELECT {LINK_COLUMNS} FROM moved"
+            ))
+            await db.execute(text(f"DROP TABLE {name}"))
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        logger.exception("Could not clean up partition %s, the next run picks it up", name)
+
+async def precreate_partitions(db: AsyncSession, now: datetime.datetime = None, months_ahead: int = None) -> int:
+    now = now or datetime.datetime.now()
+    months_ahead = settings.PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    existing = set(await list_partitions(db))
+    created = 0
+    for offset in range(months_ahead + 1):
+        start = add_months(month_start(now), offset)
+        if partition_name(start) not in existing:
+            moved = await create_partition(db, start)
+            logger.info("Created partition %s, moved %d rows from the default partition", partition_name(start), moved)
+            created += 1
+    return created
+
+async def drop_expired_partitions(db: AsyncSession, now: datetime.datetime = None) -> int:
+    # every link in a partition whose range has ended is expired, and their cache
+    # entries are already gone because link TTLs never outlive expires_at
+    now = now or datetime.datetime.now()
+    dropped_rows = 0
+    for name in await list_partitions(db):
+        if add_months(partition_start(name), 1) > now:
+            continue
+        rows = await db.execute(text("SELECT reltuples::bigint FROM pg_class WHERE relname = :name"), {"name": name})
+        dropped_rows += max(rows.scalar() or 0, 0)
+        await db.execute(text(f"ALTER TABLE links DETACH PARTITION {name}"))
+        if not settings.PARTITION_DETACH_ONLY:
+            await db.execute(text(f"DROP TABLE {name}"))
+        await db.commit()
+        logger.info("Retired partition %s", name)
+    return dropped_rows
+
+async def maintain_partitions(db: AsyncSession, now: datetime.datetime = None) -> int:
+    if not await is_partitioned(db):
+        return 0
+    await precreate_partitions(db, now)
+    return await drop_expired_partitions(db, now)
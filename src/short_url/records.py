@@ -0,0 +1,118 @@
+import datetime
+import struct
+from typing import NamedTuple, Optional
+
+RECORD_VERSION = 1
+EPOCH = datetime.datetime(1970, 1, 1)
+NO_TIME = -2 ** 63
+
+# version, expires_at, cache_expiry, delta, click_count, then the url bytes
+LINK_RECORD = struct.Struct("<BqdfI")
+# version, created_at, expires_at, last_accessed, click_count, then the url bytes
+STATS_RECORD = struct.Struct("<BqqqI")
+# version, next page cursor, then the items
+SEARCH_HEADER = struct.Struct("<Bq")
+# created_at, expires_at, last_accessed, click_count, short code length, then the code bytes
+SEARCH_ITEM = struct.Struct("<qqqIH")
+MISSING_MARKER = b"-"
+# marker followed by the absolute expiry, for layouts without per-entry TTLs
+MISSING_RECORD = struct.Struct("<d")
+
+
+class CachedLink(NamedTuple):
+    short_code: str
+    original_url: str
+    expires_at: Optional[datetime.datetime]
+    click_count: int
+
+
+def _to_micros(value) -> int:
+    if value is None:
+        return NO_TIME
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value)
+    if value.tzinfo is not None:
+        value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return (value - EPOCH) // datetime.timedelta(microseconds=1)
+
+def _from_micros(value: int) -> Optional[datetime.datetime]:
+    if value == NO_TIME:
+        return None
+    return EPOCH + datetime.timedelta(microseconds=value)
+
+def _isoformat(value: int) -> Optional[str]:
+    moment = _from_micros(value)
+    return moment.isoformat() if moment else None
+
+
+def encode_link(link, cache_expiry: float, delta: float) -> bytes:
+    return LINK_RECORD.pack(
+        RECORD_VERSION,
+        _to_micros(link.expires_at),
+        cache_expiry,
+        delta,
+        link.click_count or 0
+    ) + link.original_url.encode()
+
+def decode_link(short_code: str, cached) -> tuple[CachedLink, Optional[float], Optional[float]]:
+    _, expires_at, cache_expiry, delta, click_count = LINK_RECORD.unpack_from(cached)
+    original_url = bytes(cached[LINK_RECORD.size:]).decode()
+    return CachedLink(short_code, original_url, _from_micros(expires_at), click_count), cache_expiry, delta
+
+def encode_missing_link(cache_expiry: float) -> bytes:
+    return MISSING_MARKER + MISSING_RECORD.pack(cache_expiry)
+
+def link_record_expiry(cached: bytes) -> float:
+    if cached[:1] == MISSING_MARKER:
+        return MISSING_RECORD.unpack_from(cached, 1)[0]
+    return LINK_RECORD.unpack_from(cached)[2]
+
+def encode_stats(stats: dict) -> bytes:
+    return STATS_RECORD.pack(
+        RECORD_VERSION,
+        _to_micros(stats.get('created_at')),
+        _to_micros(stats.get('expires_at')),
+        _to_micros(stats.get('last_accessed')),
+        stats.get('click_count') or 0
+    ) + (stats.get('original_url') or "").encode()
+
+def decode_stats(cached) -> dict:
+    _, created_at, expires_at, last_accessed, click_count = STATS_RECORD.unpack_from(cached)
+    return {
+        "original_url": bytes(cached[STATS_RECORD.size:]).decode(),
+        "created_at": _isoformat(created_at),
+        "expires_at": _isoformat(expires_at),
+        "click_count": click_count,
+        "last_accessed": _isoformat(last_accessed)
+    }
+
+def encode_search(links: list[dict], next_cursor: Optional[int] = None) -> bytes:
+    parts = [SEARCH_HEADER.pack(RECORD_VERSION, -1 if next_cursor is None else next_cursor)]
+    for link in links:
+        short_code = link.get('short_code').encode()
+        parts.append(SEARCH_ITEM.pack(
+            _to_micros(link.get('created_at')),
+            _to_micros(link.get('expires_at')),
+            _to_micros(link.get('last_accessed')),
+            link.get('click_count') or 0,
+            len(short_code)
+        ))
+        parts.append(short_code)
+    return b"".join(parts)
+
+def decode_search(cached) -> tuple[list[dict], Optional[int]]:
+    _, next_cursor = SEARCH_HEADER.unpack_from(cached)
+    links = []
+    offset = SEARCH_HEADER.size
+    while offset < len(cached):
+        created_at, expires_at, last_accessed, click_count, size = SEARCH_ITEM.unpack_from(cached, offset)
+        offset += SEARCH_ITEM.size
+        links.append({
+            'short_code': bytes(cached[offset:offset + size]).decode(),
+            'created_at': _isoformat(created_at),
+            'expires_at': _isoformat(expires_at),
+            'click_count': click_count,
+            'last_accessed': _isoformat(last_accessed)
+        })
+        offset += size
+    return links, None if next_cursor < 0 else next_cursor
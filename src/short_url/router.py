@@ -1,14 +1,40 @@
-from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from src.database import get_async_session
+from src.database import async_session_maker, get_lazy_session
 from src.short_url.schemas import LinkCreate
-from fastapi.responses import RedirectResponse
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import RedirectResponse, StreamingResponse
 from fastapi import Security
 from fastapi.security import HTTPBearer
 import src.short_url.crud as crud
-from typing import Optional
+from typing import Literal, Optional
 import datetime
-from src.short_url.cache import cache_link, get_cached_link, clear_cached_link, cache_stats, get_cached_stats, cache_search_result, get_cached_search
+import json
+from src.short_url.clicks import click_buffer
+from src.short_url.export import MEDIA_TYPES, export_user_links
+from src.short_url.bloom import link_filter
+from src.short_url.fastpath import CACHE_MISS_STATE
+from src.config import settings
+from src.short_url.cache import (
+    MISSING_LINK,
+    cache_links,
+    get_cached_link,
+    get_cached_links,
+    load_link,
+    lookup_cached_link,
+    write_through_links,
+    evict_links,
+    cache_stats,
+    get_cached_stats,
+    cache_search_result,
+    get_cached_search,
+    get_idempotent_response,
+    cache_idempotent_response,
+    get_user_aggregates,
+    cache_user_aggregates,
+    add_user_links,
+    remove_user_links
+)
 from src.auth.users import current_active_user, current_active_user_optional
 from src.auth.db import User
 
@@ -24,51 +50,180 @@ security = HTTPBearer(auto_error=False)
 async def create_short_link(
     link: LinkCreate,
     request: Request,
-    session: AsyncSession = Depends(get_async_session),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    session: AsyncSession = Depends(get_lazy_session),
     user: User = Depends(current_active_user_optional)
 ):
 
+    user_id = user.id if user else None
+    payload = link.model_dump(mode="json")
+    if idempotency_key:
+        replay = await get_idempotent_response(idempotency_key, user_id)
+        if replay:
+            if replay["request"] != payload:
+                raise HTTPException(status_code=409, detail="Idempotency-Key was used for a different request")
+            return replay["response"]
+
     if link.custom_alias:
         cached_link = await get_cached_link(link.custom_alias)
-        if cached_link:
+        # the same url under the same alias may be a retry, which create_link answers
+        if cached_link and cached_link.original_url != crud.normalize_url(link.original_url):
             raise HTTPException(status_code=400, detail="Custom alias already exists")
     
-        #existing_link = await crud.get_link_by_short_code(session, link.custom_alias)
-    db_link = await crud.create_link(session, link, user.id if user else None)
+    db_link, created = await crud.get_or_create_link(session, link, user_id)
     if not db_link:
         raise HTTPException(status_code=400, detail="Custom alias already exists")
     
+    if created:
+        await write_through_links([db_link], created=True)
+        await add_user_links([db_link])
     base_url = str(request.base_url)
     shortened_url = f"{base_url}links/{db_link.short_code}"
 
-    return {"short_code": shortened_url}
+    response = {"short_code": shortened_url}
+    if idempotency_key:
+        await cache_idempotent_response(idempotency_key, user_id, payload, response)
+    return response
+
+
+@router.post("/shorten/batch")
+async def create_short_links(
+    links: list[LinkCreate],
+    request: Request,
+    session: AsyncSession = Depends(get_lazy_session),
+    user: User = Depends(current_active_user_optional)
+):
+
+    if len(links) > settings.BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch size exceeds the limit of {settings.BATCH_MAX_SIZE} links"
+        )
+
+    results = await crud.get_or_create_links(session, links, user.id if user else None)
+    created = [db_link for db_link, is_new in results if is_new]
+    await write_through_links(created, created=True)
+    await add_user_links(created)
+
+    base_url = str(request.base_url)
+    return [
+        {"short_code": f"{base_url}links/{db_link.short_code}"}
+        if db_link else {"error": "Custom alias already exists"}
+        for db_link, _ in results
+    ]
+
+
+@router.post("/resolve")
+async def resolve_links(
+    short_codes: list[str],
+    session: AsyncSession = Depends(get_lazy_session)
+):
+
+    if len(short_codes) > settings.BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch size exceeds the limit of {settings.BATCH_MAX_SIZE} links"
+        )
+
+    short_codes = list(dict.fromkeys(short_codes))
+    links = await get_cached_links(short_codes)
+
+    missing = [
+        short_code for short_code in short_codes
+        if short_code not in links and link_filter.might_exist(short_code)
+    ]
+    if missing:
+        db_links = await crud.get_links_by_short_codes(session, missing)
+        await cache_links(db_links)
+        links.update({db_link.short_code: db_link for db_link in db_links})
+
+    now = datetime.datetime.now()
+    resolved = {}
+    for short_code in short_codes:
+        link = links.get(short_code)
+        if not link or (link.expires_at and link.expires_at < now):
+            resolved[short_code] = None
+        else:
+            resolved[short_code] = link.original_url
+    return resolved
+
+
+@router.get("/mine")
+async def list_my_links(
+    response: Response,
+    sort: Literal["recent", "clicks"] = "recent",
+    limit: int = Query(settings.MY_LINKS_PAGE_SIZE, ge=1, le=settings.MY_LINKS_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    session: AsyncSession = Depends(get_lazy_session),
+    user: User = Depends(current_active_user)
+    ):
+
+    try:
+        position = crud.parse_user_links_cursor(cursor, sort) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    links, next_cursor = await crud.list_user_links(session, user.id, sort, limit, position)
+
+    aggregates = await get_user_aggregates(user.id)
+    if aggregates is None:
+        aggregates = await crud.count_user_links(session, user.id)
+        await cache_user_aggregates(user.id, aggregates)
+
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return {
+        **aggregates,
+        "links": [click_buffer.merge_stats(link["short_code"], link) for link in links]
+    }
+
+
+@router.get("/mine/export")
+async def export_my_links(
+    export_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    user: User = Depends(current_active_user)
+    ):
+
+    return StreamingResponse(
+        export_user_links(user.id, export_format),
+        media_type=MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="links.{export_format}"'}
+    )
 
 
 @router.get("/{short_code}")
-async def redirect_to_original(request: Request, short_code: str, session: AsyncSession = Depends(get_async_session)):
+async def redirect_to_original(request: Request, short_code: str, session: AsyncSession = Depends(get_lazy_session)):
     request_type = str(request.headers.get("sec-purpose")).lower()
-    cached_link = await get_cached_link(short_code)
+    # the fast path already looked this code up and missed
+    cached_link = None if request.scope.get("state", {}).get(CACHE_MISS_STATE) else await lookup_cached_link(short_code)
+
+    if cached_link is MISSING_LINK:
+        raise HTTPException(status_code=404, detail="Link not found or expired")
 
     if cached_link:
+        if cached_link.expires_at and cached_link.expires_at < datetime.datetime.now():
+            raise HTTPException(status_code=404, detail="Link not found or expired")
         if not any(x in request_type for x in ['preview', 'prefetch', 'prerender']):
-            await crud.count_clicks_in_cache(session, short_code)
-        return RedirectResponse(url=cached_link.original_url)
+            click_buffer.record(short_code)
+        return RedirectResponse(url=cached_link.original_url, status_code=status.HTTP_302_FOUND)
     
-    link = await crud.get_link_by_short_code(session, short_code)
+    if not link_filter.might_exist(short_code):
+        raise HTTPException(status_code=404, detail="Link not found or expired")
+
+    link = await load_link(short_code, lambda: crud.get_link_by_short_code(session, short_code))
     if not link or (link.expires_at and link.expires_at < datetime.datetime.now()):
         raise HTTPException(status_code=404, detail="Link not found or expired")
     
     if not any(x in request_type for x in ['preview', 'prefetch', 'prerender']):
-        await crud.update_link_stats(session, link)
-        await cache_link(link)
+        click_buffer.record(short_code)
     
-    return RedirectResponse(url=link.original_url)
+    return RedirectResponse(url=link.original_url, status_code=status.HTTP_302_FOUND)
 
 
 @router.delete("/{short_code}")
 async def delete_link(
     short_code: str,
-    session: AsyncSession = Depends(get_async_session),
+    session: AsyncSession = Depends(get_lazy_session),
     user: User = Depends(current_active_user)
     ):
     
@@ -85,7 +240,8 @@ async def delete_link(
     if not await crud.delete_link(session, short_code):
         raise HTTPException(status_code=404, detail="Link not found")
     
-    await clear_cached_link(short_code)
+    await evict_links([link])
+    await remove_user_links([link])
     return {"message": "Link deleted"}
 
 
@@ -93,7 +249,7 @@ async def delete_link(
 async def update_link(
     short_code: str,
     new_url: str,
-    session: AsyncSession = Depends(get_async_session),
+    session: AsyncSession = Depends(get_lazy_session),
     user: User = Depends(current_active_user)
     ):
 
@@ -107,54 +263,81 @@ async def update_link(
             detail="You don't have permission to update this link"
         )
     
-    result = await crud.update_link(session, short_code, new_url)
+    previous_url = link.original_url
+    updated_link = await crud.update_link(session, short_code, new_url)
 
-    if not result:
+    if not updated_link:
         raise HTTPException(status_code=404, detail="Link not found")
     
-    await clear_cached_link(short_code)
+    await write_through_links([updated_link], stale_urls=[previous_url])
     return {"message": "Link updated"}
 
 
 @router.get("/{short_code}/stats")
 async def get_link_stats(
     short_code: str,
-    session: AsyncSession = Depends(get_async_session)
+    session: AsyncSession = Depends(get_lazy_session)
     ):
 
     cached_stats = await get_cached_stats(short_code)
     if cached_stats:
-        return cached_stats
+        return click_buffer.merge_stats(short_code, cached_stats)
     
     stats = await crud.get_link_stats(session, short_code)
     if not stats:
         raise HTTPException(status_code=404, detail="Link not found")
     
     await cache_stats(short_code, stats)
-    return stats
+    return click_buffer.merge_stats(short_code, stats)
 
 @router.get("/search/{original_url:path}")
 async def search_link(
     original_url: str,
-    session: AsyncSession = Depends(get_async_session)
+    response: Response,
+    limit: int = Query(settings.SEARCH_PAGE_SIZE, ge=1, le=settings.SEARCH_MAX_PAGE_SIZE),
+    cursor: Optional[int] = None,
+    session: AsyncSession = Depends(get_lazy_session)
     ):
 
-    cached_link = await get_cached_search(original_url)
-    if cached_link:
-        return cached_link
+    normalized_url = crud.normalize_url(original_url)
+    cached = await get_cached_search(normalized_url, limit, cursor)
+    if cached:
+        links, next_cursor = cached
+    else:
+        links, next_cursor = await crud.search_link_by_url(session, original_url, limit, cursor)
+        if not links:
+            raise HTTPException(status_code=404, detail="Link not found")
+        await cache_search_result(normalized_url, links, next_cursor, limit, cursor)
 
-    link = await crud.search_link_by_url(session, original_url)
-    if not link:
-        raise HTTPException(status_code=404, detail="Link not found")
-    
-    await cache_search_result(original_url, link)
-    return link
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = str(next_cursor)
+    return links
+
+@router.get("/prefix/{url_prefix:path}")
+async def search_links_by_prefix(
+    url_prefix: str,
+    limit: int = Query(settings.PREFIX_SEARCH_PAGE_SIZE, ge=1, le=settings.PREFIX_SEARCH_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None
+    ):
+
+    try:
+        position = crud.decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def rows():
+        # the request scoped session is closed before the body is sent, so the stream owns its own
+        async with async_session_maker() as session:
+            async for link in crud.stream_links_by_prefix(session, url_prefix, limit, position):
+                yield json.dumps(jsonable_encoder(link)) + "\n"
+
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
 
 @router.patch("/{short_code}/expiration")
 async def update_link_expiration(
     short_code: str,
     expires_at: Optional[datetime.datetime] = None,
-    session: AsyncSession = Depends(get_async_session),
+    session: AsyncSession = Depends(get_lazy_session),
     user: User = Depends(current_active_user)
     ):
     
@@ -171,5 +354,6 @@ async def update_link_expiration(
     link.expires_at = expires_at
     await session.commit()
     await session.refresh(link)
+    await write_through_links([link])
     
     return {"message": "Expiration updated", "expires_at": link.expires_at}
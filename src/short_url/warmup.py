@@ -0,0 +1,91 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.config import settings
+from src.short_url.cache import cache_links, get_cached_links, get_redis, hot_link_codes
+from src.scheduler import RELEASE_LOCK_SCRIPT
+import src.short_url.crud as crud
+import asyncio
+import logging
+import os
+import uuid
+
+logger = logging.getLogger(__name__)
+
+WARMUP_LOCK_KEY = "warmup:lock"
+WARMUP_CODES_KEY = "warmup:codes"
+
+
+def load_hot_set(path: str) -> list[str]:
+    try:
+        with open(path) as snapshot:
+            return [line.strip() for line in snapshot if line.strip()]
+    except FileNotFoundError:
+        return []
+
+def save_hot_set(path: str, limit: int = None) -> int:
+    codes = hot_link_codes(limit or settings.WARMUP_LINKS)
+    if not codes:
+        return 0
+    # write next to the target and swap, so a crash never leaves half a snapshot
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as snapshot:
+        snapshot.write("\n".join(codes))
+    os.replace(tmp_path, path)
+    return len(codes)
+
+async def warm_from_codes(db: AsyncSession, short_codes: list[str], batch_size: int) -> int:
+    warmed = 0
+    for start in range(0, len(short_codes), batch_size):
+        batch = short_codes[start:start + batch_size]
+        # entries still in Redis only need to reach the local cache
+        cached = await get_cached_links(batch)
+        warmed += sum(1 for link in cached.values() if link is not None)
+        missing = [short_code for short_code in batch if short_code not in cached]
+        if missing:
+            links = await crud.get_links_by_short_codes(db, missing)
+            await cache_links(links, local=True)
+            warmed += len(links)
+    return warmed
+
+async def warm_from_top_links(db: AsyncSession, limit: int, batch_size: int, redis=None) -> int:
+    short_codes = []
+    async for links in crud.stream_hot_links(db, limit, batch_size):
+        await cache_links(links, local=True)
+        short_codes.extend(link.short_code for link in links)
+    if redis is not None:
+        await redis.set(WARMUP_CODES_KEY, "\n".join(short_codes), px=settings.WARMUP_LOCK_LEASE)
+    return len(short_codes)
+
+async def warm_from_redis(redis, batch_size: int) -> int:
+    # the leader publishes the codes once it is done, the entries themselves are already in Redis
+    while (short_codes := await redis.get(WARMUP_CODES_KEY)) is None:
+        await asyncio.sleep(settings.WARMUP_POLL_INTERVAL)
+    short_codes = short_codes.decode().split("\n") if short_codes else []
+    warmed = 0
+    for start in range(0, len(short_codes), batch_size):
+        cached = await get_cached_links(short_codes[start:start + batch_size])
+        warmed += sum(1 for link in cached.values() if link is not None)
+    return warmed
+
+async def warm_from_top_links_once(db: AsyncSession, redis, limit: int, batch_size: int) -> int:
+    token = uuid.uuid4().hex
+    if not await redis.set(WARMUP_LOCK_KEY, token, nx=True, px=settings.WARMUP_LOCK_LEASE):
+        logger.info("Another worker is warming the cache, filling the local cache from Redis")
+        return await warm_from_redis(redis, batch_size)
+    try:
+        return await warm_from_top_links(db, limit, batch_size, redis)
+    except BaseException:
+        # let the next worker to start retry the scan
+        await redis.eval(RELEASE_LOCK_SCRIPT, 1, WARMUP_LOCK_KEY, token)
+        raise
+
+async def warm_cache(db: AsyncSession, snapshot_path: str = None) -> int:
+    snapshot_path = snapshot_path if snapshot_path is not None else settings.HOT_SET_SNAPSHOT_PATH
+    batch_size = settings.WARMUP_BATCH_SIZE
+    short_codes = load_hot_set(snapshot_path) if snapshot_path else []
+    if short_codes:
+        logger.info("Warming cache from %d codes in %s", len(short_codes), snapshot_path)
+        return await warm_from_codes(db, short_codes[:settings.WARMUP_LINKS], batch_size)
+    redis = get_redis()
+    if redis is None:
+        return await warm_from_top_links(db, settings.WARMUP_LINKS, batch_size)
+    return await warm_from_top_links_once(db, redis, settings.WARMUP_LINKS, batch_size)
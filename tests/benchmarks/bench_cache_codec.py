@@ -0,0 +1,67 @@
+import os
+import sys
+import argparse
+import datetime
+import json
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from src.models import Link
+from src.short_url.records import decode_link, encode_link
+
+
+def json_encode(link: Link, cache_expiry: float, delta: float) -> str:
+    return json.dumps({
+        'original_url': link.original_url,
+        'expires_at': link.expires_at.isoformat() if link.expires_at else None,
+        'click_count': link.click_count,
+        'cache_expiry': cache_expiry,
+        'delta': delta
+    })
+
+
+def json_decode(short_code: str, cached: str) -> Link:
+    # the previous hit path: parse JSON and rebuild an ORM instance
+    data = json.loads(cached)
+    return Link(
+        short_code=short_code,
+        original_url=data['original_url'],
+        expires_at=datetime.datetime.fromisoformat(data['expires_at']) if data['expires_at'] else None,
+        click_count=data['click_count']
+    )
+
+
+def bench(name: str, encode, decode, link: Link, rows: int):
+    cache_expiry = time.time() + 3600
+    started = time.perf_counter()
+    for _ in range(rows):
+        cached = encode(link, cache_expiry, 0.01)
+    encode_rate = rows / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for _ in range(rows):
+        decode(link.short_code, cached)
+    decode_rate = rows / (time.perf_counter() - started)
+
+    size = len(cached.encode() if isinstance(cached, str) else cached)
+    print(f"{name}: encode {encode_rate:,.0f}/sec, decode {decode_rate:,.0f}/sec, {size} bytes per entry")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Link cache record codec benchmark")
+    parser.add_argument("--rows", type=int, default=200_000)
+    args = parser.parse_args()
+
+    link = Link(
+        short_code="a1B2c3D",
+        original_url="https://example.com/some/fairly/typical/path?utm_source=newsletter",
+        expires_at=datetime.datetime.now() + datetime.timedelta(days=30),
+        click_count=12345
+    )
+    bench("json + orm  ", json_encode, json_decode, link, args.rows)
+    bench("struct + row", encode_link, lambda code, cached: decode_link(code, cached)[0], link, args.rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import os
+import sys
+import argparse
+import asyncio
+import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from redis import asyncio as aioredis
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.redis import RedisBackend
+
+from src.config import settings
+from src.models import Link
+from src.short_url.cache import bucket_key, cache_links, cache_missing_link, link_bucket, link_key
+from src.short_url.crud import encode_base62, scramble_id
+
+BATCH_SIZE = 1000
+
+
+async def used_memory(redis) -> int:
+    info = await redis.info("memory")
+    return info["used_memory"]
+
+
+async def measure(redis, layout: str, links: list[Link]):
+    settings.CACHE_LAYOUT = layout
+    await redis.flushdb()
+    before = await used_memory(redis)
+    for start in range(0, len(links), BATCH_SIZE):
+        await cache_links(links[start:start + BATCH_SIZE])
+    after = await used_memory(redis)
+
+    sample = links[0].short_code
+    key = link_key(sample) if layout == "string" else link_bucket(sample)[0]
+    encoding = (await redis.object("encoding", key)).decode()
+    keys = await redis.dbsize()
+    print(f"{layout:>6}: {(after - before) / len(links):.1f} bytes/link, {keys:,} keys, encoding {encoding}")
+
+
+async def bucket_fields(redis) -> int:
+    async with redis.pipeline(transaction=False) as pipe:
+        for bucket in range(settings.CACHE_BUCKETS):
+            pipe.hlen(bucket_key(bucket))
+        return sum(await pipe.execute())
+
+
+async def measure_churn(redis, rounds: int, misses: int):
+    # one-off misses land in buckets kept alive by long lived links, the write sweep
+    # should keep the field count and memory flat instead of growing every round
+    settings.NEGATIVE_CACHE_TTL = 1
+    for number in range(rounds):
+        for start in range(0, misses, BATCH_SIZE):
+            await asyncio.gather(*(
+                cache_missing_link(f"miss{number}x{code}")
+                for code in range(start, min(start + BATCH_SIZE, misses))
+            ))
+        fields = await bucket_fields(redis)
+        print(f" churn: round {number + 1}, {fields:,} bucket fields, {await used_memory(redis):,} bytes used")
+        await asyncio.sleep(settings.NEGATIVE_CACHE_TTL + 0.1)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Redis memory per cached link for each cache layout")
+    parser.add_argument("--url", default="redis://localhost:6379/15")
+    parser.add_argument("--links", type=int, default=1_000_000)
+    parser.add_argument("--per-bucket", type=int, default=100)
+    parser.add_argument("--listpack-entries", type=int, default=512,
+                        help="hash-max-listpack-entries to apply, larger buckets fall back to a hashtable")
+    parser.add_argument("--listpack-value", type=int, default=256,
+                        help="hash-max-listpack-value to apply, longer records fall back to a hashtable")
+    parser.add_argument("--churn-rounds", type=int, default=5,
+                        help="rounds of expiring one-off misses written on top of the hash layout")
+    parser.add_argument("--churn", type=int, default=100_000, help="misses written per churn round")
+    args = parser.parse_args()
+    settings.CACHE_BUCKETS = max(1, args.links // args.per_bucket)
+
+    redis = aioredis.from_url(args.url)
+    if await redis.dbsize():
+        sys.exit(f"{args.url} is not empty, point the report at a scratch database")
+    await redis.config_set("hash-max-listpack-entries", args.listpack_entries)
+    await redis.config_set("hash-max-listpack-value", args.listpack_value)
+    FastAPICache.init(RedisBackend(redis), prefix="fastapi-cache")
+
+    expires_at = datetime.datetime.now() + datetime.timedelta(days=30)
+    links = [
+        Link(
+            short_code=encode_base62(scramble_id(number)),
+            original_url=f"https://example.com/articles/{number}?utm_source=newsletter",
+            expires_at=expires_at,
+            click_count=number % 100
+        )
+        for number in range(args.links)
+    ]
+    try:
+        for layout in ("string", "hash"):
+            await measure(redis, layout, links)
+        await measure_churn(redis, args.churn_rounds, args.churn)
+    finally:
+        await redis.flushdb()
+        await redis.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,101 @@
+import os
+import sys
+import argparse
+import asyncio
+import itertools
+import random
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from src.short_url.crud import (
+    BASE62_ALPHABET,
+    SHORT_CODE_LENGTH,
+    SHORT_CODE_MULTIPLIER,
+    SHORT_CODE_SPACE,
+    BlockCodeGenerator,
+    generate_short_code,
+)
+from src.models import SHORT_CODE_BLOCK_INCREMENT
+
+
+def decode_base62(code: str) -> int:
+    number = 0
+    for char in code:
+        number = number * 62 + BASE62_ALPHABET.index(char)
+    return number
+
+
+def existing_codes(hash_links: int, aliases: int) -> set[str]:
+    # codes a new generator has to avoid: links minted by the hash generator before
+    # the switch and custom aliases, which users often pick at the generated length
+    codes = {generate_short_code(f"https://example.com/legacy/{number}") for number in range(hash_links)}
+    rng = random.Random(42)
+    for _ in range(aliases):
+        length = rng.choice((SHORT_CODE_LENGTH, 6, 8))
+        codes.add("".join(rng.choices(BASE62_ALPHABET, k=length)))
+    return codes
+
+
+async def bench_block(rows: int, block_size: int, existing: set[str]):
+    blocks = itertools.count(SHORT_CODE_BLOCK_INCREMENT, SHORT_CODE_BLOCK_INCREMENT)
+
+    async def reserve_block(db):
+        return next(blocks)
+
+    generator = BlockCodeGenerator(block_size, reserve_block=reserve_block)
+    started = time.perf_counter()
+    codes = [await generator.next_code(None, "") for _ in range(rows)]
+    elapsed = time.perf_counter() - started
+
+    # a hit on an existing code is a failed insert and a retry with the next code
+    collisions = sum(1 for code in codes if code in existing)
+    # every code must map back to an id inside one of the reserved blocks
+    inverse = pow(SHORT_CODE_MULTIPLIER, -1, SHORT_CODE_SPACE)
+    misplaced = sum(
+        1 for code in codes
+        if decode_base62(code) * inverse % SHORT_CODE_SPACE % SHORT_CODE_BLOCK_INCREMENT >= block_size
+    )
+    return rows / elapsed, collisions, misplaced, next(blocks) // SHORT_CODE_BLOCK_INCREMENT - 1
+
+
+def bench_hash(rows: int, existing: set[str]):
+    seen = bytearray(16 ** 6 // 8)
+    for code in existing:
+        if len(code) == 6 and all(char in "0123456789abcdef" for char in code):
+            byte, bit = divmod(int(code, 16), 8)
+            seen[byte] |= 1 << bit
+    collisions = 0
+    started = time.perf_counter()
+    for number in range(rows):
+        value = int(generate_short_code(f"https://example.com/{number}"), 16)
+        byte, bit = divmod(value, 8)
+        if seen[byte] & (1 << bit):
+            collisions += 1
+        seen[byte] |= 1 << bit
+    elapsed = time.perf_counter() - started
+    return rows / elapsed, collisions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Short code generator benchmark")
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--block-size", type=int, default=SHORT_CODE_BLOCK_INCREMENT)
+    parser.add_argument("--hash-links", type=int, default=1_000_000,
+                        help="links already minted by the hash generator")
+    parser.add_argument("--aliases", type=int, default=1_000_000, help="custom aliases already taken")
+    args = parser.parse_args()
+    existing = existing_codes(args.hash_links, args.aliases)
+
+    rate, collisions, misplaced, blocks = asyncio.run(bench_block(args.rows, args.block_size, existing))
+    print(f"block: {rate:,.0f} codes/sec, {collisions} collisions with {len(existing):,} existing codes "
+          f"({collisions / args.rows:.4%}), {misplaced} codes outside their block, "
+          f"{blocks} block reservations for {args.rows:,} rows")
+
+    rate, collisions = bench_hash(args.rows, existing)
+    print(f"hash:  {rate:,.0f} codes/sec, {collisions} collisions "
+          f"({collisions / args.rows:.4%}) for {args.rows:,} rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import os
+import sys
+import argparse
+import asyncio
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+# benchmark the plain router first, the fast path is wrapped around it explicitly below
+os.environ["REDIRECT_FAST_PATH"] = "false"
+
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+
+from src.main import app
+from src.short_url.cache import local_cache
+from src.short_url.fastpath import RedirectFastPath
+from src.short_url.records import CachedLink
+from src.short_url.router import router
+
+
+def make_scope(code: str) -> dict:
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": f"/links/{code}",
+        "raw_path": f"/links/{code}".encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 50000),
+        "server": ("bench", 80),
+    }
+
+
+async def bench(name: str, asgi_app, codes: list[str], requests: int, concurrency: int):
+    # drive the ASGI app directly, an HTTP client would dominate the measurement
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def worker(offset: int):
+        for number in range(offset, requests, concurrency):
+            statuses = []
+
+            async def send(message):
+                if message["type"] == "http.response.start":
+                    statuses.append(message["status"])
+
+            await asgi_app(make_scope(codes[number % len(codes)]), receive, send)
+            assert statuses == [302], statuses
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(offset) for offset in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    print(f"{name}: {requests / elapsed:,.0f} requests/sec")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Cache-hit redirect throughput: router vs ASGI fast path")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--links", type=int, default=1000)
+    args = parser.parse_args()
+
+    FastAPICache.init(InMemoryBackend())
+    # keep every link in the in-process cache so only the request path is measured
+    local_cache.ttl = 3600
+    codes = [f"bench{number}" for number in range(args.links)]
+    for code in codes:
+        local_cache.set(f"link:{code}", CachedLink(code, f"https://example.com/{code}", None, 0))
+
+    await bench("router   ", app, codes, args.requests, args.concurrency)
+    await bench("fast path", RedirectFastPath(app, routes=router.routes), codes, args.requests, args.concurrency)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
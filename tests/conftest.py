@@ -9,6 +9,16 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 from src.auth.db import User
 from src.main import app
 
+@pytest.fixture(autouse=True)
+def clear_local_cache():
+    from src.short_url.cache import local_cache
+    local_cache.clear()
+
+@pytest.fixture(autouse=True)
+def clear_click_buffer():
+    from src.short_url.clicks import click_buffer
+    click_buffer.clear()
+
 @pytest.fixture
 def client():
     return TestClient(app)
@@ -6,6 +6,8 @@ from datetime import datetime, timedelta
 from unittest.mock import AsyncMock, patch
 from src.auth.users import current_active_user, current_active_user_optional
 from src.auth.db import User
+from src.models import Link
+from sqlalchemy.exc import IntegrityError
 
 client = TestClient(app)
 
@@ -33,7 +35,8 @@ def mock_current_user_optional(mocker):
     mocker.patch("src.auth.users.current_active_user_optional", return_value=test_user)
 
 def test_create_short_link_unauthenticated(mock_db_session, mock_current_user_optional):
-    with patch("src.short_url.crud.create_link", return_value=AsyncMock(short_code="abc123")):
+    created = Link(short_code="abc123", original_url="https://example.com", expires_at=None, click_count=0)
+    with patch("src.short_url.crud.get_or_create_link", return_value=(created, True)):
         response = client.post(
             "/links/shorten",
             json={
@@ -46,7 +49,7 @@ def test_create_short_link_unauthenticated(mock_db_session, mock_current_user_op
         assert "abc123" in response.json()["short_code"]
 
 def test_create_short_link_with_existing_alias(mock_db_session, mock_current_user_optional):
-    with patch("src.short_url.crud.create_link", return_value=False):
+    with patch("src.short_url.crud.get_or_create_link", return_value=(False, False)):
         response = client.post(
             "/links/shorten",
             json={
@@ -57,6 +60,17 @@ def test_create_short_link_with_existing_alias(mock_db_session, mock_current_use
         )
         assert response.status_code == status.HTTP_400_BAD_REQUEST
 
+def test_create_short_link_while_partition_attaches(mock_db_session, mock_current_user_optional):
+    violation = Exception('new row for relation "links_default" violates check constraint "links_default_not_links_p202611"')
+    violation.pgcode = "23514"
+    with patch("src.short_url.crud.get_or_create_link", side_effect=IntegrityError("INSERT", {}, violation)):
+        response = client.post(
+            "/links/shorten",
+            json={"original_url": "https://example.com", "expires_at": "2026-11-15T00:00:00"}
+        )
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert response.headers["retry-after"] == "5"
+
 def test_redirect_to_original_expired(mock_db_session):
     mock_link = AsyncMock()
     mock_link.original_url = "https://example.com"
@@ -92,10 +106,53 @@ def test_search_link_by_url(mock_db_session):
         "last_accessed": datetime.now()
     }]
     
-    with patch("src.short_url.crud.search_link_by_url", return_value=search_results), \
+    with patch("src.short_url.crud.search_link_by_url", return_value=(search_results, None)), \
          patch("src.short_url.cache.cache_search_result", new_callable=AsyncMock):
         
         response = client.get("/links/search/https://example.com")
         assert response.status_code == status.HTTP_200_OK
         assert len(response.json()) == 1
         assert response.json()[0]["short_code"] == "abc123"
+
+def test_create_short_links_batch(mock_db_session, mock_current_user_optional):
+    created = Link(short_code="abc123", original_url="https://example.com", expires_at=None, click_count=0)
+    results = [(created, True), (None, False)]
+    with patch("src.short_url.crud.get_or_create_links", new_callable=AsyncMock, return_value=results), \
+         patch("src.short_url.router.write_through_links", new_callable=AsyncMock) as mock_write, \
+         patch("src.short_url.router.add_user_links", new_callable=AsyncMock):
+        response = client.post(
+            "/links/shorten/batch",
+            json=[
+                {"original_url": "https://example.com"},
+                {"original_url": "https://example.org", "custom_alias": "existing"}
+            ]
+        )
+        assert response.status_code == status.HTTP_200_OK
+        results = response.json()
+        assert "abc123" in results[0]["short_code"]
+        assert results[1]["error"] == "Custom alias already exists"
+        mock_write.assert_awaited_once_with([created], created=True)
+
+def test_create_short_links_batch_too_large(mock_db_session, mock_current_user_optional):
+    with patch("src.short_url.router.settings.BATCH_MAX_SIZE", 1):
+        response = client.post(
+            "/links/shorten/batch",
+            json=[{"original_url": "https://example.com"}, {"original_url": "https://example.org"}]
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+def test_resolve_links(mock_db_session):
+    links = [
+        Link(short_code="resolve1", original_url="https://example.com", expires_at=None, click_count=0),
+        Link(short_code="resolve2", original_url="https://example.org", expires_at=datetime.now() - timedelta(days=1), click_count=0)
+    ]
+    with patch("src.short_url.crud.get_links_by_short_codes", new_callable=AsyncMock, return_value=links) as mock_get:
+        response = client.post("/links/resolve", json=["resolve1", "resolve2", "resolve3", "resolve1"])
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json() == {
+            "resolve1": "https://example.com",
+            "resolve2": None,
+            "resolve3": None
+        }
+        mock_get.assert_awaited_once()
+        assert mock_get.call_args.args[1] == ["resolve1", "resolve2", "resolve3"]
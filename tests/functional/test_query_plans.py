@@ -0,0 +1,85 @@
+import datetime
+import pytest
+from unittest.mock import AsyncMock
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from src.config import settings
+from src.models import Base, Link
+from src.short_url.crud import expired_condition, inactive_condition, stream_links_by_prefix, list_user_links, url_hash
+
+SCHEMA = "query_plan_test"
+
+
+@pytest.fixture
+async def plan_connection():
+    admin = create_async_engine(settings.DATABASE_URL, connect_args={"timeout": 2})
+    try:
+        async with admin.begin() as conn:
+            await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+            await conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+    except Exception as exc:
+        await admin.dispose()
+        pytest.skip(f"Postgres is not available: {exc}")
+
+    engine = create_async_engine(settings.DATABASE_URL, connect_args={"server_settings": {"search_path": SCHEMA}})
+    async with engine.connect() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        # on a tiny table the planner would pick a sequential scan anyway
+        await conn.execute(text("SET enable_seqscan = off"))
+        yield conn
+    await engine.dispose()
+
+    async with admin.begin() as conn:
+        await conn.execute(text(f"DROP SCHEMA {SCHEMA} CASCADE"))
+    await admin.dispose()
+
+async def explain(conn, stmt) -> str:
+    compiled = stmt.compile(dialect=conn.dialect)
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    result = await conn.exec_driver_sql(f"EXPLAIN {compiled}", params)
+    return "\n".join(row[0] for row in result)
+
+@pytest.mark.asyncio
+async def test_lookup_queries_use_indexes(plan_connection):
+    now = datetime.datetime.now()
+    queries = {
+        "ix_links_url_hash": select(Link).where(
+            Link.url_hash == url_hash("https://example.com"),
+            Link.original_url == "https://example.com"
+        ),
+        "ix_links_expires_at": select(Link).where(expired_condition(now)),
+        "ix_links_user_id": select(Link).where(Link.user_id == 1),
+    }
+    for index, stmt in queries.items():
+        plan = await explain(plan_connection, stmt)
+        assert index in plan, plan
+        assert "Seq Scan" not in plan, plan
+
+    plan = await explain(plan_connection, select(Link).where(inactive_condition(now)))
+    assert "ix_links_last_accessed" in plan, plan
+    assert "ix_links_never_accessed_created_at" in plan, plan
+    assert "Seq Scan" not in plan, plan
+
+@pytest.mark.asyncio
+async def test_prefix_search_uses_host_index(plan_connection):
+    async def no_rows():
+        return
+        yield
+
+    session = AsyncMock()
+    session.stream.return_value = no_rows()
+    async for _ in stream_links_by_prefix(session, "example.com/campaign/", cursor=("https://example.com/campaign/a", 1)):
+        pass
+
+    plan = await explain(plan_connection, session.stream.await_args.args[0])
+    assert "ix_links_host_original_url" in plan, plan
+    assert "Sort" not in plan, plan
+
+@pytest.mark.asyncio
+async def test_user_links_page_uses_keyset_index(plan_connection):
+    session = AsyncMock()
+    await list_user_links(session, 1, "recent", 50, (datetime.datetime.now(), 100))
+
+    plan = await explain(plan_connection, session.execute.await_args.args[0])
+    assert "ix_links_user_created_at" in plan, plan
+    assert "Sort" not in plan, plan
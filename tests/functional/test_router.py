@@ -1,3 +1,4 @@
+import json
 import pytest
 from fastapi import status
 from fastapi.testclient import TestClient
@@ -5,6 +6,7 @@ from unittest.mock import AsyncMock, patch, MagicMock
 from datetime import datetime, timedelta
 from src.main import app
 from src.auth.db import User
+from src.models import Link
 from fastapi_cache import FastAPICache
 from fastapi_cache.backends.inmemory import InMemoryBackend
 
@@ -57,11 +59,11 @@ def mock_link():
 def test_create_short_link_unauthenticated(mock_link):
     test_data = get_serialized_link_data()
     
-    with patch('src.short_url.crud.create_link', new_callable=AsyncMock) as mock_create, \
+    with patch('src.short_url.crud.get_or_create_link', new_callable=AsyncMock) as mock_create, \
          patch('src.short_url.cache.get_cached_link', new_callable=AsyncMock, return_value=None), \
          patch('src.short_url.crud.check_short_link_exists', new_callable=AsyncMock, return_value=None):
         
-        mock_create.return_value = mock_link
+        mock_create.return_value = (mock_link, True)
         
         response = client.post(
             "/links/shorten",
@@ -72,6 +74,30 @@ def test_create_short_link_unauthenticated(mock_link):
         assert "test123" in response.json()["short_code"]
 
 
+def test_create_link_replays_idempotency_key():
+    created = Link(short_code="abc123", original_url="https://example.com", expires_at=None, click_count=0)
+    stored = {}
+
+    async def get_response(key, user_id):
+        return stored.get((key, user_id))
+
+    async def cache_response(key, user_id, request, response):
+        stored[(key, user_id)] = {"request": request, "response": response}
+
+    with patch('src.short_url.router.get_idempotent_response', get_response), \
+         patch('src.short_url.router.cache_idempotent_response', cache_response), \
+         patch('src.short_url.router.write_through_links', new_callable=AsyncMock), \
+         patch('src.short_url.crud.get_or_create_link', new_callable=AsyncMock, return_value=(created, True)) as mock_create:
+        headers = {"Idempotency-Key": "retry-1"}
+        first = client.post("/links/shorten", json={"original_url": "https://example.com"}, headers=headers)
+        second = client.post("/links/shorten", json={"original_url": "https://example.com"}, headers=headers)
+        other = client.post("/links/shorten", json={"original_url": "https://other.com"}, headers=headers)
+
+    assert first.status_code == second.status_code == status.HTTP_200_OK
+    assert first.json() == second.json()
+    assert other.status_code == status.HTTP_409_CONFLICT
+    mock_create.assert_awaited_once()
+
 def test_create_link_with_existing_alias():
     test_data = {
         "original_url": "https://example.com",
@@ -80,10 +106,10 @@ def test_create_link_with_existing_alias():
     }
     
     with patch('src.short_url.cache.get_cached_link', new_callable=AsyncMock) as mock_cache, \
-         patch('src.short_url.crud.check_short_link_exists', new_callable=AsyncMock) as mock_check:
+         patch('src.short_url.crud.get_or_create_link', new_callable=AsyncMock) as mock_create:
         
         mock_cache.return_value = MagicMock()
-        mock_check.return_value = MagicMock()
+        mock_create.return_value = (False, False)
         
         response = client.post(
             "/links/shorten",
@@ -95,13 +121,12 @@ def test_create_link_with_existing_alias():
 
 def test_redirect_with_db_link(mock_link):
     with patch('src.short_url.crud.get_link_by_short_code', new_callable=AsyncMock) as mock_get, \
-         patch('src.short_url.crud.update_link_stats', new_callable=AsyncMock), \
          patch('src.short_url.cache.cache_link', new_callable=AsyncMock):
         
         mock_get.return_value = mock_link
         response = client.get("/links/test123", follow_redirects=False)
         
-        assert response.status_code == status.HTTP_307_TEMPORARY_REDIRECT
+        assert response.status_code == status.HTTP_302_FOUND
 
 def test_redirect_expired_link(mock_link):
     mock_link.expires_at = datetime.now() - timedelta(days=1)
@@ -154,7 +179,7 @@ def test_search_link_not_found():
     with patch('src.short_url.crud.search_link_by_url', new_callable=AsyncMock) as mock_search, \
          patch('src.short_url.cache.get_cached_search', new_callable=AsyncMock, return_value=None):
         
-        mock_search.return_value = None
+        mock_search.return_value = ([], None)
         response = client.get("/links/search/https://nonexistent.com")
         
         assert response.status_code == status.HTTP_404_NOT_FOUND
@@ -174,13 +199,73 @@ def test_search_link_with_special_chars():
     with patch('src.short_url.crud.search_link_by_url', new_callable=AsyncMock) as mock_search, \
          patch('src.short_url.cache.cache_search_result', new_callable=AsyncMock):
         
-        mock_link = MagicMock()
-        mock_link.short_code = "test123"
-        mock_search.return_value = mock_link
+        mock_search.return_value = ([{"short_code": "test123"}], None)
         
         response = client.get(f"/links/search/{test_url}")
         assert response.status_code == status.HTTP_200_OK
 
+def test_search_links_by_prefix_streams_ndjson():
+    async def stream(session, url_prefix, limit, cursor):
+        assert (url_prefix, limit, cursor) == ("example.com/campaign/", 2, ("https://example.com/campaign/a", 1))
+        for code in ("abc123", "xyz789"):
+            yield {"short_code": code, "created_at": datetime(2025, 1, 1), "cursor": code}
+
+    cursor = "WyJodHRwczovL2V4YW1wbGUuY29tL2NhbXBhaWduL2EiLCAxXQ=="
+    with patch('src.short_url.crud.stream_links_by_prefix', stream):
+        response = client.get(f"/links/prefix/example.com/campaign/?limit=2&cursor={cursor}")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["short_code"] for line in lines] == ["abc123", "xyz789"]
+    assert lines[0]["created_at"] == "2025-01-01T00:00:00"
+
+def test_search_links_by_prefix_rejects_bad_cursor():
+    response = client.get("/links/prefix/example.com?cursor=garbage")
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+def test_list_my_links_uses_cached_aggregates():
+    from src.auth.users import current_active_user
+
+    page = [{"short_code": "abc123", "click_count": 2, "last_accessed": None}]
+    app.dependency_overrides[current_active_user] = lambda: TEST_USER
+    try:
+        with patch('src.short_url.crud.list_user_links', new_callable=AsyncMock, return_value=(page, "next")) as mock_list, \
+             patch('src.short_url.router.get_user_aggregates', new_callable=AsyncMock, return_value={"total_links": 7, "total_clicks": 40}), \
+             patch('src.short_url.crud.count_user_links', new_callable=AsyncMock) as mock_count:
+            response = client.get("/links/mine?sort=clicks&limit=1")
+    finally:
+        app.dependency_overrides.pop(current_active_user)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"total_links": 7, "total_clicks": 40, "links": page}
+    assert response.headers["X-Next-Cursor"] == "next"
+    assert mock_list.await_args.args[1:] == (1, "clicks", 1, None)
+    mock_count.assert_not_awaited()
+
+def test_export_my_links_streams_csv():
+    from src.auth.users import current_active_user
+
+    async def stream(session, user_id):
+        assert user_id == TEST_USER.id
+        yield [Link(short_code="abc123", original_url="https://example.com", created_at=datetime(2026, 1, 1), click_count=2)]
+
+    app.dependency_overrides[current_active_user] = lambda: TEST_USER
+    try:
+        with patch('src.short_url.crud.stream_user_links', stream):
+            response = client.get("/links/mine/export?format=csv")
+    finally:
+        app.dependency_overrides.pop(current_active_user)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.headers["content-disposition"] == 'attachment; filename="links.csv"'
+    assert response.text.splitlines()[1] == "abc123,https://example.com,2026-01-01T00:00:00,,2,"
+
+def test_list_my_links_requires_user():
+    response = client.get("/links/mine")
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
 def test_create_short_link_with_db_failure():
     test_data = {
         "original_url": "https://example.com",
@@ -189,7 +274,7 @@ def test_create_short_link_with_db_failure():
     }
     
     with patch('src.short_url.cache.get_cached_link', new_callable=AsyncMock, return_value=None), \
-         patch('src.short_url.crud.create_link', new_callable=AsyncMock, return_value=None), \
+         patch('src.short_url.crud.get_or_create_link', new_callable=AsyncMock, return_value=(None, False)), \
          patch('src.auth.users.current_active_user_optional', return_value=None):
         
         response = client.post("/links/shorten", json=test_data)
@@ -211,17 +296,23 @@ def test_get_stats_with_cache_set_failure():
         assert response.status_code == status.HTTP_200_OK
 
 def test_search_link_with_cache_set_failure():
-    mock_link = MagicMock()
-    mock_link.short_code = "test123"
-    mock_link.original_url = "https://example.com"
-    
-    with patch('src.short_url.crud.search_link_by_url', new_callable=AsyncMock, return_value=mock_link), \
+    with patch('src.short_url.crud.search_link_by_url', new_callable=AsyncMock, return_value=([{"short_code": "test123"}], None)), \
          patch('src.short_url.cache.cache_search_result', new_callable=AsyncMock, side_effect=Exception("Cache Error")), \
          patch('src.short_url.cache.get_cached_search', new_callable=AsyncMock, return_value=None):
         
         response = client.get("/links/search/https://example.com")
         assert response.status_code == status.HTTP_200_OK
 
+def test_search_link_returns_next_cursor():
+    page = [{"short_code": "abc123"}]
+    with patch('src.short_url.crud.search_link_by_url', new_callable=AsyncMock, return_value=(page, 42)) as mock_search:
+        response = client.get("/links/search/https://Example.com/page?limit=1&cursor=7")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == page
+    assert response.headers["X-Next-Cursor"] == "42"
+    assert mock_search.await_args.args[2:] == (1, 7)
+
 def test_create_short_link_with_invalid_expiration():
     test_data = {
         "original_url": "https://example.com",
@@ -231,3 +322,42 @@ def test_create_short_link_with_invalid_expiration():
     
     response = client.post("/links/shorten", json=test_data)
     assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+def test_redirect_rejected_by_link_filter():
+    with patch('src.short_url.router.link_filter.might_exist', return_value=False), \
+         patch('src.short_url.crud.get_link_by_short_code', new_callable=AsyncMock) as mock_get:
+
+        response = client.get("/links/unknown404")
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        mock_get.assert_not_awaited()
+
+def test_redirect_missing_link_is_negatively_cached():
+    with patch('src.short_url.crud.get_link_by_short_code', new_callable=AsyncMock, return_value=None) as mock_get:
+        assert client.get("/links/typo404").status_code == status.HTTP_404_NOT_FOUND
+        assert client.get("/links/typo404").status_code == status.HTTP_404_NOT_FOUND
+        mock_get.assert_awaited_once()
+
+def test_redirect_expired_link_from_cache():
+    expired = MagicMock()
+    expired.original_url = "https://example.com"
+    expired.expires_at = datetime.now() - timedelta(minutes=1)
+
+    lookup = AsyncMock(return_value=expired)
+    with patch('src.short_url.fastpath.lookup_cached_link', lookup), \
+         patch('src.short_url.router.lookup_cached_link', lookup):
+        response = client.get("/links/cachedexpired", follow_redirects=False)
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+def test_created_link_is_written_through_to_cache():
+    created = Link(short_code="written1", original_url="https://example.com/new", expires_at=None, click_count=0)
+
+    with patch('src.short_url.crud.get_or_create_link', new_callable=AsyncMock, return_value=(created, True)), \
+         patch('src.short_url.crud.get_link_by_short_code', new_callable=AsyncMock) as mock_get:
+        assert client.post("/links/shorten", json=get_serialized_link_data()).status_code == status.HTTP_200_OK
+        response = client.get("/links/written1", follow_redirects=False)
+
+        assert response.status_code == status.HTTP_302_FOUND
+        assert response.headers["location"] == "https://example.com/new"
+        mock_get.assert_not_awaited()
@@ -53,6 +53,27 @@ class ShortLinkUser(HttpUser):
             else:
                 response.failure(f"Status {response.status_code}: {response.text}")
 
+    @task(1)
+    def create_short_links_batch(self):
+        payload = [
+            {"original_url": f"https://example.com/{''.join(random.choices(string.ascii_lowercase, k=10))}"}
+            for _ in range(100)
+        ]
+
+        with self.client.post(
+            "/links/shorten/batch",
+            json=payload,
+            name="/links/shorten/batch",
+            catch_response=True
+        ) as response:
+            if response.status_code != 200:
+                response.failure(f"Status {response.status_code}: {response.text}")
+                return
+
+            for item in response.json():
+                if "short_code" in item:
+                    self.short_codes.append(item["short_code"].split("/")[-1])
+
     @task(3)
     def access_short_link(self):
         if not hasattr(self, 'short_codes') or not self.short_codes:
@@ -0,0 +1,52 @@
+import pytest
+from unittest.mock import AsyncMock, patch
+from src.short_url.bloom import BloomFilter, LinkFilter
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    codes = [f"code{i}" for i in range(1000)]
+    for code in codes:
+        bloom.add(code)
+    assert all(code in bloom for code in codes)
+    assert bloom.count == 1000
+
+def test_bloom_filter_false_positive_rate():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    for i in range(1000):
+        bloom.add(f"code{i}")
+    false_positives = sum(f"other{i}" in bloom for i in range(10000))
+    assert false_positives / 10000 < 0.03
+    assert bloom.false_positive_rate() == pytest.approx(0.01, rel=0.2)
+
+def test_link_filter_allows_everything_until_built():
+    link_filter = LinkFilter()
+    assert link_filter.might_exist("anything")
+    assert link_filter.metrics()["ready"] is False
+
+@pytest.mark.asyncio
+async def test_link_filter_rebuild():
+    async def stream_short_codes(db):
+        for code in ["abc123", "xyz789"]:
+            yield code
+
+    link_filter = LinkFilter()
+    with patch("src.short_url.crud.count_links", new_callable=AsyncMock, return_value=2), \
+         patch("src.short_url.crud.stream_short_codes", stream_short_codes):
+        await link_filter.rebuild(None)
+
+    assert link_filter.might_exist("abc123")
+    assert not link_filter.might_exist("missing")
+    link_filter.add("missing")
+    assert link_filter.might_exist("missing")
+
+    metrics = link_filter.metrics()
+    assert metrics["ready"] is True
+    assert metrics["items"] == 3
+    assert metrics["rejected"] == 1
+
+def test_link_filter_reset_falls_back_to_database():
+    link_filter = LinkFilter()
+    link_filter.bloom = BloomFilter(capacity=10, error_rate=0.01)
+    assert not link_filter.might_exist("abc123")
+    link_filter.reset()
+    assert link_filter.might_exist("abc123")
@@ -6,8 +6,8 @@ from src.short_url.cache import (
     get_cached_link,
     cache_stats,
 )
+from src.short_url.records import decode_stats
 from src.models import Link
-import json
 
 @pytest.fixture(autouse=True)
 async def setup_cache():
@@ -23,7 +23,7 @@ async def test_cache_miss_handling():
     with patch('src.short_url.cache.FastAPICache.get_backend', return_value=mock_backend):
         result = await get_cached_link("missing123")
         assert result is None
-        mock_backend.get.assert_awaited_once_with("link:missing123")
+        mock_backend.get.assert_awaited_once_with("link:v2:missing123")
 
 @pytest.mark.asyncio
 async def test_cache_stats_with_none_values():
@@ -36,19 +36,14 @@ async def test_cache_stats_with_none_values():
     }
     
     mock_backend = AsyncMock()
-    with patch('src.short_url.cache.FastAPICache.get_backend', return_value=mock_backend):
+    with patch('src.short_url.cache.FastAPICache.get_backend', return_value=mock_backend), \
+         patch('src.short_url.cache.settings.CACHE_TTL_JITTER', 0):
         await cache_stats("test123", stats)
-        mock_backend.set.assert_awaited_once_with(
-            "stats:test123",
-            json.dumps({
-                "original_url": "https://example.com",
-                "created_at": None,
-                "expires_at": None,
-                "click_count": 0,
-                "last_accessed": None
-            }),
-            expire=300
-        )
+        mock_backend.set.assert_awaited_once()
+        args, kwargs = mock_backend.set.call_args
+        assert args[0] == "stats:v2:test123"
+        assert decode_stats(args[1]) == stats
+        assert kwargs["expire"] == 300
 
 @pytest.mark.asyncio
 async def test_cache_link_roundtrip():
@@ -64,11 +59,7 @@ async def test_cache_link_roundtrip():
         await cache_link(test_link)
         mock_backend.set.assert_awaited_once()
         
-        mock_backend.get.return_value = json.dumps({
-            'original_url': 'https://example.com',
-            'expires_at': test_link.expires_at,
-            'click_count': 5
-        })
+        mock_backend.get.return_value = mock_backend.set.call_args.args[1]
         cached = await get_cached_link("abc123")
         assert cached.original_url == "https://example.com"
         assert cached.click_count == 5
@@ -0,0 +1,146 @@
+import asyncio
+import pytest
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+from src.short_url.clicks import ClickBuffer
+from src.short_url.crud import flush_click_counts
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.dialects import postgresql
+
+def test_record_accumulates_clicks():
+    buffer = ClickBuffer()
+    buffer.record("abc123")
+    buffer.record("abc123")
+    buffer.record("xyz789")
+
+    count, last_accessed = buffer.pending("abc123")
+    assert count == 2
+    assert isinstance(last_accessed, datetime)
+    assert buffer.pending("xyz789")[0] == 1
+    assert buffer.pending("missing") == (0, None)
+
+def test_merge_stats_adds_pending_clicks():
+    buffer = ClickBuffer()
+    stats = {"original_url": "https://example.com", "click_count": 5, "last_accessed": None}
+    assert buffer.merge_stats("abc123", stats) is stats
+
+    buffer.record("abc123")
+    merged = buffer.merge_stats("abc123", stats)
+    assert merged["click_count"] == 6
+    assert merged["last_accessed"] is not None
+    assert stats["click_count"] == 5
+
+@pytest.mark.asyncio
+async def test_flush_writes_pending_clicks_in_one_call():
+    buffer = ClickBuffer()
+    buffer.record("abc123")
+    buffer.record("abc123")
+    buffer.record("xyz789")
+    mock_session = AsyncMock(spec=AsyncSession)
+
+    with patch("src.short_url.crud.flush_click_counts", new_callable=AsyncMock, return_value={1: 3}) as mock_flush, \
+         patch("src.short_url.clicks.adjust_user_aggregates", new_callable=AsyncMock) as mock_adjust, \
+         patch("src.short_url.clicks.clear_cached_stats", new_callable=AsyncMock) as mock_clear:
+        flushed = await buffer.flush(mock_session)
+        assert flushed == 2
+        mock_adjust.assert_awaited_once_with({1: (0, 3)})
+        mock_clear.assert_awaited_once_with(["abc123", "xyz789"])
+        mock_flush.assert_awaited_once()
+        clicks = mock_flush.call_args.args[1]
+        assert clicks["abc123"][0] == 2
+        assert clicks["xyz789"][0] == 1
+
+    assert buffer.pending("abc123") == (0, None)
+
+@pytest.mark.asyncio
+async def test_flush_empty_buffer_skips_db():
+    buffer = ClickBuffer()
+    mock_session = AsyncMock(spec=AsyncSession)
+
+    with patch("src.short_url.crud.flush_click_counts", new_callable=AsyncMock) as mock_flush:
+        assert await buffer.flush(mock_session) == 0
+        mock_flush.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_flush_failure_keeps_clicks():
+    buffer = ClickBuffer()
+    buffer.record("abc123")
+    mock_session = AsyncMock(spec=AsyncSession)
+
+    with patch("src.short_url.crud.flush_click_counts", new_callable=AsyncMock, side_effect=Exception("DB down")):
+        with pytest.raises(Exception, match="DB down"):
+            await buffer.flush(mock_session)
+
+    buffer.record("abc123")
+    assert buffer.pending("abc123")[0] == 2
+
+@pytest.mark.asyncio
+async def test_flush_cancelled_keeps_clicks():
+    buffer = ClickBuffer()
+    buffer.record("abc123")
+    mock_session = AsyncMock(spec=AsyncSession)
+    started = asyncio.Event()
+
+    async def slow_flush(db, clicks):
+        started.set()
+        await asyncio.sleep(10)
+
+    with patch("src.short_url.crud.flush_click_counts", side_effect=slow_flush):
+        task = asyncio.create_task(buffer.flush(mock_session))
+        await started.wait()
+        buffer.record("abc123")
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    assert buffer.pending("abc123")[0] == 2
+    assert buffer._flushing == {}
+
+@pytest.mark.asyncio
+async def test_merge_stats_after_flush_does_not_drop_clicks():
+    buffer = ClickBuffer()
+    buffer.record("abc123")
+    cached = {"abc123": {"original_url": "https://example.com", "click_count": 5, "last_accessed": None}}
+    mock_session = AsyncMock(spec=AsyncSession)
+
+    async def clear_stats(short_codes):
+        # a reader during the flush still sees the clicks on top of the old count
+        assert buffer.merge_stats("abc123", cached["abc123"])["click_count"] == 6
+        for short_code in short_codes:
+            cached.pop(short_code)
+
+    with patch("src.short_url.crud.flush_click_counts", new_callable=AsyncMock, return_value={}), \
+         patch("src.short_url.clicks.adjust_user_aggregates", new_callable=AsyncMock), \
+         patch("src.short_url.clicks.clear_cached_stats", side_effect=clear_stats):
+        await buffer.flush(mock_session)
+
+    assert "abc123" not in cached
+    assert buffer.pending("abc123") == (0, None)
+
+@pytest.mark.asyncio
+async def test_flush_survives_stats_cache_failure():
+    buffer = ClickBuffer()
+    buffer.record("abc123")
+    mock_session = AsyncMock(spec=AsyncSession)
+
+    with patch("src.short_url.crud.flush_click_counts", new_callable=AsyncMock, return_value={}), \
+         patch("src.short_url.clicks.adjust_user_aggregates", new_callable=AsyncMock), \
+         patch("src.short_url.clicks.clear_cached_stats", new_callable=AsyncMock, side_effect=ConnectionError("down")):
+        assert await buffer.flush(mock_session) == 1
+
+    assert buffer.pending("abc123") == (0, None)
+
+@pytest.mark.asyncio
+async def test_flush_click_counts_single_update():
+    mock_session = AsyncMock(spec=AsyncSession)
+    mock_session.commit = AsyncMock()
+    mock_session.execute.return_value = MagicMock(all=MagicMock(return_value=[(1, 2), (None, 1), (1, 4)]))
+
+    user_clicks = await flush_click_counts(mock_session, {
+        "abc123": (2, datetime.now()),
+        "xyz789": (1, datetime.now())
+    })
+    assert user_clicks == {1: 6}
+    mock_session.execute.assert_awaited_once()
+    assert "RETURNING links.user_id" in str(mock_session.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+    mock_session.commit.assert_awaited_once()
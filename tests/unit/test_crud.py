@@ -6,19 +6,36 @@ from src.short_url.crud import (
     normalize_url,
     check_short_link_exists,
     create_link,
+    get_or_create_links,
+    lock_link_urls,
+    get_or_create_link,
+    get_or_insert_link_query,
     get_link_by_short_code,
-    update_link_stats,
     delete_link,
     update_link,
     get_link_stats,
     search_link_by_url,
+    stream_links_by_prefix,
+    url_host,
+    url_hash,
+    encode_cursor,
+    decode_cursor,
+    list_user_links,
+    parse_user_links_cursor,
+    count_user_links,
     delete_expired_links,
     delete_inactive_links,
-    count_clicks_in_cache
+    encode_base62,
+    scramble_id,
+    BlockCodeGenerator,
+    build_code_generator,
+    SHORT_CODE_LENGTH
 )
 from src.short_url.schemas import LinkCreate
+from src.models import SHORT_CODE_BLOCK_INCREMENT
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
 
 @pytest.mark.asyncio
 async def test_generate_short_code():
@@ -36,6 +53,8 @@ def test_normalize_url():
     assert normalize_url("https://example.com?query=param") == "https://example.com?query=param"
     assert normalize_url("http://example.com") == "http://example.com"
     assert normalize_url("example.com") == "https://example.com"
+    assert normalize_url("Example.com/Campaign/a") == "https://example.com/Campaign/a"
+    assert normalize_url("Example.com:8080/a?q=1") == "https://example.com:8080/a?q=1"
     assert normalize_url("https://EXAMPLE.COM") == "https://example.com"
     assert normalize_url("https://example.com/%7Euser") == "https://example.com/~user"
     assert normalize_url("") == ""
@@ -68,15 +87,12 @@ async def test_check_short_link_exists_not_found():
         assert result is None
 
 @pytest.mark.asyncio
-async def test_create_link(mocker):
+async def test_create_link():
     mock_session = AsyncMock(spec=AsyncSession)
     mock_session.commit = AsyncMock()
-    mock_session.refresh = AsyncMock()
-
-    mocker.patch(
-        "src.short_url.crud.check_short_link_exists",
-        return_value=None
-    )
+    mock_result = MagicMock()
+    mock_result.scalars().first.return_value = MagicMock(short_code="100680")
+    mock_session.execute.return_value = mock_result
 
     link_data = LinkCreate(
         original_url="https://example.com",
@@ -84,22 +100,21 @@ async def test_create_link(mocker):
         expires_at=None
     )
 
-    result = await create_link(mock_session, link_data)
+    with patch('src.short_url.crud.code_generator.next_code', new_callable=AsyncMock, return_value="100680"):
+        result = await create_link(mock_session, link_data)
     assert result is not None
-    mock_session.add.assert_called_once()
+    mock_session.execute.assert_awaited_once()
     mock_session.commit.assert_awaited_once()
-    mock_session.refresh.assert_awaited_once()
+    mock_session.add.assert_not_called()
+    mock_session.refresh.assert_not_awaited()
 
 @pytest.mark.asyncio
-async def test_create_link_with_custom_alias(mocker):
+async def test_create_link_with_custom_alias():
     mock_session = AsyncMock(spec=AsyncSession)
     mock_session.commit = AsyncMock()
-    mock_session.refresh = AsyncMock()
-
-    mocker.patch(
-        "src.short_url.crud.check_short_link_exists",
-        return_value=None
-    )
+    mock_result = MagicMock()
+    mock_result.scalars().first.return_value = MagicMock(short_code="custom")
+    mock_session.execute.return_value = mock_result
 
     link_data = LinkCreate(
         original_url="https://example.com",
@@ -110,9 +125,205 @@ async def test_create_link_with_custom_alias(mocker):
     result = await create_link(mock_session, link_data)
     assert result is not None
     assert result.short_code == "custom"
-    mock_session.add.assert_called_once()
+    stmt = mock_session.execute.call_args.args[0]
+    assert "ON CONFLICT DO NOTHING" in str(stmt.compile(dialect=postgresql.dialect()))
+    mock_session.commit.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_create_link_conflict():
+    mock_session = AsyncMock(spec=AsyncSession)
+    mock_session.commit = AsyncMock()
+    mock_result = MagicMock()
+    mock_result.scalars().first.return_value = None
+    mock_session.execute.return_value = mock_result
+
+    link_data = LinkCreate(
+        original_url="https://example.com",
+        custom_alias="existing",
+        expires_at=None
+    )
+
+    result = await create_link(mock_session, link_data)
+    assert result is False
+    mock_session.execute.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_create_link_retries_generated_code_on_conflict():
+    mock_session = AsyncMock(spec=AsyncSession)
+    mock_session.commit = AsyncMock()
+    taken = MagicMock()
+    taken.scalars().first.return_value = None
+    created = MagicMock()
+    created.scalars().first.return_value = MagicMock(short_code="second")
+    mock_session.execute.side_effect = [taken, created]
+
+    link_data = LinkCreate(original_url="https://example.com")
+
+    with patch('src.short_url.crud.code_generator.next_code', new_callable=AsyncMock, side_effect=["first", "second"]):
+        result = await create_link(mock_session, link_data)
+    assert result.short_code == "second"
+    assert mock_session.execute.await_count == 2
+
+@pytest.mark.asyncio
+async def test_get_or_create_link_returns_existing_link():
+    mock_session = AsyncMock(spec=AsyncSession)
+    existing = MagicMock(short_code="0k3Fq9a")
+    mock_result = MagicMock()
+    mock_result.first.return_value = MagicMock(created=False, __getitem__=lambda row, index: existing)
+    mock_session.execute.return_value = mock_result
+    link_data = LinkCreate(original_url="https://EXAMPLE.com/")
+
+    with patch('src.short_url.crud.code_generator.next_code', new_callable=AsyncMock, return_value="gen0001"), \
+         patch('src.short_url.crud.create_link', new_callable=AsyncMock) as mock_create:
+        result = await get_or_create_link(mock_session, link_data, user_id=1)
+
+    assert result == (existing, False)
+    lock, upsert = [call.args[0] for call in mock_session.execute.await_args_list]
+    # the lock comes first, so a concurrent first shorten waits and then finds this row
+    lock = lock.compile(dialect=postgresql.dialect())
+    assert "pg_advisory_xact_lock(hashtext(" in str(lock)
+    assert lock.params["lock_keys"] == [f"link:{url_hash('https://example.com')}:1"]
+    assert str(upsert.compile(dialect=postgresql.dialect())).startswith("WITH existing AS")
+    mock_create.assert_not_awaited()
     mock_session.commit.assert_awaited_once()
-    mock_session.refresh.assert_awaited_once()
+
+def test_get_or_create_link_looks_up_and_inserts_in_one_statement():
+    stmt = get_or_insert_link_query("https://example.com", "gen0001", LinkCreate(original_url="https://example.com"), 1)
+    compiled = stmt.compile(dialect=postgresql.dialect())
+    sql = str(compiled)
+
+    assert sql.startswith("WITH existing AS")
+    assert "inserted AS \n(INSERT INTO links" in sql
+    assert "WHERE NOT (EXISTS (SELECT existing.link_id" in sql
+    assert "ON CONFLICT DO NOTHING RETURNING" in sql
+    assert "UNION ALL" in sql
+    assert "gen0001" in compiled.params.values()
+
+@pytest.mark.asyncio
+async def test_get_or_create_link_retries_taken_generated_code():
+    mock_session = AsyncMock(spec=AsyncSession)
+    mock_result = MagicMock()
+    mock_result.first.return_value = None
+    mock_session.execute.return_value = mock_result
+    created = MagicMock(short_code="gen0002")
+
+    with patch('src.short_url.crud.code_generator.next_code', new_callable=AsyncMock, return_value="gen0001"), \
+         patch('src.short_url.crud.create_link', new_callable=AsyncMock, return_value=created) as mock_create:
+        result = await get_or_create_link(mock_session, LinkCreate(original_url="https://EXAMPLE.com/"), user_id=1)
+
+    assert result == (created, True)
+    assert mock_session.execute.await_count == 2
+    mock_create.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_get_or_create_link_taken_alias():
+    mock_session = AsyncMock(spec=AsyncSession)
+    mock_result = MagicMock()
+    mock_result.first.return_value = None
+    mock_session.execute.return_value = mock_result
+
+    with patch('src.short_url.crud.create_link', new_callable=AsyncMock) as mock_create:
+        result = await get_or_create_link(mock_session, LinkCreate(original_url="https://example.com", custom_alias="taken"))
+
+    assert result == (False, False)
+    mock_create.assert_not_awaited()
+    mock_session.commit.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_lock_link_urls_in_sorted_order():
+    mock_session = AsyncMock(spec=AsyncSession)
+    await lock_link_urls(mock_session, ["https://example.org", "https://example.com", "https://example.org"], 1)
+
+    compiled = mock_session.execute.await_args.args[0].compile(dialect=postgresql.dialect())
+    assert "unnest(" in str(compiled)
+    assert compiled.params["lock_keys"] == sorted({
+        f"link:{url_hash('https://example.com')}:1", f"link:{url_hash('https://example.org')}:1"
+    })
+
+def _batch_session(existing, inserted):
+    mock_session = AsyncMock(spec=AsyncSession)
+    lookup = MagicMock()
+    lookup.scalars.return_value.all.return_value = existing
+    insert_result = MagicMock()
+    insert_result.scalars.return_value = inserted
+    mock_session.execute.side_effect = [MagicMock(), lookup, insert_result]
+    return mock_session
+
+@pytest.mark.asyncio
+async def test_get_or_create_links_single_insert():
+    mock_session = _batch_session([], [MagicMock(short_code="gen0001"), MagicMock(short_code="custom")])
+
+    links = [
+        LinkCreate(original_url="https://example.com"),
+        LinkCreate(original_url="https://example.org", custom_alias="custom"),
+        LinkCreate(original_url="https://example.net", custom_alias="custom")
+    ]
+
+    with patch('src.short_url.crud.code_generator.next_code', new_callable=AsyncMock, return_value="gen0001"):
+        result = await get_or_create_links(mock_session, links)
+    assert [(link.short_code if link else None, created) for link, created in result] == [
+        ("gen0001", True), ("custom", True), (None, False)
+    ]
+    assert mock_session.execute.await_count == 3
+    mock_session.commit.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_get_or_create_links_reuses_existing_links():
+    known = MagicMock(short_code="known01", original_url="https://example.com", expires_at=None)
+    aliased_elsewhere = MagicMock(short_code="alias01", original_url="https://example.org", expires_at=None)
+    mock_session = _batch_session([known, aliased_elsewhere], [MagicMock(short_code="mine")])
+
+    links = [
+        LinkCreate(original_url="https://EXAMPLE.com/"),
+        LinkCreate(original_url="https://example.org", custom_alias="mine"),
+        LinkCreate(original_url="https://example.org", custom_alias="mine"),
+        LinkCreate(original_url="https://example.com")
+    ]
+
+    with patch('src.short_url.crud.code_generator.next_code', new_callable=AsyncMock, return_value="gen0001"):
+        result = await get_or_create_links(mock_session, links, user_id=1)
+
+    assert result[0] == (known, False)
+    assert result[3] == (known, False)
+    assert result[1][0].short_code == "mine" and result[1][1] is True
+    # a repeat within the batch shares the link without counting it twice
+    assert result[2] == (result[1][0], False)
+    insert = mock_session.execute.await_args_list[2].args[0].compile(dialect=postgresql.dialect())
+    assert "mine" in insert.params.values()
+    assert "gen0001" not in insert.params.values()
+
+@pytest.mark.asyncio
+async def test_get_or_create_links_empty():
+    mock_session = AsyncMock(spec=AsyncSession)
+    assert await get_or_create_links(mock_session, []) == []
+    mock_session.execute.assert_not_awaited()
+
+def test_encode_base62():
+    assert encode_base62(0) == "0" * SHORT_CODE_LENGTH
+    assert encode_base62(61) == "000000Z"
+    assert encode_base62(62) == "0000010"
+
+def test_scramble_id_is_unique():
+    codes = {encode_base62(scramble_id(number)) for number in range(10000)}
+    assert len(codes) == 10000
+
+@pytest.mark.asyncio
+async def test_block_code_generator_reserves_once_per_block():
+    reserve_block = AsyncMock(side_effect=[1000, 2000])
+    generator = BlockCodeGenerator(block_size=3, reserve_block=reserve_block)
+
+    codes = [await generator.next_code(None, "https://example.com") for _ in range(4)]
+    assert len(set(codes)) == 4
+    assert all(len(code) == SHORT_CODE_LENGTH for code in codes)
+    assert codes[0] == encode_base62(scramble_id(1000))
+    assert codes[3] == encode_base62(scramble_id(2000))
+    assert reserve_block.await_count == 2
+
+def test_block_size_is_capped_at_sequence_increment():
+    with patch('src.short_url.crud.settings.SHORT_CODE_BLOCK_SIZE', 5000):
+        assert build_code_generator("block").block_size == SHORT_CODE_BLOCK_INCREMENT
+    with patch('src.short_url.crud.settings.SHORT_CODE_BLOCK_SIZE', 100):
+        assert build_code_generator("block").block_size == 100
 
 @pytest.mark.asyncio
 async def test_get_link_by_short_code_not_found():
@@ -127,19 +338,6 @@ async def test_get_link_by_short_code_not_found():
         result = await get_link_by_short_code(mock_session, "abc123")
         assert result is None
 
-@pytest.mark.asyncio
-async def test_update_link_stats():
-    mock_session = AsyncMock(spec=AsyncSession)
-    mock_link = MagicMock()
-    mock_link.click_count = 0
-    mock_session.commit = AsyncMock()
-
-    before_last_accessed = mock_link.last_accessed
-    await update_link_stats(mock_session, mock_link)
-    assert mock_link.click_count == 1
-    assert mock_link.last_accessed != before_last_accessed
-    mock_session.commit.assert_awaited_once()
-
 @pytest.mark.asyncio
 async def test_delete_link_success():
     mock_session = AsyncMock(spec=AsyncSession)
@@ -154,22 +352,25 @@ async def test_delete_link_success():
 @pytest.mark.asyncio
 async def test_update_link_success():
     mock_session = AsyncMock(spec=AsyncSession)
-    mock_session.commit = AsyncMock()
-    
-    with patch('src.short_url.crud.check_short_link_exists', return_value=MagicMock()):
-        result = await update_link(mock_session, "abc123", "https://new-url.com")
-        assert result is True
-        mock_session.execute.assert_called_once()
-        mock_session.commit.assert_awaited_once()
+    updated = MagicMock(original_url="https://new-url.com")
+    mock_session.execute.return_value = MagicMock()
+    mock_session.execute.return_value.scalars.return_value.first.return_value = updated
+
+    result = await update_link(mock_session, "abc123", "https://new-url.com")
+    assert result is updated
+    mock_session.execute.assert_awaited_once()
+    assert "RETURNING" in str(mock_session.execute.call_args.args[0].compile(dialect=postgresql.dialect()))
+    mock_session.commit.assert_awaited_once()
 
 @pytest.mark.asyncio
 async def test_update_link_not_found():
     mock_session = AsyncMock(spec=AsyncSession)
-    
-    with patch('src.short_url.crud.check_short_link_exists', return_value=None):
-        result = await update_link(mock_session, "abc123", "https://new-url.com")
-        assert result is False
-        mock_session.execute.assert_not_called()
+    mock_session.execute.return_value = MagicMock()
+    mock_session.execute.return_value.scalars.return_value.first.return_value = None
+
+    result = await update_link(mock_session, "abc123", "https://new-url.com")
+    assert result is None
+    mock_session.commit.assert_not_awaited()
 
 @pytest.mark.asyncio
 async def test_get_link_stats_not_found():
@@ -189,74 +390,190 @@ async def test_search_link_by_url_empty():
         mock_select.return_value.where.return_value = mock_select.return_value
         mock_session.execute.return_value = mock_result
         
-        results = await search_link_by_url(mock_session, "https://example.com")
+        results, next_cursor = await search_link_by_url(mock_session, "https://example.com")
         assert len(results) == 0
+        assert next_cursor is None
+
+@pytest.mark.asyncio
+async def test_search_link_by_url_returns_cursor_when_more_rows():
+    mock_session = AsyncMock(spec=AsyncSession)
+    rows = [MagicMock(link_id=link_id, short_code=f"code{link_id}") for link_id in (11, 12, 13)]
+    mock_session.execute.return_value = MagicMock(all=MagicMock(return_value=rows))
+
+    results, next_cursor = await search_link_by_url(mock_session, "https://example.com", limit=2, cursor=10)
+
+    assert [link["short_code"] for link in results] == ["code11", "code12"]
+    assert next_cursor == 12
+    assert "links.link_id > " in str(mock_session.execute.await_args.args[0])
+
+def batch_result(rows):
+    result = MagicMock()
+    result.all.return_value = rows
+    return result
 
 @pytest.mark.asyncio
 async def test_delete_expired_links():
     mock_session = AsyncMock(spec=AsyncSession)
-    mock_session.commit = AsyncMock()
-    
-    mock_link1 = MagicMock()
-    mock_link2 = MagicMock()
-    mock_result = MagicMock()
-    mock_result.scalars().all.return_value = [mock_link1, mock_link2]
-    
-    with patch('src.short_url.crud.select', return_value=MagicMock()) as mock_select:
-        mock_select.return_value.where.return_value = mock_select.return_value
-        mock_session.execute.return_value = mock_result
-        
-        await delete_expired_links(mock_session)
-        assert mock_session.delete.call_count == 2
-        mock_session.commit.assert_awaited_once()
+    first = [MagicMock(link_id=3, short_code="a"), MagicMock(link_id=7, short_code="b")]
+    second = [MagicMock(link_id=9, short_code="c")]
+    mock_session.execute.side_effect = [batch_result(first), batch_result(second), batch_result([])]
+    on_batch = AsyncMock()
+
+    with patch('src.short_url.crud.asyncio.sleep', new_callable=AsyncMock), \
+         patch('src.short_url.crud.is_partitioned', AsyncMock(return_value=False)):
+        deleted = await delete_expired_links(mock_session, on_batch=on_batch)
+
+    assert deleted == 3
+    assert mock_session.commit.await_count == 3
+    assert on_batch.await_args_list[0].args == (first,)
+    assert on_batch.await_args_list[1].args == (second,)
+
+    sql = str(mock_session.execute.await_args_list[1].args[0].compile(
+        dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+    ))
+    assert "FOR UPDATE SKIP LOCKED" in sql
+    assert "links.link_id > 7" in sql
+    assert "RETURNING links.link_id, links.short_code" in sql
 
 @pytest.mark.asyncio
-async def test_delete_inactive_links():
+async def test_delete_expired_links_sweeps_only_default_partition():
     mock_session = AsyncMock(spec=AsyncSession)
-    mock_session.commit = AsyncMock()
-    
-    mock_link1 = MagicMock(link_id=1)
-    mock_link2 = MagicMock(link_id=2)
-    mock_result = MagicMock()
-    mock_result.scalars().all.return_value = [mock_link1, mock_link2]
-    
-    with patch('src.short_url.crud.select', return_value=MagicMock()) as mock_select:
-        mock_select.return_value.where.return_value = mock_select.return_value
-        mock_session.execute.return_value = mock_result
-        
-        result = await delete_inactive_links(mock_session, days=7)
-        assert result["deleted_count"] == 2
-        mock_session.execute.assert_called()
-        mock_session.commit.assert_awaited_once()
+    mock_session.execute.return_value = batch_result([])
+
+    with patch('src.short_url.crud.is_partitioned', AsyncMock(return_value=True)):
+        assert await delete_expired_links(mock_session) == 0
+
+    sql = str(mock_session.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+    assert sql.startswith("DELETE FROM links_default WHERE links_default.link_id IN")
+    assert "links_default.expires_at < " in sql
+    assert "FROM links " not in sql
 
 @pytest.mark.asyncio
-async def test_delete_inactive_links_none_found():
+async def test_delete_inactive_links():
     mock_session = AsyncMock(spec=AsyncSession)
-    mock_session.commit = AsyncMock()
-    
-    mock_result = MagicMock()
-    mock_result.scalars().all.return_value = []
-    
-    with patch('src.short_url.crud.select', return_value=MagicMock()) as mock_select:
-        mock_select.return_value.where.return_value = mock_select.return_value
-        mock_session.execute.return_value = mock_result
-        
+    rows = [MagicMock(link_id=1), MagicMock(link_id=2)]
+    mock_session.execute.side_effect = [batch_result(rows), batch_result([])]
+
+    with patch('src.short_url.crud.asyncio.sleep', new_callable=AsyncMock) as mock_sleep, \
+         patch('src.short_url.crud.settings.CLEANUP_BATCH_SIZE', 2):
         result = await delete_inactive_links(mock_session, days=7)
-        assert result["deleted_count"] == 0
-        mock_session.commit.assert_not_awaited()
+
+    assert result["deleted_count"] == 2
+    mock_sleep.assert_awaited_once()
+    sql = str(mock_session.execute.await_args_list[0].args[0].compile(dialect=postgresql.dialect()))
+    assert "LIMIT" in sql
+    assert "last_accessed IS NULL" in sql
 
 @pytest.mark.asyncio
-async def test_count_clicks_in_cache():
+async def test_delete_inactive_links_none_found():
     mock_session = AsyncMock(spec=AsyncSession)
-    mock_session.commit = AsyncMock()
-    
-    result = await count_clicks_in_cache(mock_session, "abc123")
-    assert result == {"added click from cache": "abc123"}
-    mock_session.execute.assert_called_once()
-    mock_session.commit.assert_awaited_once()
+    mock_session.execute.return_value = batch_result([])
+    on_batch = AsyncMock()
+
+    result = await delete_inactive_links(mock_session, days=7, on_batch=on_batch)
+    assert result["deleted_count"] == 0
+    mock_session.execute.assert_awaited_once()
+    on_batch.assert_not_awaited()
 
 @pytest.mark.asyncio
 async def test_normalize_url_with_unicode():
     url = "https://example.com/üniçode"
     normalized = normalize_url(url)
     assert "üniçode" in normalized
+
+def test_prefix_cursor_roundtrip():
+    assert url_host(normalize_url("HTTPS://Example.com:8080/campaign?a=1")) == "example.com:8080"
+    assert url_host(normalize_url("Example.com/campaign")) == "example.com"
+    cursor = encode_cursor("https://example.com/campaign/1", 42)
+    assert decode_cursor(cursor) == ("https://example.com/campaign/1", 42)
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+@pytest.mark.asyncio
+async def test_stream_links_by_prefix_uses_keyset():
+    async def rows():
+        yield MagicMock(link_id=7, short_code="abc123", original_url="https://example.com/campaign/a")
+
+    mock_session = AsyncMock(spec=AsyncSession)
+    mock_session.stream.return_value = rows()
+
+    links = [link async for link in stream_links_by_prefix(
+        mock_session, "example.com/campaign_1/", limit=10, cursor=("https://example.com/campaign_1/a", 3)
+    )]
+
+    assert links[0]["short_code"] == "abc123"
+    assert decode_cursor(links[0]["cursor"]) == ("https://example.com/campaign/a", 7)
+    stmt = mock_session.stream.await_args.args[0]
+    compiled = stmt.compile(dialect=postgresql.dialect())
+    sql = str(compiled)
+    assert "links.host = %(host_1)s" in sql and compiled.params["host_1"] == "example.com"
+    assert "https://example.com/campaign\\_1/%" in compiled.params.values()
+    assert '(links.original_url COLLATE "C", links.link_id) >' in sql
+    assert 'ORDER BY links.original_url COLLATE "C", links.link_id' in sql
+
+@pytest.mark.asyncio
+async def test_stream_links_by_domain_skips_prefix_filter():
+    async def rows():
+        return
+        yield
+
+    mock_session = AsyncMock(spec=AsyncSession)
+    mock_session.stream.return_value = rows()
+
+    assert [link async for link in stream_links_by_prefix(mock_session, "Example.com")] == []
+    compiled = mock_session.stream.await_args.args[0].compile(dialect=postgresql.dialect())
+    assert "LIKE" not in str(compiled)
+    assert compiled.params["host_1"] == "example.com"
+
+@pytest.mark.asyncio
+async def test_stream_links_by_prefix_lowercases_host_without_scheme():
+    async def rows():
+        return
+        yield
+
+    mock_session = AsyncMock(spec=AsyncSession)
+    mock_session.stream.return_value = rows()
+
+    assert [link async for link in stream_links_by_prefix(mock_session, "Example.COM/Campaign")] == []
+    compiled = mock_session.stream.await_args.args[0].compile(dialect=postgresql.dialect())
+    assert compiled.params["host_1"] == "example.com"
+    # the link is stored under the same spelling, so the byte wise prefix match finds it
+    stored = normalize_url("Example.com/Campaign/a")
+    assert stored.startswith("https://example.com/Campaign")
+    assert "https://example.com/Campaign%" in compiled.params.values()
+
+@pytest.mark.asyncio
+async def test_list_user_links_pages_by_recency():
+    created_at = datetime(2026, 10, 1, 12, 0)
+    rows = [
+        MagicMock(link_id=link_id, short_code=f"code{link_id}", created_at=created_at, click_count=0)
+        for link_id in (9, 8, 7)
+    ]
+    mock_session = AsyncMock(spec=AsyncSession)
+    mock_session.execute.return_value = MagicMock(all=MagicMock(return_value=rows))
+
+    links, next_cursor = await list_user_links(mock_session, 1, "recent", 2, (datetime(2026, 10, 2), 10))
+
+    assert [link["short_code"] for link in links] == ["code9", "code8"]
+    assert parse_user_links_cursor(next_cursor, "recent") == (created_at, 8)
+    sql = str(mock_session.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+    assert "(links.created_at, links.link_id) < " in sql
+    assert "ORDER BY links.created_at DESC, links.link_id DESC" in sql
+
+@pytest.mark.asyncio
+async def test_list_user_links_by_clicks_last_page():
+    mock_session = AsyncMock(spec=AsyncSession)
+    mock_session.execute.return_value = MagicMock(all=MagicMock(return_value=[MagicMock(link_id=3, short_code="abc123")]))
+
+    links, next_cursor = await list_user_links(mock_session, 1, "clicks", 2)
+
+    assert len(links) == 1 and next_cursor is None
+    assert "ORDER BY links.click_count DESC" in str(mock_session.execute.await_args.args[0])
+    with pytest.raises(ValueError):
+        parse_user_links_cursor(encode_cursor("many", 3), "clicks")
+
+@pytest.mark.asyncio
+async def test_count_user_links():
+    mock_session = AsyncMock(spec=AsyncSession)
+    mock_session.execute.return_value = MagicMock(one=MagicMock(return_value=(3, 12)))
+    assert await count_user_links(mock_session, 1) == {"total_links": 3, "total_clicks": 12}
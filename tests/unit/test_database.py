@@ -0,0 +1,76 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from fastapi import status
+from fastapi.testclient import TestClient
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+from src.database import LazyAsyncSession, get_lazy_session
+from src.main import app
+from src.short_url.clicks import click_buffer
+from src.short_url.records import CachedLink
+
+
+@pytest.fixture(autouse=True)
+async def setup_cache():
+    FastAPICache.init(InMemoryBackend())
+    yield
+    await FastAPICache.clear()
+
+@pytest.mark.asyncio
+async def test_lazy_session_opens_on_first_use():
+    session = AsyncMock()
+    factory = MagicMock(return_value=session)
+    lazy = LazyAsyncSession(factory)
+
+    assert not lazy.started
+    factory.assert_not_called()
+
+    await lazy.execute("SELECT 1")
+    await lazy.commit()
+    factory.assert_called_once_with()
+    session.execute.assert_awaited_once_with("SELECT 1")
+
+    await lazy.close()
+    session.close.assert_awaited_once()
+    assert not lazy.started
+
+@pytest.mark.asyncio
+async def test_get_lazy_session_closes_unused_session_without_opening():
+    factory = MagicMock()
+    with patch('src.database.async_session_maker', factory):
+        dependency = get_lazy_session()
+        await anext(dependency)
+        with pytest.raises(StopAsyncIteration):
+            await anext(dependency)
+    factory.assert_not_called()
+
+def test_cache_hit_redirect_does_not_open_session():
+    factory = MagicMock()
+    cached = CachedLink("lazyhit", "https://example.com", None, 0)
+    lookup = AsyncMock(return_value=cached)
+    # cache hits are answered by the fast path middleware, or by the route when it is disabled
+    with patch('src.database.async_session_maker', factory), \
+         patch('src.short_url.fastpath.lookup_cached_link', lookup), \
+         patch('src.short_url.router.lookup_cached_link', lookup), \
+         patch.object(click_buffer, 'record') as record:
+        response = TestClient(app).get("/links/lazyhit", follow_redirects=False)
+
+    assert response.status_code == status.HTTP_302_FOUND
+    assert response.headers["location"] == "https://example.com"
+    lookup.assert_awaited_once_with("lazyhit")
+    record.assert_called_once_with("lazyhit")
+    factory.assert_not_called()
+
+def test_cache_miss_redirect_reads_cache_once():
+    loaded = CachedLink("lazymiss", "https://example.com", None, 0)
+    lookup = AsyncMock(return_value=None)
+    with patch('src.short_url.fastpath.lookup_cached_link', lookup), \
+         patch('src.short_url.router.lookup_cached_link', lookup), \
+         patch('src.short_url.fastpath.link_filter.might_exist', return_value=True), \
+         patch('src.short_url.router.load_link', AsyncMock(return_value=loaded)) as load, \
+         patch.object(click_buffer, 'record'):
+        response = TestClient(app).get("/links/lazymiss", follow_redirects=False)
+
+    assert response.status_code == status.HTTP_302_FOUND
+    lookup.assert_awaited_once_with("lazymiss")
+    load.assert_awaited_once()
@@ -0,0 +1,89 @@
+import csv
+import io
+import json
+import os
+import pytest
+from collections import namedtuple
+from contextlib import asynccontextmanager
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+from sqlalchemy.dialects import postgresql
+from src.short_url.crud import stream_user_links
+from src.short_url.export import EXPORT_COLUMNS, csv_chunk, ndjson_chunk, export_user_links
+
+Row = namedtuple("Row", EXPORT_COLUMNS)
+CREATED_AT = datetime(2026, 10, 1, 12, 0)
+
+
+def current_rss() -> int:
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+@asynccontextmanager
+async def fake_session():
+    yield AsyncMock()
+
+def synthetic_batches(total: int, batch_size: int = 1000):
+    async def stream(session, user_id):
+        for start in range(0, total, batch_size):
+            yield [
+                Row(f"c{index}", f"https://example.com/{index}", CREATED_AT, None, index % 100, None)
+                for index in range(start, min(start + batch_size, total))
+            ]
+    return stream
+
+def test_chunks_render_rows():
+    rows = [Row("abc123", "https://example.com/a,b", CREATED_AT, None, 3, CREATED_AT)]
+
+    assert json.loads(ndjson_chunk(rows)) == {
+        "short_code": "abc123",
+        "original_url": "https://example.com/a,b",
+        "created_at": "2026-10-01T12:00:00",
+        "expires_at": None,
+        "click_count": 3,
+        "last_accessed": "2026-10-01T12:00:00"
+    }
+    assert next(csv.reader(io.StringIO(csv_chunk(rows))))[:2] == ["abc123", "https://example.com/a,b"]
+
+@pytest.mark.asyncio
+async def test_csv_export_starts_with_header():
+    with patch('src.short_url.export.crud.stream_user_links', synthetic_batches(3)):
+        chunks = [chunk async for chunk in export_user_links(1, "csv", fake_session)]
+
+    lines = "".join(chunks).splitlines()
+    assert lines[0] == ",".join(EXPORT_COLUMNS)
+    assert len(lines) == 4
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/statm"), reason="needs /proc to read RSS")
+@pytest.mark.asyncio
+async def test_export_of_million_rows_keeps_rss_bounded():
+    total = 1_000_000
+    lines = 0
+    baseline = peak = current_rss()
+    with patch('src.short_url.export.crud.stream_user_links', synthetic_batches(total)):
+        async for chunk in export_user_links(1, "ndjson", fake_session):
+            lines += chunk.count("\n")
+            peak = max(peak, current_rss())
+
+    assert lines == total
+    # a materialized export of these rows would need a few hundred megabytes
+    assert peak - baseline < 32 * 1024 * 1024
+
+@pytest.mark.asyncio
+async def test_stream_user_links_uses_server_side_cursor():
+    async def partitions():
+        yield ["first"]
+        yield ["second"]
+
+    result = MagicMock()
+    result.partitions.return_value = partitions()
+    mock_session = AsyncMock()
+    mock_session.stream.return_value = result
+
+    batches = [rows async for rows in stream_user_links(mock_session, 1, batch_size=500)]
+
+    assert batches == [["first"], ["second"]]
+    stmt = mock_session.stream.await_args.args[0]
+    assert stmt.get_execution_options()["yield_per"] == 500
+    assert "ORDER BY links.created_at, links.link_id" in str(stmt.compile(dialect=postgresql.dialect()))
@@ -0,0 +1,75 @@
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, patch
+from fastapi.routing import APIRoute
+from src.short_url.cache import MISSING_LINK
+from src.short_url.clicks import click_buffer
+from src.short_url.fastpath import CACHE_MISS_STATE, RedirectFastPath, reserved_paths
+from src.short_url.records import CachedLink
+
+
+def make_scope(path, method="GET", headers=()):
+    return {"type": "http", "method": method, "path": path, "headers": list(headers)}
+
+async def call(middleware, scope):
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    await middleware(scope, AsyncMock(), send)
+    return messages
+
+@pytest.fixture
+def inner_app():
+    return AsyncMock()
+
+@pytest.mark.asyncio
+async def test_cache_hit_redirects_without_router(inner_app):
+    cached = CachedLink("fast1", "https://example.com/путь", None, 0)
+    with patch('src.short_url.fastpath.lookup_cached_link', AsyncMock(return_value=cached)):
+        messages = await call(RedirectFastPath(inner_app), make_scope("/links/fast1"))
+
+    assert messages[0]["status"] == 302
+    assert dict(messages[0]["headers"])[b"location"] == b"https://example.com/%D0%BF%D1%83%D1%82%D1%8C"
+    assert click_buffer.pending("fast1")[0] == 1
+    inner_app.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_preview_request_is_not_counted(inner_app):
+    cached = CachedLink("fast1", "https://example.com", None, 0)
+    with patch('src.short_url.fastpath.lookup_cached_link', AsyncMock(return_value=cached)):
+        messages = await call(RedirectFastPath(inner_app), make_scope("/links/fast1", headers=[(b"sec-purpose", b"Prefetch")]))
+
+    assert messages[0]["status"] == 302
+    assert click_buffer.pending("fast1")[0] == 0
+
+@pytest.mark.asyncio
+async def test_missing_and_expired_links_are_rejected(inner_app):
+    expired = CachedLink("old1", "https://example.com", datetime.now() - timedelta(minutes=1), 0)
+    for cached in (MISSING_LINK, expired):
+        with patch('src.short_url.fastpath.lookup_cached_link', AsyncMock(return_value=cached)):
+            messages = await call(RedirectFastPath(inner_app), make_scope("/links/old1"))
+        assert messages[0]["status"] == 404
+    inner_app.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_cache_miss_falls_through_to_router(inner_app):
+    with patch('src.short_url.fastpath.lookup_cached_link', AsyncMock(return_value=None)):
+        await call(RedirectFastPath(inner_app), make_scope("/links/cold1"))
+    inner_app.assert_awaited_once()
+    assert inner_app.await_args.args[0]["state"] == {CACHE_MISS_STATE: True}
+
+@pytest.mark.asyncio
+async def test_other_routes_are_passed_through(inner_app):
+    routes = [APIRoute("/links/mine", lambda: None, methods=["GET"]), APIRoute("/links/{short_code}", lambda: None, methods=["GET"])]
+    middleware = RedirectFastPath(inner_app, routes=routes)
+    lookup = AsyncMock()
+
+    with patch('src.short_url.fastpath.lookup_cached_link', lookup):
+        for scope in (make_scope("/links/mine"), make_scope("/links/abc/stats"), make_scope("/links/abc", method="DELETE")):
+            await call(middleware, scope)
+
+    assert reserved_paths(routes) == {"mine"}
+    assert inner_app.await_count == 3
+    lookup.assert_not_awaited()
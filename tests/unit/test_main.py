@@ -1,7 +1,11 @@
+import asyncio
 import pytest
 from fastapi.testclient import TestClient
 from unittest.mock import patch, MagicMock, AsyncMock
-from src.main import app, lifespan, run_background_task
+from src.main import app, lifespan, cleanup_expired_links, cleanup_inactive_links
+from src.scheduler import scheduler
+from src.short_url.cache import local_cache
+from src.short_url.records import CachedLink
 import src.main
 from redis.exceptions import RedisError
 
@@ -16,15 +20,15 @@ def test_unprotected_route(client):
 
 @pytest.mark.asyncio
 async def test_background_tasks():
-    with patch('src.main.delete_expired_links', new_callable=AsyncMock) as mock_expired, \
-         patch('src.main.delete_inactive_links', new_callable=AsyncMock) as mock_inactive, \
-         patch('asyncio.sleep', side_effect=Exception('Test exit')):
-        
-        with pytest.raises(Exception, match='Test exit'):
-            await src.main.run_background_task()
-            
+    with patch('src.main.delete_expired_links', new_callable=AsyncMock, return_value=3) as mock_expired, \
+         patch('src.main.delete_inactive_links', new_callable=AsyncMock, return_value={"deleted_count": 2}) as mock_inactive:
+
+        assert await cleanup_expired_links() == 3
+        assert await cleanup_inactive_links() == 2
+
         mock_expired.assert_awaited()
         mock_inactive.assert_awaited()
+    assert {"cleanup_expired_links", "cleanup_inactive_links"} <= set(scheduler.jobs)
 
 @pytest.fixture
 def client():
@@ -53,3 +57,36 @@ def test_unprotected_route(client):
     response = client.get("/unprotected-route")
     assert response.status_code == 200
     assert "Hello, anonym" in response.text
+
+@pytest.mark.asyncio
+async def test_lifespan_keeps_warmed_local_cache():
+    pubsub = MagicMock()
+    pubsub.subscribe = AsyncMock()
+    pubsub.aclose = AsyncMock()
+    subscribed = asyncio.Event()
+
+    async def listen():
+        subscribed.set()
+        await asyncio.Event().wait()
+        yield
+
+    pubsub.listen = listen
+    redis = MagicMock(pubsub=MagicMock(return_value=pubsub), aclose=AsyncMock())
+
+    async def warm_cache(session):
+        local_cache.set("link:warm01", CachedLink("warm01", "https://example.com", None, 0))
+        return 1
+
+    local_cache.clear()
+    with patch('src.main.aioredis.from_url', return_value=redis), \
+         patch('src.main.warm_cache', warm_cache), \
+         patch('src.main.settings.WARMUP_LINKS', 10), \
+         patch('src.main.scheduler.run', new_callable=AsyncMock), \
+         patch('src.main.run_click_flush_task', new_callable=AsyncMock), \
+         patch('src.main.run_link_filter_task', new_callable=AsyncMock), \
+         patch('src.main.run_hot_set_snapshot_task', new_callable=AsyncMock), \
+         patch('src.main.flush_clicks', new_callable=AsyncMock), \
+         patch('src.main.FastAPICache.clear', new_callable=AsyncMock):
+        async with lifespan(app):
+            await asyncio.wait_for(subscribed.wait(), 1)
+            assert local_cache.get("link:warm01") == CachedLink("warm01", "https://example.com", None, 0)
@@ -0,0 +1,138 @@
+import pytest
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+from sqlalchemy.exc import IntegrityError
+from src.short_url.partitions import (
+    add_months,
+    create_partition,
+    is_partition_pending,
+    partition_name,
+    partition_start,
+    precreate_partitions,
+    drop_expired_partitions,
+    maintain_partitions
+)
+
+
+def executed_sql(session) -> list[str]:
+    return [str(call.args[0]) for call in session.execute.await_args_list]
+
+def test_partition_naming():
+    assert add_months(datetime(2026, 11, 15), 2) == datetime(2027, 1, 1)
+    assert add_months(datetime(2026, 1, 31), -1) == datetime(2025, 12, 1)
+    assert partition_name(datetime(2027, 1, 1)) == "links_p202701"
+    assert partition_start("links_p202701") == datetime(2027, 1, 1)
+
+@pytest.mark.asyncio
+async def test_precreate_partitions_creates_missing_months():
+    session = AsyncMock()
+    with patch('src.short_url.partitions.list_partitions', AsyncMock(return_value=["links_p202610"])):
+        created = await precreate_partitions(session, now=datetime(2026, 10, 18), months_ahead=2)
+
+    assert created == 2
+    sql = executed_sql(session)
+    assert not any("links_p202610" in s for s in sql)
+    assert session.commit.await_count == 8
+
+    november = sql[:len(sql) // 2]
+    # re-runnable after a run that died half way
+    assert november[0] == "CREATE TABLE IF NOT EXISTS links_p202611 (LIKE links INCLUDING DEFAULTS)"
+    assert november[1] == "ALTER TABLE links_default DROP CONSTRAINT IF EXISTS links_default_not_links_p202611"
+    november = november[1:]
+    assert november[1] == (
+        "ALTER TABLE links_default ADD CONSTRAINT links_default_not_links_p202611 CHECK (expires_at IS NULL "
+        "OR expires_at < '2026-11-01T00:00:00' OR expires_at >= '2026-12-01T00:00:00') NOT VALID"
+    )
+    assert november[2].startswith("WITH moved AS (DELETE FROM links_default") and "INSERT INTO links_p202611" in november[2]
+    assert november[3] == "ALTER TABLE links_default VALIDATE CONSTRAINT links_default_not_links_p202611"
+    assert november[4] == "ALTER TABLE links ATTACH PARTITION links_p202611 FOR VALUES FROM ('2026-11-01T00:00:00') TO ('2026-12-01T00:00:00')"
+    assert november[5] == "ALTER TABLE links_default DROP CONSTRAINT links_default_not_links_p202611"
+
+    # validation and attach each commit on their own
+    calls = [call[0] for call in session.mock_calls if call[0] in ("execute", "commit")]
+    assert calls[:11] == [
+        "execute", "execute", "execute", "execute", "commit", "execute", "commit", "execute", "commit", "execute", "commit"
+    ]
+
+@pytest.mark.asyncio
+async def test_create_partition_cleans_up_failed_validation():
+    session = AsyncMock()
+
+    async def execute(statement, params=None):
+        if "VALIDATE CONSTRAINT" in str(statement):
+            raise RuntimeError("validation failed")
+        if "to_regclass" in str(statement):
+            return MagicMock(one=MagicMock(return_value=(True, False)))
+        return MagicMock(rowcount=3)
+
+    session.execute.side_effect = execute
+    with pytest.raises(RuntimeError):
+        await create_partition(session, datetime(2026, 11, 1))
+
+    session.rollback.assert_awaited_once()
+    cleanup = executed_sql(session)[5:]
+    assert cleanup[0] == "ALTER TABLE links_default DROP CONSTRAINT IF EXISTS links_default_not_links_p202611"
+    assert cleanup[2].startswith("WITH moved AS (DELETE FROM links_p202611") and "INSERT INTO links_default" in cleanup[2]
+    assert cleanup[3] == "DROP TABLE links_p202611"
+    assert not any("ATTACH" in s for s in executed_sql(session))
+
+@pytest.mark.asyncio
+async def test_create_partition_keeps_attached_table_on_failure():
+    session = AsyncMock()
+
+    async def execute(statement, params=None):
+        if str(statement).startswith("ALTER TABLE links_default DROP CONSTRAINT links_default"):
+            raise RuntimeError("lock timeout")
+        if "to_regclass" in str(statement):
+            return MagicMock(one=MagicMock(return_value=(True, True)))
+        return MagicMock(rowcount=0)
+
+    session.execute.side_effect = execute
+    with pytest.raises(RuntimeError):
+        await create_partition(session, datetime(2026, 11, 1))
+
+    sql = executed_sql(session)
+    assert sql[-2] == "ALTER TABLE links_default DROP CONSTRAINT IF EXISTS links_default_not_links_p202611"
+    assert "to_regclass" in sql[-1]
+
+def test_partition_pending_check_violation():
+    pending = Exception('new row for relation "links_default" violates check constraint "links_default_not_links_p202611"')
+    pending.pgcode = "23514"
+    other = Exception('violates check constraint "links_other_check"')
+    other.pgcode = "23514"
+    assert is_partition_pending(IntegrityError("INSERT", {}, pending))
+    assert not is_partition_pending(IntegrityError("INSERT", {}, other))
+
+@pytest.mark.asyncio
+async def test_drop_expired_partitions_only_drops_finished_ranges():
+    session = AsyncMock()
+    session.execute.return_value = MagicMock(scalar=MagicMock(return_value=500))
+    partitions = ["links_p202608", "links_p202609", "links_p202610"]
+
+    with patch('src.short_url.partitions.list_partitions', AsyncMock(return_value=partitions)):
+        dropped = await drop_expired_partitions(session, now=datetime(2026, 10, 18))
+
+    assert dropped == 1000
+    sql = executed_sql(session)
+    assert "ALTER TABLE links DETACH PARTITION links_p202608" in sql
+    assert "DROP TABLE links_p202609" in sql
+    assert not any("links_p202610" in s for s in sql)
+
+@pytest.mark.asyncio
+async def test_drop_expired_partitions_can_keep_detached_tables():
+    session = AsyncMock()
+    session.execute.return_value = MagicMock(scalar=MagicMock(return_value=10))
+
+    with patch('src.short_url.partitions.list_partitions', AsyncMock(return_value=["links_p202601"])), \
+         patch('src.short_url.partitions.settings.PARTITION_DETACH_ONLY', True):
+        await drop_expired_partitions(session, now=datetime(2026, 10, 18))
+
+    assert not any(s.startswith("DROP TABLE") for s in executed_sql(session))
+
+@pytest.mark.asyncio
+async def test_maintain_partitions_skips_plain_table():
+    session = AsyncMock()
+    with patch('src.short_url.partitions.is_partitioned', AsyncMock(return_value=False)), \
+         patch('src.short_url.partitions.precreate_partitions', new_callable=AsyncMock) as mock_create:
+        assert await maintain_partitions(session) == 0
+    mock_create.assert_not_awaited()
@@ -0,0 +1,73 @@
+import time
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from src.scheduler import Scheduler, RELEASE_LOCK_SCRIPT
+
+
+@pytest.fixture
+def redis():
+    redis = MagicMock()
+    redis.get = AsyncMock(return_value=None)
+    redis.set = AsyncMock(return_value=True)
+    redis.eval = AsyncMock(return_value=1)
+    return redis
+
+@pytest.mark.asyncio
+async def test_leader_runs_job_and_records_metrics(redis):
+    scheduler = Scheduler()
+    job = scheduler.add("cleanup", AsyncMock(return_value=42), interval=3600)
+
+    assert await scheduler._run_as_leader(job, redis)
+
+    job.func.assert_awaited_once()
+    lock_call = redis.set.await_args_list[0]
+    assert lock_call.args[0] == "scheduler:cleanup:lock"
+    assert lock_call.kwargs["nx"] is True
+    assert redis.set.await_args_list[1].args[0] == "scheduler:cleanup:last_run"
+    redis.eval.assert_awaited_with(RELEASE_LOCK_SCRIPT, 1, "scheduler:cleanup:lock", lock_call.args[1])
+    metrics = scheduler.metrics()["cleanup"]
+    assert metrics["runs"] == 1
+    assert metrics["last_rows"] == 42
+    assert metrics["last_duration"] is not None
+
+@pytest.mark.asyncio
+async def test_follower_does_not_run_job(redis):
+    redis.set.return_value = False
+    scheduler = Scheduler()
+    job = scheduler.add("cleanup", AsyncMock(), interval=3600)
+
+    assert not await scheduler._run_as_leader(job, redis)
+    job.func.assert_not_awaited()
+    redis.eval.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_leader_skips_job_another_worker_just_ran(redis):
+    redis.get.return_value = str(time.time() - 10).encode()
+    scheduler = Scheduler()
+    job = scheduler.add("cleanup", AsyncMock(), interval=3600)
+
+    assert await scheduler._run_as_leader(job, redis)
+    job.func.assert_not_awaited()
+    redis.eval.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_next_delay_follows_last_run(redis):
+    redis.get.return_value = str(time.time() - 600).encode()
+    scheduler = Scheduler()
+    job = scheduler.add("cleanup", AsyncMock(), interval=3600, jitter=0)
+
+    assert await scheduler._next_delay(job, redis) == pytest.approx(3000, abs=5)
+    redis.get.return_value = None
+    assert await scheduler._next_delay(job, redis) == 0
+
+@pytest.mark.asyncio
+async def test_failed_job_is_counted():
+    scheduler = Scheduler()
+    job = scheduler.add("cleanup", AsyncMock(side_effect=RuntimeError("db down")), interval=3600)
+
+    with patch('src.scheduler.settings.SCHEDULER_RETRY_DELAY', 0):
+        await scheduler._execute(job, None)
+
+    assert job.failures == 1
+    assert job.runs == 0
+    assert job.last_run_at is None
@@ -1,16 +1,57 @@
+import asyncio
 import json
+from datetime import datetime, timedelta
+import time
 from src.short_url.cache import (
     cache_link,
+    cache_links,
     get_cached_link,
-    clear_cached_link,
+    get_cached_links,
+    lookup_cached_link,
+    load_link,
+    link_loads,
+    RELEASE_LOCK_SCRIPT,
+    jittered_ttl,
+    link_cache_ttl,
+    should_refresh_early,
+    cache_missing_link,
+    MISSING_LINK,
+    NEGATIVE_ENTRY,
     cache_stats,
     get_cached_stats,
+    clear_cached_stats,
     cache_search_result,
-    get_cached_search
+    get_cached_search,
+    cache_idempotent_response,
+    get_idempotent_response,
+    get_user_aggregates,
+    cache_user_aggregates,
+    add_user_links,
+    remove_user_links,
+    ADJUST_AGGREGATES_SCRIPT,
+    WRITE_BUCKET_SCRIPT,
+    LocalCache,
+    local_cache,
+    INVALIDATION_CHANNEL,
+    listen_for_invalidations,
+    link_bucket,
+    search_key,
+    write_through_links,
+    evict_links
 )
+from src.short_url.records import (
+    CachedLink,
+    decode_link,
+    decode_stats,
+    decode_search,
+    encode_link,
+    encode_stats,
+    encode_search
+)
+from src.short_url.crud import url_hash
 from src.models import Link
 import pytest
-from unittest.mock import AsyncMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 from fastapi_cache import FastAPICache
 
 @pytest.fixture
@@ -56,74 +97,497 @@ async def test_cache_link(mock_backend, test_link):
         await cache_link(test_link)
         mock_backend.set.assert_awaited_once()
         args, kwargs = mock_backend.set.call_args
-        assert args[0] == "link:abc123"
-        assert json.loads(args[1])["original_url"] == "https://example.com"
+        assert args[0] == "link:v2:abc123"
+        link, _, _ = decode_link("abc123", args[1])
+        assert link == CachedLink("abc123", "https://example.com", None, 5)
 
 @pytest.mark.asyncio
-async def test_get_cached_link(mock_backend):
-    mock_backend.get.return_value = json.dumps({
-        'original_url': "https://example.com",
-        'expires_at': None,
-        'click_count': 5
-    })
+async def test_get_cached_link(mock_backend, test_link):
+    mock_backend.get.return_value = encode_link(test_link, time.time() + 3600, 0)
     
     with patch.object(FastAPICache, 'get_backend', return_value=mock_backend):
         result = await get_cached_link("abc123")
         assert result is not None
         assert result.original_url == "https://example.com"
         assert result.click_count == 5
-        mock_backend.get.assert_awaited_once_with("link:abc123")
-
-@pytest.mark.asyncio
-async def test_clear_cached_link(mock_backend):
-    with patch.object(FastAPICache, 'get_backend', return_value=mock_backend):
-        await clear_cached_link("abc123")
-        mock_backend.delete.assert_awaited_once_with("link:abc123")
+        mock_backend.get.assert_awaited_once_with("link:v2:abc123")
 
 @pytest.mark.asyncio
 async def test_cache_stats(mock_backend, test_stats):
-    with patch.object(FastAPICache, 'get_backend', return_value=mock_backend):
+    with patch.object(FastAPICache, 'get_backend', return_value=mock_backend), \
+         patch('src.short_url.cache.settings.CACHE_TTL_JITTER', 0):
         await cache_stats("abc123", test_stats)
-        mock_backend.set.assert_awaited_with(
-            "stats:abc123",
-            json.dumps(test_stats),
-            expire=300
-        )
+        args, kwargs = mock_backend.set.call_args
+        assert args[0] == "stats:v2:abc123"
+        assert decode_stats(args[1]) == test_stats
+        assert kwargs["expire"] == 300
 
 @pytest.mark.asyncio
-async def test_get_cached_stats(mock_backend):
-    mock_backend.get.return_value = json.dumps({
-        "original_url": "https://example.com",
-        "click_count": 5,
-        "last_accessed": None
-    })
+async def test_get_cached_stats(mock_backend, test_stats):
+    mock_backend.get.return_value = encode_stats(test_stats)
     
     with patch.object(FastAPICache, 'get_backend', return_value=mock_backend):
         stats_result = await get_cached_stats("abc123")
         assert stats_result["original_url"] == "https://example.com"
         assert stats_result["click_count"] == 5
-        mock_backend.get.assert_awaited_once_with("stats:abc123")
+        mock_backend.get.assert_awaited_once_with("stats:v2:abc123")
 
 @pytest.mark.asyncio
-async def test_cache_search_result(mock_backend, test_search_result):
+async def test_clear_cached_stats(mock_backend):
     with patch.object(FastAPICache, 'get_backend', return_value=mock_backend):
+        await clear_cached_stats(["abc123", "xyz789"])
+        mock_backend.redis.delete.assert_awaited_once_with("stats:v2:abc123", "stats:v2:xyz789")
+
+        mock_backend.redis = None
+        await clear_cached_stats(["abc123"])
+        mock_backend.delete.assert_awaited_once_with("stats:v2:abc123")
+
+@pytest.mark.asyncio
+async def test_cache_search_result(mock_backend, test_search_result):
+    mock_backend.redis = None
+    with patch.object(FastAPICache, 'get_backend', return_value=mock_backend), \
+         patch('src.short_url.cache.settings.CACHE_TTL_JITTER', 0):
         await cache_search_result("https://example.com", test_search_result)
-        mock_backend.set.assert_awaited_with(
-            "search:https://example.com",
-            json.dumps(test_search_result),
-            expire=600
-        )
+        args, kwargs = mock_backend.set.call_args
+        assert args[0] == search_key("https://example.com")
+        assert decode_search(args[1]) == (test_search_result, None)
+        assert kwargs["expire"] == 600
+
+        # later pages can not be invalidated as plain keys
+        await cache_search_result("https://example.com", test_search_result, 7, cursor=3)
+        assert mock_backend.set.await_count == 1
+
+@pytest.mark.asyncio
+async def test_cache_search_pages_share_one_hash(mock_backend, test_search_result):
+    pipe = _pipelined_redis(mock_backend)
+    mock_backend.redis.hget = AsyncMock(return_value=encode_search(test_search_result, 7))
+
+    with patch.object(FastAPICache, 'get_backend', return_value=mock_backend):
+        await cache_search_result("https://example.com", test_search_result, 7, limit=10, cursor=3)
+        cached = await get_cached_search("https://example.com", limit=10, cursor=3)
+
+    key = search_key("https://example.com")
+    assert key == f"search:v2:{url_hash('https://example.com')}"
+    pipe.hset.assert_called_once()
+    assert pipe.hset.call_args.args[:2] == (key, "3:10")
+    assert pipe.expire.call_args.kwargs == {"nx": True}
+    mock_backend.redis.hget.assert_awaited_once_with(key, "3:10")
+    assert cached == (test_search_result, 7)
 
 @pytest.mark.asyncio
 async def test_get_cached_search(mock_backend):
-    mock_backend.get.return_value = json.dumps([{
-        "short_code": "abc123",
-        "click_count": 5,
-        "created_at": None
-    }])
+    mock_backend.redis = None
+    mock_backend.get.return_value = encode_search([{"short_code": "abc123", "click_count": 5}])
     
     with patch.object(FastAPICache, 'get_backend', return_value=mock_backend):
-        search_result = await get_cached_search("https://example.com")
+        search_result, next_cursor = await get_cached_search("https://example.com")
         assert len(search_result) == 1
         assert search_result[0]["short_code"] == "abc123"
-        mock_backend.get.assert_awaited_once_with("search:https://example.com")
+        assert next_cursor is None
+        mock_backend.get.assert_awaited_once_with(search_key("https://example.com"))
+
+@pytest.mark.asyncio
+async def test_idempotent_response_roundtrip(mock_backend):
+    with patch.object(FastAPICache, 'get_backend', return_value=mock_backend):
+        await cache_idempotent_response("retry-1", None, {"original_url": "https://example.com"}, {"short_code": "abc123"})
+        args, kwargs = mock_backend.set.call_args
+        assert args[0] == "idempotency:anonymous:retry-1"
+        assert kwargs["expire"] == 86400
+
+        mock_backend.get.return_value = args[1].encode()
+        assert await get_idempotent_response("retry-1", None) == {
+            "request": {"original_url": "https://example.com"},
+            "response": {"short_code": "abc123"}
+        }
+
+def test_local_cache_evicts_least_recently_used():
+    cache = LocalCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+def test_local_cache_expires_entries():
+    cache = LocalCache(maxsize=10, ttl=60)
+    with patch("src.short_url.cache.time.monotonic", return_value=0):
+        cache.set("a", 1)
+    with patch("src.short_url.cache.time.monotonic", return_value=61):
+        assert cache.get("a") is None
+    assert len(cache) == 0
+
+@pytest.mark.asyncio
+async def test_get_cached_link_served_from_local_cache(mock_backend, test_link):
+    mock_backend.get.return_value = encode_link(test_link, time.time() + 3600, 0)
+
+    with patch.object(FastAPICache, 'get_backend', return_value=mock_backend):
+        await get_cached_link("abc123")
+        result = await get_cached_link("abc123")
+        assert result.original_url == "https://example.com"
+        mock_backend.get.assert_awaited_once_with("link:v2:abc123")
+
+@pytest.mark.asyncio
+async def test_cache_links_uses_one_pipeline(mock_backend, test_link):
+    pipe = MagicMock()
+    pipe.execute = AsyncMock()
+    mock_backend.redis = MagicMock()
+    mock_backend.redis.pipeline.return_value.__aenter__ = AsyncMock(return_value=pipe)
+    mock_backend.redis.pipeline.return_value.__aexit__ = AsyncMock(return_value=False)
+    other_link = Link(short_code="xyz789", original_url="https://example.org", expires_at=None, click_count=0)
+
+    with patch.object(FastAPICache, 'get_backend', return_value=mock_backend):
+        await cache_links([test_link, other_link])
+        assert pipe.set.call_count == 2
+        assert pipe.set.call_args_list[0].args[0] == "link:v2:abc123"
+        pipe.execute.assert_awaited_once()
+        mock_backend.set.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_get_cached_links_uses_mget(mock_backend, test_link):
+    local_cache.set("link:local1", "local-link")
+    mock_backend.redis = MagicMock()
+    mock_backend.redis.mget = AsyncMock(return_value=[
+        encode_link(test_link, time.time() + 3600, 0),
+        None
+    ])
+
+    with patch.object(FastAPICache, 'get_backend', return_value=mock_backend):
+        result = await get_cached_links(["local1", "abc123", "missing"])
+        assert result["local1"] == "local-link"
+        assert result["abc123"].original_url == "https://example.com"
+        assert "missing" not in result
+        mock_backend.redis.mget.assert_awaited_once_with(["link:v2:abc123", "link:v2:missing"])
+
+@pytest.mark.asyncio
+async def test_negative_cache_entry(mock_backend):
+    with patch.object(FastAPICache, 'get_backend', return_value=mock_backend):
+        await cache_missing_link("missing1")
+        mock_backend.set.assert_awaited_once_with("link:v2:missing1", NEGATIVE_ENTRY, expire=60)
+        assert await lookup_cached_link("missing1") is MISSING_LINK
+        assert await get_cached_link("missing1") is None
+
+        local_cache.clear()
+        mock_backend.get.return_value = NEGATIVE_ENTRY.encode()
+        assert await lookup_cached_link("missing1") is MISSING_LINK
+
+@pytest.mark.asyncio
+async def test_load_link_coalesces_concurrent_misses(mock_backend, test_link):
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return test_link
+
+    with patch.object(FastAPICache, 'get_backend', return_value=mock_backend):
+        results = await asyncio.gather(*(load_link("abc123", loader) for _ in range(20)))
+
+    assert calls == 1
+    assert all(result is test_link for result in results)
+    mock_backend.set.assert_awaited_once()
+    assert len(link_loads) == 0
+
+@pytest.mark.asyncio
+async def test_load_link_caches_missing_code(mock_backend):
+    with patch.object(FastAPICache, 'get_backend', return_value=mock_backend):
+        assert await load_link("missing1", AsyncMock(return_value=None)) is None
+        mock_backend.set.assert_awaited_once_with("link:v2:missing1", NEGATIVE_ENTRY, expire=60)
+
+@pytest.mark.asyncio
+async def test_load_link_waits_for_cluster_lock_holder(mock_backend, test_link):
+    mock_backend.redis = MagicMock()
+    mock_backend.redis.set = AsyncMock(return_value=False)
+    mock_backend.get.side_effect = [None, encode_link(test_link, time.time() + 3600, 0)]
+    loader = AsyncMock()
+
+    with patch.object(FastAPICache, 'get_backend', return_value=mock_backend), \
+         patch('src.short_url.cache.settings.SINGLE_FLIGHT_CLUSTER_LOCK', True), \
+         patch('src.short_url.cache.settings.SINGLE_FLIGHT_WAIT_INTERVAL', 0):
+        link = await load_link("abc123", loader)
+
+    assert link.original_url == "https://example.com"
+    loader.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_load_link_releases_cluster_lock(mock_backend, test_link):
+    mock_backend.redis = MagicMock()
+    mock_backend.redis.set = AsyncMock(return_value=True)
+    mock_backend.redis.eval = AsyncMock()
+
+    with patch.object(FastAPICache, 'get_backend', return_value=mock_backend), \
+         patch('src.short_url.cache.settings.SINGLE_FLIGHT_CLUSTER_LOCK', True):
+        assert await load_link("abc123", AsyncMock(return_value=test_link)) is test_link
+
+    token = mock_backend.redis.set.call_args.args[1]
+    mock_backend.redis.eval.assert_awaited_once_with(RELEASE_LOCK_SCRIPT, 1, "lock:link:abc123", token)
+
+def test_jittered_ttl_stays_within_bounds():
+    ttls = {jittered_ttl(3600) for _ in range(200)}
+    assert all(3240 <= ttl <= 3960 for ttl in ttls)
+    assert len(ttls) > 1
+
+def test_should_refresh_early():
+    assert not should_refresh_early(None, 0.1)
+    assert not should_refresh_early(time.time() + 3600, 0.1)
+    assert should_refresh_early(time.time() - 1, 0.1)
+
+@pytest.mark.asyncio
+async def test_get_cached_link_refreshes_early_near_expiry(mock_backend, test_link):
+    mock_backend.get.return_value = encode_link(test_link, time.time(), 0.5)
+
+    with patch.object(FastAPICache, 'get_backend', return_value=mock_backend):
+        assert await get_cached_link("abc123") is None
+        assert local_cache.get("link:abc123") is None
+
+@pytest.mark.asyncio
+async def test_cache_link_stores_expiry_and_delta(mock_backend, test_link):
+    with patch.object(FastAPICache, 'get_backend', return_value=mock_backend):
+        await cache_link(test_link, delta=0.25)
+        args, kwargs = mock_backend.set.call_args
+        _, cache_expiry, delta = decode_link("abc123", args[1])
+        assert delta == 0.25
+        assert cache_expiry == pytest.approx(time.time() + kwargs["expire"], abs=5)
+
+def test_link_cache_ttl_grows_with_popularity():
+    created_at = datetime.now() - timedelta(hours=10)
+    cold = Link(short_code="cold", original_url="https://example.com", created_at=created_at, click_count=1)
+    hot = Link(short_code="hot", original_url="https://example.com", created_at=created_at, click_count=10000)
+
+    with patch('src.short_url.cache.settings.CACHE_TTL_JITTER', 0):
+        assert link_cache_ttl(cold) == 330
+        assert link_cache_ttl(hot) == 86400
+
+def test_link_cache_ttl_capped_by_expiration():
+    link = Link(
+        short_code="soon",
+        original_url="https://example.com",
+        expires_at=datetime.now() + timedelta(minutes=2),
+        click_count=0
+    )
+    assert 110 <= link_cache_ttl(link) <= 120
+
+@pytest.mark.asyncio
+async def test_cache_link_skips_expired_links(mock_backend):
+    link = Link(
+        short_code="gone",
+        original_url="https://example.com",
+        expires_at=datetime.now() - timedelta(minutes=1),
+        click_count=0
+    )
+    with patch.object(FastAPICache, 'get_backend', return_value=mock_backend):
+        await cache_link(link)
+        mock_backend.set.assert_not_awaited()
+
+def test_link_record_roundtrip():
+    expires_at = datetime(2030, 1, 2, 3, 4, 5, 678901)
+    link = Link(short_code="abc123", original_url="https://пример.рф/путь", expires_at=expires_at, click_count=7)
+
+    cached = encode_link(link, 1700000000.5, 0.25)
+    decoded, cache_expiry, delta = decode_link("abc123", cached)
+
+    assert decoded == CachedLink("abc123", "https://пример.рф/путь", expires_at, 7)
+    assert cache_expiry == 1700000000.5
+    assert delta == 0.25
+    assert len(cached) < len(json.dumps({
+        'original_url': link.original_url,
+        'expires_at': expires_at.isoformat(),
+        'click_count': 7,
+        'cache_expiry': cache_expiry,
+        'delta': delta
+    }))
+
+def test_stats_and_search_records_roundtrip():
+    created_at = datetime(2025, 5, 1, 12, 0, 0, 1)
+    stats = {
+        "original_url": "https://example.com",
+        "created_at": created_at,
+        "expires_at": None,
+        "click_count": 3,
+        "last_accessed": created_at
+    }
+    assert decode_stats(encode_stats(stats)) == {**stats, "created_at": created_at.isoformat(), "last_accessed": created_at.isoformat()}
+
+    links = [
+        {"short_code": "abc123", "created_at": created_at, "expires_at": None, "click_count": 1, "last_accessed": None},
+        {"short_code": "xyz789", "created_at": created_at, "expires_at": created_at, "click_count": 0, "last_accessed": None}
+    ]
+    decoded, next_cursor = decode_search(encode_search(links, 42))
+    assert [link["short_code"] for link in decoded] == ["abc123", "xyz789"]
+    assert decoded[1]["expires_at"] == created_at.isoformat()
+    assert next_cursor == 42
+    assert decode_search(encode_search([])) == ([], None)
+
+def _pipelined_redis(backend):
+    pipe = MagicMock()
+    pipe.execute = AsyncMock()
+    backend.redis = MagicMock()
+    backend.redis.pipeline.return_value.__aenter__ = AsyncMock(return_value=pipe)
+    backend.redis.pipeline.return_value.__aexit__ = AsyncMock(return_value=False)
+    return pipe
+
+@pytest.mark.asyncio
+async def test_cache_link_writes_hash_bucket(mock_backend, test_link):
+    pipe = _pipelined_redis(mock_backend)
+
+    with patch.object(FastAPICache, 'get_backend', return_value=mock_backend), \
+         patch('src.short_url.cache.settings.CACHE_LAYOUT', "hash"):
+        await cache_link(test_link)
+
+    script, numkeys, key, field, value, expire, now, sweep = pipe.eval.call_args.args
+    assert (script, numkeys) == (WRITE_BUCKET_SCRIPT, 1)
+    assert (key, field) == link_bucket("abc123")
+    assert field == "abc123"
+    assert decode_link("abc123", value)[0].original_url == "https://example.com"
+    assert expire > 0
+    assert now == pytest.approx(time.time(), abs=5)
+    assert sweep == 3
+    pipe.hset.assert_not_called()
+    mock_backend.set.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_hash_bucket_drops_expired_fields(mock_backend, test_link):
+    mock_backend.redis = MagicMock()
+    mock_backend.redis.hget = AsyncMock(return_value=encode_link(test_link, time.time() - 1, 0.01))
+    mock_backend.redis.hdel = AsyncMock()
+
+    with patch.object(FastAPICache, 'get_backend', return_value=mock_backend), \
+         patch('src.short_url.cache.settings.CACHE_LAYOUT', "hash"):
+        assert await lookup_cached_link("abc123") is None
+
+    mock_backend.redis.hdel.assert_awaited_once_with(*link_bucket("abc123"))
+    mock_backend.get.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_dual_layout_falls_back_to_string_keys(mock_backend):
+    mock_backend.redis = MagicMock()
+    mock_backend.redis.hget = AsyncMock(return_value=None)
+    mock_backend.get.return_value = NEGATIVE_ENTRY
+
+    with patch.object(FastAPICache, 'get_backend', return_value=mock_backend), \
+         patch('src.short_url.cache.settings.CACHE_LAYOUT', "dual"):
+        assert await lookup_cached_link("gone12") is MISSING_LINK
+
+    mock_backend.redis.hget.assert_awaited_once_with(*link_bucket("gone12"))
+    mock_backend.get.assert_awaited_once_with("link:v2:gone12")
+
+@pytest.mark.asyncio
+async def test_get_cached_links_reads_buckets(mock_backend, test_link):
+    pipe = _pipelined_redis(mock_backend)
+    pipe.execute.return_value = [[encode_link(test_link, time.time() + 60, 0.01), None]]
+    mock_backend.redis.mget = AsyncMock(return_value=[None])
+
+    with patch.object(FastAPICache, 'get_backend', return_value=mock_backend), \
+         patch('src.short_url.cache.settings.CACHE_LAYOUT', "dual"), \
+         patch('src.short_url.cache.settings.CACHE_BUCKETS', 1):
+        result = await get_cached_links(["abc123", "abc12x"])
+
+    pipe.hmget.assert_called_once_with("links:v2:0", ["abc123", "abc12x"])
+    mock_backend.redis.mget.assert_awaited_once_with(["link:v2:abc12x"])
+    assert result == {"abc123": CachedLink("abc123", "https://example.com", None, 5)}
+
+@pytest.mark.asyncio
+async def test_write_through_links_refreshes_in_one_transaction(mock_backend, test_link):
+    pipe = _pipelined_redis(mock_backend)
+    local_cache.set("link:abc123", "stale")
+
+    with patch.object(FastAPICache, 'get_backend', return_value=mock_backend):
+        await write_through_links([test_link], stale_urls=["https://old.example.com"])
+
+    mock_backend.redis.pipeline.assert_called_once_with(transaction=True)
+    assert pipe.set.call_args.args[0] == "link:v2:abc123"
+    deleted = {call.args[0] for call in pipe.delete.call_args_list}
+    assert deleted == {"stats:v2:abc123", search_key("https://example.com"), search_key("https://old.example.com")}
+    pipe.publish.assert_called_once_with(INVALIDATION_CHANNEL, "abc123")
+    pipe.execute.assert_awaited_once()
+    assert local_cache.get("link:abc123") is None
+
+@pytest.mark.asyncio
+async def test_write_through_drops_expired_link(mock_backend):
+    expired = Link(short_code="old123", original_url="https://example.com", expires_at=datetime.now() - timedelta(minutes=1), click_count=0)
+
+    with patch.object(FastAPICache, 'get_backend', return_value=mock_backend):
+        mock_backend.redis = None
+        await write_through_links([expired])
+
+    mock_backend.set.assert_not_awaited()
+    deleted = {call.args[0] for call in mock_backend.delete.await_args_list}
+    assert deleted == {"link:v2:old123", "stats:v2:old123", search_key("https://example.com")}
+
+@pytest.mark.asyncio
+async def test_evict_links(mock_backend, test_link):
+    pipe = _pipelined_redis(mock_backend)
+
+    with patch.object(FastAPICache, 'get_backend', return_value=mock_backend):
+        await evict_links([test_link])
+
+    pipe.delete.assert_any_call("link:v2:abc123")
+    pipe.delete.assert_any_call("stats:v2:abc123", search_key("https://example.com"))
+    pipe.publish.assert_called_once_with(INVALIDATION_CHANNEL, "abc123")
+
+@pytest.mark.asyncio
+async def test_user_aggregates_are_cached_in_a_hash(mock_backend):
+    pipe = _pipelined_redis(mock_backend)
+    mock_backend.redis.hgetall = AsyncMock(return_value={b"total_links": b"3", b"total_clicks": b"12"})
+
+    with patch.object(FastAPICache, 'get_backend', return_value=mock_backend):
+        assert await get_user_aggregates(1) == {"total_links": 3, "total_clicks": 12}
+        await cache_user_aggregates(1, {"total_links": 3, "total_clicks": 12})
+
+    mock_backend.redis.hgetall.assert_awaited_once_with("user:1:agg")
+    pipe.hsetnx.assert_any_call("user:1:agg", "total_links", 3)
+    pipe.expire.assert_called_once_with("user:1:agg", 3600, nx=True)
+
+@pytest.mark.asyncio
+async def test_user_aggregates_follow_created_and_deleted_links(mock_backend):
+    pipe = _pipelined_redis(mock_backend)
+    links = [
+        Link(short_code="a", original_url="https://example.com", user_id=1, click_count=4),
+        Link(short_code="b", original_url="https://example.com", user_id=1, click_count=1),
+        Link(short_code="c", original_url="https://example.com", user_id=None, click_count=9)
+    ]
+
+    with patch.object(FastAPICache, 'get_backend', return_value=mock_backend):
+        await add_user_links(links[:1])
+        await remove_user_links(links)
+
+    assert [call.args for call in pipe.eval.call_args_list] == [
+        (ADJUST_AGGREGATES_SCRIPT, 1, "user:1:agg", 1, 4),
+        (ADJUST_AGGREGATES_SCRIPT, 1, "user:1:agg", -2, -5)
+    ]
+
+@pytest.mark.asyncio
+async def test_invalidation_listener_clears_local_cache_only_on_reconnect():
+    subscribed = []
+
+    def pubsub(**options):
+        connection = MagicMock()
+        connection.aclose = AsyncMock()
+
+        async def subscribe(*channels):
+            subscribed.append(local_cache.get("link:warm01"))
+
+        async def listen():
+            if len(subscribed) > 1:
+                raise asyncio.CancelledError
+            raise ConnectionError("connection lost")
+            yield
+
+        connection.subscribe = subscribe
+        connection.listen = listen
+        return connection
+
+    local_cache.set("link:warm01", CachedLink("warm01", "https://example.com", None, 0))
+    redis = MagicMock(pubsub=pubsub)
+    with patch('src.short_url.cache.asyncio.sleep', new_callable=AsyncMock), \
+         patch('src.short_url.cache.link_filter.reset') as mock_reset:
+        with pytest.raises(asyncio.CancelledError):
+            await listen_for_invalidations(redis)
+
+    # kept through the first subscribe, dropped after reconnecting
+    assert subscribed[0] is not None
+    assert local_cache.get("link:warm01") is None
+    mock_reset.assert_called_once()
@@ -0,0 +1,111 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from src.models import Link
+from src.short_url.cache import cache_links, local_cache, MISSING_LINK
+from src.short_url.records import CachedLink
+from src.scheduler import RELEASE_LOCK_SCRIPT
+from src.short_url.warmup import WARMUP_CODES_KEY, WARMUP_LOCK_KEY, load_hot_set, save_hot_set, warm_cache
+
+
+def make_link(short_code):
+    return Link(short_code=short_code, original_url=f"https://example.com/{short_code}", expires_at=None, click_count=1)
+
+def test_hot_set_snapshot_roundtrip(tmp_path):
+    path = str(tmp_path / "hot_links")
+    local_cache.set("link:cold", CachedLink("cold", "https://example.com", None, 1))
+    local_cache.set("link:gone", MISSING_LINK)
+    local_cache.set("link:hot", CachedLink("hot", "https://example.com", None, 9))
+
+    assert save_hot_set(path) == 2
+    assert load_hot_set(path) == ["hot", "cold"]
+    assert load_hot_set(str(tmp_path / "missing")) == []
+
+@pytest.mark.asyncio
+async def test_warm_cache_from_snapshot(tmp_path):
+    path = tmp_path / "hot_links"
+    path.write_text("cached\ngone\nstale")
+    stale = make_link("stale")
+
+    with patch('src.short_url.warmup.get_cached_links', AsyncMock(return_value={"cached": make_link("cached"), "gone": None})), \
+         patch('src.short_url.warmup.crud.get_links_by_short_codes', AsyncMock(return_value=[stale])) as mock_get, \
+         patch('src.short_url.warmup.cache_links', new_callable=AsyncMock) as mock_cache:
+        assert await warm_cache(AsyncMock(), str(path)) == 2
+
+    assert mock_get.await_args.args[1] == ["stale"]
+    mock_cache.assert_awaited_once_with([stale], local=True)
+
+@pytest.mark.asyncio
+async def test_warm_cache_from_top_links():
+    batches = [[make_link("a"), make_link("b")], [make_link("c")]]
+
+    async def stream_hot_links(db, limit, batch_size):
+        for batch in batches:
+            yield batch
+
+    with patch('src.short_url.warmup.get_redis', return_value=None), \
+         patch('src.short_url.warmup.crud.stream_hot_links', stream_hot_links), \
+         patch('src.short_url.warmup.cache_links', new_callable=AsyncMock) as mock_cache:
+        assert await warm_cache(AsyncMock(), "") == 3
+
+    assert mock_cache.await_count == 2
+    assert mock_cache.await_args_list[0].kwargs == {"local": True}
+
+@pytest.mark.asyncio
+async def test_warm_cache_leader_scans_once_and_publishes_codes():
+    redis = AsyncMock()
+    redis.set.return_value = True
+
+    async def stream_hot_links(db, limit, batch_size):
+        yield [make_link("a"), make_link("b")]
+
+    with patch('src.short_url.warmup.get_redis', return_value=redis), \
+         patch('src.short_url.warmup.crud.stream_hot_links', stream_hot_links), \
+         patch('src.short_url.warmup.cache_links', new_callable=AsyncMock):
+        assert await warm_cache(AsyncMock(), "") == 2
+
+    lock_call, codes_call = redis.set.await_args_list
+    assert lock_call.args[0] == WARMUP_LOCK_KEY
+    assert lock_call.kwargs == {"nx": True, "px": 600000}
+    assert codes_call.args == (WARMUP_CODES_KEY, "a\nb")
+    redis.eval.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_warm_cache_follower_reads_codes_from_redis():
+    redis = AsyncMock()
+    redis.set.return_value = None
+    redis.get.side_effect = [None, b"a\nb\nc"]
+    stream_hot_links = MagicMock()
+    cached = {"a": make_link("a"), "b": None}
+
+    with patch('src.short_url.warmup.get_redis', return_value=redis), \
+         patch('src.short_url.warmup.settings.WARMUP_POLL_INTERVAL', 0), \
+         patch('src.short_url.warmup.crud.stream_hot_links', stream_hot_links), \
+         patch('src.short_url.warmup.get_cached_links', AsyncMock(return_value=cached)) as mock_get:
+        assert await warm_cache(AsyncMock(), "") == 1
+
+    mock_get.assert_awaited_once_with(["a", "b", "c"])
+    stream_hot_links.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_warm_cache_leader_failure_releases_lock():
+    redis = AsyncMock()
+    redis.set.return_value = True
+
+    async def stream_hot_links(db, limit, batch_size):
+        raise RuntimeError("DB down")
+        yield
+
+    with patch('src.short_url.warmup.get_redis', return_value=redis), \
+         patch('src.short_url.warmup.crud.stream_hot_links', stream_hot_links):
+        with pytest.raises(RuntimeError):
+            await warm_cache(AsyncMock(), "")
+
+    token = redis.set.await_args.args[1]
+    redis.eval.assert_awaited_once_with(RELEASE_LOCK_SCRIPT, 1, WARMUP_LOCK_KEY, token)
+
+@pytest.mark.asyncio
+async def test_cache_links_fills_local_cache():
+    with patch('src.short_url.cache.FastAPICache.get_backend', return_value=AsyncMock(redis=None)):
+        await cache_links([make_link("warm1")], local=True)
+
+    assert local_cache.get("link:warm1") == CachedLink("warm1", "https://example.com/warm1", None, 1)